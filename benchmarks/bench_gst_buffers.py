@@ -0,0 +1,86 @@
+"""
+Compares the cost of turning received frames into GstBuffers: wrapping each
+frame once per subscriber (the old behaviour), against SharedBufferCache,
+which wraps each frame once per camera and hands out shallow copies.
+
+Bytes copied are measured by counting the distinct GstMemory blocks backing
+the buffers that would be pushed, so shared memory is only counted once.
+
+    poetry run python benchmarks/bench_gst_buffers.py --subscribers 4
+"""
+import argparse
+import os
+import time
+
+from wyze_rtsp_bridge.glib_init import Gst
+from wyze_rtsp_bridge.gst_buffers import SharedBufferCache
+
+
+def make_frames(n_frames, gop, keyframe_size, frame_size):
+    return [
+        os.urandom(keyframe_size if i % gop == 0 else frame_size)
+        for i in range(n_frames)
+    ]
+
+
+def run(name, frames, subscribers, make_buffer):
+    memories = {}
+    start = time.perf_counter()
+    for frame in frames:
+        for _ in range(subscribers):
+            buf = make_buffer(frame)
+            buf.pts = 0
+            for i in range(buf.n_memory()):
+                memory = buf.peek_memory(i)
+                # hold on to the memory, so its address can't be reused
+                memories[hash(memory)] = memory
+    elapsed = time.perf_counter() - start
+
+    n_frames = len(frames)
+    copied = sum(memory.size for memory in memories.values())
+    print(
+        f"{name:>10}: {copied / n_frames:12,.0f} bytes copied/frame  "
+        f"{elapsed / n_frames * 1e6:8.1f} us/frame  "
+        f"({subscribers} subscribers)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--subscribers", type=int, default=4)
+    parser.add_argument("--gop", type=int, default=30)
+    parser.add_argument("--keyframe-size", type=int, default=150_000)
+    parser.add_argument("--frame-size", type=int, default=15_000)
+    parser.add_argument("--pool-size", type=int, default=16)
+    args = parser.parse_args()
+
+    frames = make_frames(
+        args.frames, args.gop, args.keyframe_size, args.frame_size
+    )
+    print(
+        f"{args.frames} frames, {sum(map(len, frames)) / args.frames:,.0f} "
+        f"bytes/frame on average"
+    )
+
+    run("wrapped", frames, args.subscribers, Gst.Buffer.new_wrapped)
+
+    shared = SharedBufferCache()
+    run(
+        "shared",
+        frames,
+        args.subscribers,
+        lambda frame: shared.get("camera", frame),
+    )
+
+    pooled = SharedBufferCache(pool_size=args.pool_size)
+    run(
+        "pooled",
+        frames,
+        args.subscribers,
+        lambda frame: pooled.get("camera", frame),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Measures how long the CLI takes to import, in fresh interpreters, and
+checks that it doesn't import anything only the server needs (GStreamer,
+SQLAlchemy, wyzecam, rich): `wyze-rtsp-bridge --version`, --create-config
+and container health checks shouldn't pay for them, which matters most on
+slow ARM boards.
+
+Import times come from `python -X importtime`; the wall time of the whole
+interpreter is reported too, as that is what a health check waits for.
+Results can be saved as a named baseline, and later runs compared to it:
+
+    poetry run python benchmarks/bench_imports.py --save-baseline default
+    poetry run python benchmarks/bench_imports.py --compare default
+"""
+from typing import Dict, List, Optional, Tuple
+
+import argparse
+import json
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BASELINE_DIR = pathlib.Path(__file__).parent / "baselines"
+
+# target -> the module it imports
+TARGETS = {
+    "cli": "wyze_rtsp_bridge.__main__",
+    "config": "wyze_rtsp_bridge.config",
+}
+
+# top level packages that only the running server may import
+SERVER_ONLY_PACKAGES = ["gi", "sqlalchemy", "wyzecam", "rich"]
+
+_IMPORTTIME_LINE = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|"
+    r"(?P<indent> *)(?P<module>\S+)$"
+)
+
+
+def import_once(module: str) -> Tuple[float, float, List[Tuple[str, int]]]:
+    """
+    Imports `module` in a fresh interpreter; returns the wall time, the
+    time spent importing this package (both in ms), and the cumulative
+    time (in us) of each module the package imported directly.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+
+    import_us = 0
+    children: List[Tuple[str, int]] = []
+    in_package = False
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        depth = len(match["indent"]) // 2
+        cumulative = int(match["cumulative"])
+        # importtime lists a module after the modules it imported, so a
+        # package's direct imports are the depth 1 lines before it
+        if depth == 1:
+            children.append((match["module"], cumulative))
+        elif depth == 0:
+            in_package = match["module"].startswith("wyze_rtsp_bridge")
+            if in_package:
+                import_us += cumulative
+            else:
+                children = []
+    return wall_ms, import_us / 1000, children
+
+
+def server_only_imports(module: str) -> List[str]:
+    """The server only packages that importing `module` imports"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import json, sys, {module}; print(json.dumps(list(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = json.loads(result.stdout)
+    return [p for p in SERVER_ONLY_PACKAGES if p in modules]
+
+
+def run(args) -> Tuple[Dict[str, float], bool]:
+    results: Dict[str, float] = {}
+    ok = True
+    for target, module in TARGETS.items():
+        try:
+            runs = [import_once(module) for _ in range(args.runs)]
+        except ImportError as e:
+            print(f"{target:>8}: skipped, {module} can't be imported ({e})")
+            continue
+
+        wall_ms = statistics.median(r[0] for r in runs)
+        import_ms = statistics.median(r[1] for r in runs)
+        results[f"{target}_wall_ms"] = wall_ms
+        results[f"{target}_import_ms"] = import_ms
+        print(
+            f"{target:>8}: {import_ms:8.1f} ms importing {module}, "
+            f"{wall_ms:8.1f} ms wall"
+        )
+        slowest = sorted(runs[-1][2], key=lambda c: c[1], reverse=True)
+        for name, cumulative in slowest[: args.top]:
+            print(f"{'':>10}{cumulative / 1000:8.1f} ms  {name}")
+
+        imported = server_only_imports(module)
+        if imported:
+            ok = False
+            print(f"{'':>10}REGRESSION: imports {', '.join(imported)}")
+    return results, ok
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict[str, float], tolerance: float
+) -> bool:
+    ok = True
+    for metric, old in baseline.items():
+        new: Optional[float] = results.get(metric)
+        if new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(
+            f"{metric:>18}: {old:10.2f} -> {new:10.2f}  ({change:+.1%})"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=10,
+        help="Fresh interpreters to import each target in; the median is "
+        "reported",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=5,
+        help="Show this many of the slowest modules each target imports",
+    )
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="The relative change that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    results, ok = run(args)
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        with open(path, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+    if args.compare:
+        with open(BASELINE_DIR / f"{args.compare}.json") as f:
+            baseline = json.load(f)["results"]
+        print(f"Compared to baseline {args.compare}:")
+        ok = compare(results, baseline, args.tolerance) and ok
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
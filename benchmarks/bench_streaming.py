@@ -0,0 +1,310 @@
+"""
+Drives WyzeIOTCVideoMux with N synthetic cameras and M subscribers per
+camera, and reports delivered frames/s, per-frame latency percentiles
+(from the synthetic camera handing a frame out to a subscriber being done
+with it), CPU use, dropped frames and, optionally, allocations.
+
+Runs offline: no TUTK library and no cameras are needed (see
+synthetic_camera.py).  With --gst, subscribers are WyzeCameraMediaFactory
+callbacks pushing into real appsrc ! fakesink pipelines, which needs
+GStreamer; otherwise they are plain callbacks, which measures the mux on
+its own.
+
+Results can be saved as a named baseline, and later runs compared to it:
+
+    poetry run python benchmarks/bench_streaming.py --cameras 8 --subscribers 2 --save-baseline default
+    poetry run python benchmarks/bench_streaming.py --cameras 8 --subscribers 2 --compare default
+"""
+from typing import Callable, Dict, List, Optional
+
+import argparse
+import collections
+import functools
+import json
+import pathlib
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from synthetic_camera import (
+    CODEC_H264,
+    CODEC_H265,
+    SyntheticIOTC,
+    make_camera,
+    synthetic_iotc_factory,
+)
+from wyze_rtsp_bridge.iotc_video_mux import WyzeIOTCVideoMux
+
+BASELINE_DIR = pathlib.Path(__file__).parent / "baselines"
+
+# metric -> whether higher is better
+COMPARED_METRICS = {
+    "delivered_fps": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "cpu_percent": False,
+}
+
+
+class LatencyRecorder:
+    def __init__(self, iotc: Optional[SyntheticIOTC]) -> None:
+        self.iotc = iotc
+        self.latencies: List[float] = []
+        self.delivered = 0
+        self._lock = threading.Lock()
+
+    def record(self, mac: str, frame_info) -> None:
+        if self.iotc is not None:
+            sent_at = self.iotc.session_for(mac).sent_at.get(
+                frame_info.frame_no
+            )
+            latency = None if sent_at is None else time.perf_counter() - sent_at
+        else:
+            # the cameras live in worker processes; fall back to the frame's
+            # own (millisecond resolution) wall clock timestamp
+            latency = time.time() - (
+                frame_info.timestamp + frame_info.timestamp_ms / 1000
+            )
+        with self._lock:
+            self.delivered += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def plain_subscribers(mux, cameras, subscribers, recorder) -> Callable:
+    def on_frame(mac, listener, data):
+        recorder.record(mac, data[1])
+
+    for camera in cameras:
+        for subscriber_id in range(subscribers):
+            mux.subscribe(
+                camera.mac,
+                subscriber_id,
+                functools.partial(on_frame, camera.mac),
+            )
+
+    return lambda: None
+
+
+def gst_subscribers(mux, cameras, subscribers, recorder) -> Callable:
+    from wyze_rtsp_bridge.clock_recovery import CameraClockRecovery
+    from wyze_rtsp_bridge.glib_init import Gst
+    from wyze_rtsp_bridge.rtsp_server_media_factory import (
+        WyzeCameraMediaContext,
+        WyzeCameraMediaFactory,
+    )
+
+    factory = WyzeCameraMediaFactory(None, mux, cameras)
+    pipelines = []
+    for camera in cameras:
+        for subscriber_id in range(subscribers):
+            pipeline = Gst.parse_launch(
+                "appsrc name=src is-live=true format=time ! fakesink sync=false"
+            )
+            appsrc = pipeline.get_by_name("src")
+            appsrc.set_property("max-bytes", factory.appsrc_max_bytes)
+
+            ctx = WyzeCameraMediaContext()
+            ctx.media_info_id = len(factory.media_contexts)
+            ctx.mac = camera.mac.lower().encode("ascii")
+            ctx.need_data = True
+            factory.media_contexts[ctx.media_info_id] = ctx
+            factory.flow_returns[ctx.media_info_id] = collections.Counter()
+            factory.clocks[ctx.media_info_id] = CameraClockRecovery()
+            appsrc.connect("need-data", factory.need_data, ctx)
+            appsrc.connect("enough-data", factory.enough_data, ctx)
+            pipeline.set_state(Gst.State.PLAYING)
+            pipelines.append(pipeline)
+
+            def on_frame(appsrc, ctx, mac, listener, data):
+                factory.has_data(appsrc, ctx, listener, data)
+                recorder.record(mac, data[1])
+
+            mux.subscribe(
+                camera.mac,
+                ctx.media_info_id,
+                functools.partial(on_frame, appsrc, ctx, camera.mac),
+                pack_burst=True,
+            )
+
+    def stop():
+        for pipeline in pipelines:
+            pipeline.set_state(Gst.State.NULL)
+
+    return stop
+
+
+def run(args) -> Dict[str, float]:
+    session_kwargs = dict(
+        fps=args.fps,
+        bitrate_kbps=args.bitrate,
+        gop=args.gop,
+        codec_id=CODEC_H265 if args.codec == "h265" else CODEC_H264,
+        paced=not args.unpaced,
+    )
+    iotc = None if args.worker_processes else SyntheticIOTC(**session_kwargs)
+    cameras = [make_camera(i) for i in range(args.cameras)]
+    mux = WyzeIOTCVideoMux(
+        iotc,
+        None,
+        cameras,
+        max_queue_size=args.max_queue_size,
+        pause_after_idle_seconds=None,
+        worker_processes=args.worker_processes,
+        iotc_factory=functools.partial(
+            synthetic_iotc_factory, **session_kwargs
+        ),
+    )
+    for listener in mux.listeners.values():
+        listener.state_change_listeners.clear()
+
+    recorder = LatencyRecorder(iotc)
+    mux.start()
+    mux.wait_for_all_connected()
+
+    make_subscribers = gst_subscribers if args.gst else plain_subscribers
+    stop_subscribers = make_subscribers(
+        mux, cameras, args.subscribers, recorder
+    )
+
+    # let queues and clocks settle before measuring
+    time.sleep(args.warmup)
+    recorder.latencies.clear()
+    recorder.delivered = 0
+    if args.allocations:
+        tracemalloc.start()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    delivered = recorder.delivered
+    latencies = list(recorder.latencies)
+    peak_allocated = 0
+    if args.allocations:
+        _, peak_allocated = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    dropped = sum(
+        dropped
+        for mac in mux.listeners
+        for _, dropped in mux.get_subscriber_stats(mac).values()
+    )
+    mux.stop()
+    stop_subscribers()
+
+    results = {
+        "delivered_fps": delivered / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p90_ms": percentile(latencies, 90) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "latency_max_ms": max(latencies, default=float("nan")) * 1000,
+        "latency_mean_ms": (
+            statistics.mean(latencies) * 1000 if latencies else float("nan")
+        ),
+        "cpu_percent": cpu / elapsed * 100,
+        "dropped_frames": dropped,
+    }
+    if args.allocations:
+        results["peak_allocated_kb"] = peak_allocated / 1024
+    return results
+
+
+def compare(results, baseline, tolerance) -> bool:
+    ok = True
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        if metric not in baseline:
+            continue
+        old, new = baseline[metric], results[metric]
+        change = (new - old) / old if old else 0.0
+        regressed = (
+            change < -tolerance if higher_is_better else change > tolerance
+        )
+        ok = ok and not regressed
+        print(
+            f"{metric:>18}: {old:10.2f} -> {new:10.2f}  ({change:+.1%})"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--subscribers", type=int, default=2)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--bitrate", type=int, default=1000, help="kbit/s")
+    parser.add_argument("--gop", type=int, default=30)
+    parser.add_argument("--codec", choices=["h264", "h265"], default="h264")
+    parser.add_argument("--max-queue-size", type=int, default=60)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument(
+        "--unpaced",
+        action="store_true",
+        help="Generate frames as fast as possible, instead of at --fps",
+    )
+    parser.add_argument(
+        "--gst",
+        action="store_true",
+        help="Push frames through WyzeCameraMediaFactory into appsrc pipelines",
+    )
+    parser.add_argument(
+        "--worker-processes",
+        type=int,
+        default=0,
+        help="Run the cameras in this many worker processes; latencies are "
+        "then only accurate to a millisecond",
+    )
+    parser.add_argument(
+        "--allocations",
+        action="store_true",
+        help="Trace allocations with tracemalloc (slows everything down)",
+    )
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="The relative change that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{args.cameras} cameras x {args.subscribers} subscribers, "
+        f"{args.codec} {args.fps} fps {args.bitrate} kbit/s gop {args.gop}"
+        f"{', unpaced' if args.unpaced else ''}"
+        f"{', through gstreamer' if args.gst else ''}"
+        f"{f', {args.worker_processes} workers' if args.worker_processes else ''}"
+    )
+    results = run(args)
+    for metric, value in results.items():
+        print(f"{metric:>18}: {value:10.2f}")
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        with open(path, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+    if args.compare:
+        with open(BASELINE_DIR / f"{args.compare}.json") as f:
+            baseline = json.load(f)["results"]
+        print(f"Compared to baseline {args.compare}:")
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+A stand-in for wyzecam's WyzeIOTC and WyzeIOTCSession, for benchmarking the
+streaming path without the TUTK library or any cameras.
+
+Each synthetic camera yields H.264 or H.265 access units (parameter sets
+and an IDR slice on keyframes, a single slice otherwise) with filled in
+FrameInfoStruct metadata, paced at the configured frame rate.
+"""
+import types
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import contextlib
+import itertools
+import os
+import threading
+import time
+
+from wyzecam.api_models import WyzeCamera
+from wyzecam.iotc import WyzeIOTCSessionState
+from wyzecam.tutk import tutk
+
+START_CODE = b"\x00\x00\x00\x01"
+
+CODEC_H264 = 78
+CODEC_H265 = 80
+
+# (parameter set NAL units, keyframe slice header, other slice header)
+NAL_HEADERS = {
+    CODEC_H264: ([b"\x67\x64\x00\x28", b"\x68\xee\x3c\x80"], b"\x65", b"\x41"),
+    CODEC_H265: (
+        [b"\x40\x01\x0c\x01", b"\x42\x01\x01\x01", b"\x44\x01\xc1\x72"],
+        b"\x26\x01",
+        b"\x02\x01",
+    ),
+}
+
+KEYFRAME_WEIGHT = 8
+"""How many times bigger a keyframe is than any other frame"""
+
+_payload = os.urandom(4 * 1024 * 1024)
+
+
+def make_camera(index: int) -> WyzeCamera:
+    return WyzeCamera(
+        p2p_id=f"SYNTHETIC{index:011d}",
+        p2p_type=4,
+        ip="127.0.0.1",
+        enr="synthetic",
+        mac=f"5AFE{index:08X}",
+        product_model="WYZE_CAKP2JFUS",
+        camera_info=None,
+        nickname=f"synthetic camera {index}",
+        timezone_name="UTC",
+    )
+
+
+def frame_sizes(bitrate_kbps: int, fps: int, gop: int) -> Tuple[int, int]:
+    """(keyframe size, other frame size) in bytes, averaging out to the bitrate"""
+    gop_bytes = bitrate_kbps * 1000 // 8 * gop // fps
+    frame_size = max(gop_bytes // (KEYFRAME_WEIGHT + gop - 1), 64)
+    return frame_size * KEYFRAME_WEIGHT, frame_size
+
+
+def access_unit(codec_id: int, keyframe: bool, size: int, offset: int) -> bytes:
+    parameter_sets, keyframe_header, frame_header = NAL_HEADERS[codec_id]
+    nal_units = [START_CODE + nal for nal in parameter_sets] if keyframe else []
+    header = keyframe_header if keyframe else frame_header
+    header_size = sum(map(len, nal_units)) + len(START_CODE) + len(header)
+    body_size = max(size - header_size, 1)
+    start = offset % (len(_payload) - body_size)
+    nal_units.append(START_CODE + header + _payload[start : start + body_size])
+    return b"".join(nal_units)
+
+
+class SyntheticSession:
+    """Quacks like the parts of WyzeIOTCSession that the mux uses"""
+
+    def __init__(
+        self,
+        camera: WyzeCamera,
+        fps: int = 15,
+        bitrate_kbps: int = 1000,
+        gop: int = 30,
+        codec_id: int = CODEC_H264,
+        paced: bool = True,
+    ) -> None:
+        self.camera = camera
+        self.fps = fps
+        self.gop = gop
+        self.codec_id = codec_id
+        self.paced = paced
+        self.keyframe_size, self.frame_size = frame_sizes(
+            bitrate_kbps, fps, gop
+        )
+        self.state = WyzeIOTCSessionState.DISCONNECTED
+        self.session_id: Optional[int] = None
+        self.tutk_platform_lib = None
+        self.preferred_frame_size = tutk.FRAME_SIZE_1080P
+        self.streaming = threading.Event()
+        self.streaming.set()
+        self.frames_sent = 0
+        # frame_no -> time.perf_counter() when the frame was handed out
+        self.sent_at: Dict[int, float] = {}
+
+    def __enter__(self) -> "SyntheticSession":
+        self.state = WyzeIOTCSessionState.AUTHENTICATION_SUCCEEDED
+        self.session_id = 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.state = WyzeIOTCSessionState.DISCONNECTED
+
+    def session_check(self):
+        return types.SimpleNamespace(mode=2, remote_ip=b"127.0.0.1")
+
+    @contextlib.contextmanager
+    def iotctrl_mux(self):
+        yield SyntheticIOCtrlMux(self)
+
+    def recv_video_data(
+        self,
+    ) -> Iterator[Tuple[bytes, tutk.FrameInfoStruct]]:
+        interval = 1 / self.fps
+        next_frame_at = time.perf_counter()
+        started_at = time.time()
+        first_frame_no = self.frames_sent
+        for frame_no in itertools.count(first_frame_no):
+            if self.state != WyzeIOTCSessionState.AUTHENTICATION_SUCCEEDED:
+                return
+            self.streaming.wait()
+            if self.paced:
+                delay = next_frame_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_frame_at += interval
+
+            keyframe = frame_no % self.gop == 0
+            size = self.keyframe_size if keyframe else self.frame_size
+            frame = access_unit(self.codec_id, keyframe, size, frame_no * 7919)
+
+            timestamp = started_at + (frame_no - first_frame_no) * interval
+            frame_info = tutk.FrameInfoStruct()
+            frame_info.codec_id = self.codec_id
+            frame_info.is_keyframe = int(keyframe)
+            frame_info.cam_index = 0
+            frame_info.online_num = 1
+            frame_info.framerate = self.fps
+            frame_info.frame_size = self.preferred_frame_size
+            frame_info.bitrate = tutk.BITRATE_HD
+            frame_info.timestamp_ms = int(timestamp * 1000) % 1000
+            frame_info.timestamp = int(timestamp)
+            frame_info.frame_len = len(frame)
+            frame_info.frame_no = frame_no
+
+            self.frames_sent = frame_no + 1
+            self.sent_at[frame_no] = time.perf_counter()
+            self.sent_at.pop(frame_no - 10 * self.fps, None)
+            yield frame, frame_info
+
+
+class SyntheticIOCtrlMux:
+    def __init__(self, session: SyntheticSession) -> None:
+        self.session = session
+
+    def send_ioctl(self, msg):
+        if msg.code == 10010:
+            # K10010ControlChannel; 1 starts the stream, 2 stops it
+            if msg.v == 1:
+                self.session.streaming.set()
+            else:
+                self.session.streaming.clear()
+        return SyntheticFuture()
+
+
+class SyntheticFuture:
+    def result(self, block: bool = True, timeout: int = 10000):
+        return None
+
+
+class SyntheticIOTC:
+    """Quacks like WyzeIOTC.connect_and_auth(), handing out SyntheticSessions"""
+
+    def __init__(self, **session_kwargs) -> None:
+        self.session_kwargs = session_kwargs
+        self.sessions: List[SyntheticSession] = []
+
+    def connect_and_auth(self, account, camera: WyzeCamera) -> SyntheticSession:
+        session = SyntheticSession(camera, **self.session_kwargs)
+        self.sessions.append(session)
+        return session
+
+    def deinitialize(self) -> None:
+        pass
+
+    def session_for(self, mac: str) -> SyntheticSession:
+        for session in self.sessions:
+            if session.camera.mac.lower() == mac.lower():
+                return session
+        raise KeyError(mac)
+
+
+def synthetic_iotc_factory(num_cameras: int, **session_kwargs) -> SyntheticIOTC:
+    """An iotc_factory for WyzeIOTCVideoMux's worker processes"""
+    return SyntheticIOTC(**session_kwargs)
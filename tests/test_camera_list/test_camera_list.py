@@ -0,0 +1,35 @@
+import types
+
+from wyze_rtsp_bridge.camera_list import diff_cameras, select_cameras
+
+
+def _camera(mac):
+    return types.SimpleNamespace(mac=mac)
+
+
+def test_select_cameras():
+    cameras = [_camera("AA0000000001"), _camera("AA0000000002")]
+    assert select_cameras(cameras, None) == cameras  # type: ignore
+    assert select_cameras(cameras, ["AA0000000002"]) == [  # type: ignore
+        cameras[1]
+    ]
+
+
+def test_diff_cameras():
+    kept, removed, added = (
+        _camera("AA0000000001"),
+        _camera("AA0000000002"),
+        _camera("AA0000000003"),
+    )
+    change = diff_cameras([kept, removed], [kept, added])  # type: ignore
+    assert change.added == [added]
+    assert change.removed == [removed]
+    assert change
+
+
+def test_diff_cameras_ignores_mac_case():
+    change = diff_cameras(
+        [_camera("AA00000000FF")], [_camera("aa00000000ff")]  # type: ignore
+    )
+    assert change.added == [] and change.removed == []
+    assert not change
@@ -0,0 +1,97 @@
+import types
+
+from wyze_rtsp_bridge.camera_status import CameraStatusBoard
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListener,
+    WyzeIOTCVideoListenerState,
+)
+from wyzecam.iotc import WyzeIOTCSessionState
+
+MAC = "AABBCCDDEEFF"
+
+
+class _Session:
+    def __init__(self):
+        self.state = WyzeIOTCSessionState.DISCONNECTED
+        self.checks = 0
+        self.remote_ip = None
+
+    def session_check(self):
+        self.checks += 1
+        if self.remote_ip is None:
+            raise AssertionError("Not connected")
+        return types.SimpleNamespace(mode=2, remote_ip=self.remote_ip)
+
+
+def _board(session_refresh_interval=30.0):
+    camera = types.SimpleNamespace(
+        mac=MAC, nickname="Porch", p2p_type=4, ip="192.168.1.20"
+    )
+    session = _Session()
+    listener = WyzeIOTCVideoListener(session, camera)  # type: ignore
+    mux = types.SimpleNamespace(
+        listeners={MAC.lower(): listener},
+        get_listener=lambda mac: listener,
+    )
+    board = CameraStatusBoard(
+        mux,  # type: ignore
+        [camera],  # type: ignore
+        session_refresh_interval=session_refresh_interval,
+    )
+    return board, listener, session
+
+
+def test_sessions_are_only_checked_on_state_changes():
+    board, listener, session = _board()
+    assert board.refresh()
+    assert session.checks == 1
+    assert board.rows[MAC.lower()][3] == "[192.168.1.20]"
+
+    for _ in range(10):
+        assert not board.refresh()
+    assert session.checks == 1
+
+    session.remote_ip = b"10.0.0.5"
+    listener.state = WyzeIOTCVideoListenerState.STREAMING
+    assert board.refresh()
+    assert session.checks == 2
+    assert board.rows[MAC.lower()][2:5] == ("4 : 2", "10.0.0.5", "STREAMING")
+
+
+def test_session_state_changes_update_the_row_without_a_check():
+    board, listener, session = _board()
+    board.refresh()
+    session.state = WyzeIOTCSessionState.CONNECTING_FAILED
+    assert board.refresh()
+    assert board.rows[MAC.lower()][5] == "CONNECTING_FAILED"
+    assert session.checks == 1
+
+
+def test_sessions_are_rechecked_every_interval():
+    board, listener, session = _board(session_refresh_interval=0)
+    board.refresh()
+    board.refresh()
+    assert session.checks == 2
+
+
+def test_session_changes_are_reported():
+    board, listener, session = _board()
+    changed = []
+    board.refresh(on_session_change=changed.append)
+    assert changed == []
+
+    session.remote_ip = b"10.0.0.5"
+    listener.state = WyzeIOTCVideoListenerState.CONNECTED
+    board.refresh(on_session_change=changed.append)
+    assert [camera.mac for camera in changed] == [MAC]
+    assert board.describe_session(changed[0]) == (
+        f"{MAC} (Porch): connected to 10.0.0.5 (p2p type 4, mode 2)"
+    )
+
+
+def test_table():
+    board, listener, session = _board()
+    board.refresh()
+    table = board.table("Connecting to cameras...")
+    assert table.title == "Connecting to cameras..."
+    assert table.row_count == 1
@@ -0,0 +1,53 @@
+import random
+
+from wyze_rtsp_bridge.clock_recovery import (
+    MILLISECOND,
+    SECOND,
+    CameraClockRecovery,
+)
+
+FRAME = SECOND // 20
+CAMERA_EPOCH = 1_600_000_000 * SECOND
+
+
+def test_pts_follows_camera_spacing_despite_jitter():
+    rng = random.Random(1234)
+    clock = CameraClockRecovery()
+    pts = []
+    for n in range(200):
+        camera_ts = CAMERA_EPOCH + n * FRAME
+        arrival = n * FRAME + rng.randint(0, 40) * MILLISECOND
+        pts.append(clock.update(camera_ts, arrival)[0])
+
+    errors = [abs(b - a - FRAME) for a, b in zip(pts, pts[1:])]
+    # after the first few frames, the least-delayed arrival has been seen;
+    # arrivals jitter by up to 40ms, pts by a fraction of that
+    errors = errors[50:]
+    assert max(errors) <= 5 * MILLISECOND
+    assert sum(errors) / len(errors) <= MILLISECOND // 2
+
+
+def test_duration_is_camera_frame_interval():
+    clock = CameraClockRecovery(default_duration_ns=SECOND // 15)
+    assert clock.update(CAMERA_EPOCH, 0)[1] == SECOND // 15
+    assert clock.update(CAMERA_EPOCH + FRAME, FRAME)[1] == FRAME
+
+
+def test_gap_reanchors_at_arrival_time():
+    clock = CameraClockRecovery(max_gap_ns=2 * SECOND)
+    clock.update(CAMERA_EPOCH, 0)
+    clock.update(CAMERA_EPOCH + FRAME, FRAME)
+
+    # camera was paused for a minute, but we only noticed 5s later
+    pts, _ = clock.update(CAMERA_EPOCH + 60 * SECOND, 5 * SECOND)
+    assert pts == 5 * SECOND
+    assert clock.discontinuities == 1
+
+
+def test_backwards_timestamps_keep_pts_increasing():
+    clock = CameraClockRecovery()
+    first, _ = clock.update(CAMERA_EPOCH, 10 * SECOND)
+    second, _ = clock.update(CAMERA_EPOCH - 3600 * SECOND, 10 * SECOND)
+    third, _ = clock.update(CAMERA_EPOCH - 3600 * SECOND + FRAME, 10 * SECOND)
+    assert first < second < third
+    assert clock.discontinuities == 1
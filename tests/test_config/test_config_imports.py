@@ -0,0 +1,22 @@
+import json
+import subprocess
+import sys
+
+SERVER_ONLY_PACKAGES = ["gi", "sqlalchemy", "wyzecam", "rich"]
+
+
+def test_config_does_not_import_server_dependencies():
+    # in a fresh interpreter, as this one has imported everything already
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json, sys, wyze_rtsp_bridge.config; "
+            "print(json.dumps(list(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = json.loads(result.stdout)
+    assert [p for p in SERVER_ONLY_PACKAGES if p in modules] == []
@@ -5,7 +5,7 @@ import yaml
 from wyze_rtsp_bridge import config
 from wyze_rtsp_bridge.config import Config
 from wyze_rtsp_bridge.db import db
-from wyzecam.api_models import WyzeCredential
+from wyzecam.api_models import WyzeAccount, WyzeCamera, WyzeCredential
 
 
 @pytest.fixture
@@ -57,3 +57,54 @@ def test_set_credentials_existing_credentials(_db, _test_creds):
     credentials = db.get_credentials(_db)
     assert credentials is not None
     assert credentials.access_token == new_access_token
+
+
+@pytest.fixture
+def _test_account():
+    return WyzeAccount(
+        phone_id="testing2",
+        logo="",
+        nickname="test",
+        email="test@example.com",
+        user_code="1234",
+        user_center_id="5678",
+        open_user_id="abcd",
+    )
+
+
+def _test_camera(mac):
+    return WyzeCamera(
+        p2p_id="p2p",
+        p2p_type=4,
+        ip="192.168.1.2",
+        enr="enr",
+        mac=mac,
+        product_model="WYZE_CAKP2JFUS",
+        camera_info=None,
+        nickname=f"camera {mac}",
+        timezone_name="America/Los_Angeles",
+    )
+
+
+def test_get_account_no_account(_db):
+    assert db.get_account(_db) is None
+
+
+def test_set_account(_db, _test_account):
+    db.set_account(_db, _test_account)
+    account = db.get_account(_db)
+    assert account is not None
+    assert account.open_user_id == _test_account.open_user_id
+    assert not db.is_stale(account.fetched_at, ttl_seconds=60)
+
+
+def test_set_cameras_replaces_camera_list(_db):
+    assert db.get_cameras(_db) == []
+
+    db.set_cameras(_db, [_test_camera("AAAA"), _test_camera("BBBB")])
+    db.set_cameras(_db, [_test_camera("BBBB"), _test_camera("CCCC")])
+
+    cameras = db.get_cameras(_db)
+    assert [c.mac for c in cameras] == ["BBBB", "CCCC"]
+    assert cameras[0].nickname == "camera BBBB"
+    assert db.is_stale(cameras[0].fetched_at, ttl_seconds=-1)
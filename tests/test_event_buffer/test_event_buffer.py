@@ -0,0 +1,101 @@
+import threading
+
+from wyze_rtsp_bridge import event_buffer
+from wyze_rtsp_bridge.event_buffer import EventBuffer, export_clip
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.mpegts import PACKET_SIZE
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+START_MS = 1_600_000_000_000
+
+
+def _frame(i, fps=10, gop=10, size=100):
+    timestamp_ms = START_MS + i * 1000 // fps
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = 78
+    frame_info.is_keyframe = int(i % gop == 0)
+    frame_info.timestamp = timestamp_ms // 1000
+    frame_info.timestamp_ms = timestamp_ms % 1000
+    return b"\x00" * size, frame_info
+
+
+def _timestamps(frames):
+    return [
+        frame_timestamp_ms(frame_info) - START_MS for _, frame_info in frames
+    ]
+
+
+def test_starts_on_a_keyframe():
+    buffer = EventBuffer(max_seconds=10, max_bytes=1_000_000)
+    for i in range(5, 25):
+        buffer.add(_frame(i))
+    frames = buffer.frames_since(0)
+    assert frames[0][1].is_keyframe
+    assert _timestamps(frames)[0] == 1000
+
+
+def test_keeps_max_seconds_of_whole_gops():
+    buffer = EventBuffer(max_seconds=3, max_bytes=1_000_000)
+    for i in range(100):
+        buffer.add(_frame(i))
+    # the newest frame is at 9.9s; the GOP starting at 6s covers 3s
+    assert _timestamps(buffer.frames_since(0))[0] == 6000
+    assert len(buffer) == 40
+
+
+def test_keeps_within_max_bytes():
+    buffer = EventBuffer(max_seconds=60, max_bytes=2500)
+    for i in range(100):
+        buffer.add(_frame(i))
+    assert buffer.size_bytes <= 2500
+    assert len(buffer) == 20
+
+
+def test_frames_since_aligns_to_keyframes():
+    buffer = EventBuffer(max_seconds=60, max_bytes=1_000_000)
+    for i in range(50):
+        buffer.add(_frame(i))
+    assert _timestamps(buffer.frames_since(START_MS + 2500))[0] == 2000
+    assert _timestamps(buffer.frames_after(START_MS + 4700)) == [4800, 4900]
+
+
+def test_export_clip(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_buffer, "CLIP_POLL_INTERVAL", 0.01)
+    buffer = EventBuffer(max_seconds=60, max_bytes=1_000_000)
+    for i in range(50):
+        buffer.add(_frame(i))
+
+    def more_frames():
+        for i in range(50, 80):
+            buffer.add(_frame(i))
+
+    # the event is at 4.9s: the clip runs from the keyframe at 2s to 5.9s
+    feeder = threading.Timer(0.05, more_frames)
+    feeder.start()
+    clip = export_clip(
+        buffer, tmp_path / "clip.ts", before_seconds=2.5, after_seconds=1
+    )
+    feeder.join()
+
+    assert clip.start_ms - START_MS == 2000
+    assert clip.end_ms - START_MS == 5900
+    assert clip.frames == 40
+    data = clip.path.read_bytes()
+    assert len(data) % PACKET_SIZE == 0
+
+
+def test_export_clip_never_overwrites(tmp_path):
+    buffer = EventBuffer(max_seconds=60, max_bytes=1_000_000)
+    for i in range(50):
+        buffer.add(_frame(i))
+    (tmp_path / "clip.ts").write_bytes(b"earlier clip")
+
+    clips = [
+        export_clip(
+            buffer, tmp_path / "clip.ts", before_seconds=1, after_seconds=0
+        )
+        for _ in range(2)
+    ]
+
+    assert [clip.path.name for clip in clips] == ["clip-2.ts", "clip-3.ts"]
+    assert (tmp_path / "clip.ts").read_bytes() == b"earlier clip"
@@ -0,0 +1,85 @@
+import threading
+
+from wyze_rtsp_bridge.fanout import FrameFanout
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+
+def _frame(n, is_keyframe=False):
+    frame_info = FrameInfoStruct()
+    frame_info.is_keyframe = int(is_keyframe)
+    frame_info.frame_no = n
+    return f"frame-{n}".encode(), frame_info
+
+
+class _Collector:
+    def __init__(self, expected):
+        self.frames = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, frame):
+        self.frames.append(frame[1].frame_no)
+        if len(self.frames) >= self.expected:
+            self.done.set()
+
+
+def test_every_subscriber_gets_every_frame():
+    fanout = FrameFanout("test", gop_cache_max_frames=0)
+    collectors = [_Collector(5) for _ in range(3)]
+    for subscriber_id, collector in enumerate(collectors):
+        assert fanout.subscribe(subscriber_id, collector)
+    assert not fanout.subscribe(0, collectors[0])
+
+    for n in range(5):
+        fanout.publish(_frame(n))
+
+    for collector in collectors:
+        assert collector.done.wait(timeout=1)
+        assert collector.frames == [0, 1, 2, 3, 4]
+
+
+def test_unsubscribe_only_affects_one_subscriber():
+    idle = threading.Event()
+    fanout = FrameFanout("test", on_idle=idle.set)
+    fanout.subscribe(1, _Collector(1))
+    fanout.subscribe(2, _Collector(1))
+    snapshot = fanout.subscribers
+
+    assert fanout.unsubscribe(1) is not None
+    assert fanout.unsubscribe(1) is None
+    assert 1 not in fanout and 2 in fanout
+    assert 1 in snapshot, "existing snapshots must not be modified"
+    assert not idle.is_set()
+
+    fanout.unsubscribe(2)
+    assert idle.is_set()
+
+
+def test_new_subscriber_starts_with_gop_burst():
+    fanout = FrameFanout("test")
+    for n in range(4):
+        fanout.publish(_frame(n, is_keyframe=n == 2))
+
+    collector = _Collector(3)
+    fanout.subscribe(1, collector)
+    fanout.publish(_frame(4))
+    assert collector.done.wait(timeout=1)
+    assert collector.frames == [2, 3, 4]
+
+
+def test_frame_filter_applies_to_the_burst_and_live_frames():
+    fanout = FrameFanout("test")
+    for n in range(4):
+        fanout.publish(_frame(n, is_keyframe=n % 2 == 0))
+
+    everything = _Collector(4)
+    keyframes = _Collector(2)
+    fanout.subscribe(1, everything)
+    fanout.subscribe(2, keyframes, frame_filter=lambda f: f[1].is_keyframe)
+    for n in range(4, 6):
+        fanout.publish(_frame(n, is_keyframe=n % 2 == 0))
+
+    assert everything.done.wait(timeout=1)
+    assert keyframes.done.wait(timeout=1)
+    assert everything.frames == [2, 3, 4, 5]
+    assert keyframes.frames == [2, 4]
@@ -0,0 +1,75 @@
+import pytest
+from wyze_rtsp_bridge.frame_filter import (
+    FpsFilter,
+    KeyframeFilter,
+    parse_frame_filter,
+)
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+START_MS = 1_600_000_000_000
+
+
+def _frame(timestamp_ms, keyframe):
+    frame_info = FrameInfoStruct()
+    frame_info.is_keyframe = int(keyframe)
+    frame_info.timestamp = timestamp_ms // 1000
+    frame_info.timestamp_ms = timestamp_ms % 1000
+    return b"", frame_info
+
+
+def _passed(frame_filter, seconds, fps=20, gop=20):
+    """The offsets (in ms) of the frames passed, out of `seconds` of video"""
+    passed = []
+    for i in range(seconds * fps):
+        offset_ms = i * 1000 // fps
+        if frame_filter(_frame(START_MS + offset_ms, i % gop == 0)):
+            passed.append(offset_ms)
+    return passed
+
+
+def test_keyframe_filter():
+    assert _passed(KeyframeFilter(), 3) == [0, 1000, 2000]
+
+
+def test_fps_filter_decimates_keyframes():
+    assert _passed(FpsFilter(0.5), 6) == [0, 2000, 4000]
+    assert _passed(FpsFilter(1 / 3), 6, gop=10) == [0, 3000]
+
+
+def test_fps_filter_is_capped_by_the_keyframe_rate():
+    assert _passed(FpsFilter(5), 3) == [0, 1000, 2000]
+
+
+def test_fps_filter_tolerates_jitter():
+    frame_filter = FpsFilter(1)
+    assert frame_filter(_frame(START_MS, True))
+    assert frame_filter(_frame(START_MS + 980, True))
+    assert not frame_filter(_frame(START_MS + 1500, True))
+
+
+def test_fps_filter_follows_a_clock_jumping_back():
+    frame_filter = FpsFilter(1)
+    assert frame_filter(_frame(START_MS, True))
+    assert frame_filter(_frame(START_MS - 60_000, True))
+
+
+def test_parse_frame_filter():
+    assert parse_frame_filter("/2cabcdef1234") is None
+    assert parse_frame_filter("/2cabcdef1234/sd", "") is None
+    assert isinstance(
+        parse_frame_filter("/2cabcdef1234/keyframes"), KeyframeFilter
+    )
+    assert isinstance(
+        parse_frame_filter("/2cabcdef1234/sd/keyframes"), KeyframeFilter
+    )
+    fps_filter = parse_frame_filter("/2cabcdef1234", "fps=0.25")
+    assert isinstance(fps_filter, FpsFilter)
+    assert fps_filter.fps == 0.25
+    # a mac that happens to be called keyframes is still just a camera
+    assert parse_frame_filter("/keyframes") is None
+
+
+@pytest.mark.parametrize("query", ["fps=0", "fps=-1", "fps=fast", "fps=nan"])
+def test_parse_frame_filter_rejects_bad_fps(query):
+    with pytest.raises(ValueError):
+        parse_frame_filter("/2cabcdef1234", query)
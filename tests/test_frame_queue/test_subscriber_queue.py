@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import queue
+import threading
+
+import pytest
+from wyze_rtsp_bridge.frame_queue import (
+    DropPolicy,
+    SubscriberQueue,
+    SubscriberThread,
+)
+
+
+def _frame(n, is_keyframe=False):
+    return f"frame-{n}".encode(), SimpleNamespace(is_keyframe=int(is_keyframe))
+
+
+def _queued_names(q):
+    names = []
+    while len(q):
+        names.append(q.get(timeout=0)[0])
+    return names
+
+
+def test_put_get_in_order():
+    q = SubscriberQueue(3)
+    for n in range(3):
+        q.put(_frame(n))
+    assert q.depth == 3
+    assert _queued_names(q) == [b"frame-0", b"frame-1", b"frame-2"]
+    assert q.dropped == 0
+
+
+def test_drop_oldest():
+    q = SubscriberQueue(2, DropPolicy.DROP_OLDEST)
+    for n in range(4):
+        q.put(_frame(n))
+    assert _queued_names(q) == [b"frame-2", b"frame-3"]
+    assert q.dropped == 2
+
+
+def test_drop_until_keyframe():
+    q = SubscriberQueue(2, DropPolicy.DROP_UNTIL_KEYFRAME)
+    q.put(_frame(0, is_keyframe=True))
+    q.put(_frame(1))
+    q.put(_frame(2))  # overflows; everything is dropped
+    q.put(_frame(3))  # still waiting for a keyframe
+    q.put(_frame(4, is_keyframe=True))
+    q.put(_frame(5))
+    assert _queued_names(q) == [b"frame-4", b"frame-5"]
+    assert q.dropped == 4
+
+
+def test_disconnect_raises_full():
+    q = SubscriberQueue(1, DropPolicy.DISCONNECT)
+    q.put(_frame(0))
+    with pytest.raises(queue.Full):
+        q.put(_frame(1))
+
+
+def test_get_times_out_and_close_wakes_readers():
+    q = SubscriberQueue(1)
+    assert q.get(timeout=0.01) is None
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(q.get()))
+    reader.start()
+    q.close()
+    reader.join(timeout=1)
+    assert result == [None]
+
+
+def test_subscriber_thread_drains_queue():
+    received = []
+    done = threading.Event()
+
+    def callback(frame):
+        received.append(frame[0])
+        if len(received) == 3:
+            done.set()
+
+    subscriber = SubscriberThread(1, callback, 10, DropPolicy.DROP_OLDEST)
+    subscriber.start()
+    for n in range(3):
+        subscriber.put(_frame(n))
+    assert done.wait(timeout=1)
+    subscriber.stop()
+    subscriber.join(timeout=1)
+    assert received == [b"frame-0", b"frame-1", b"frame-2"]
+    assert subscriber.delivered == 3
@@ -0,0 +1,54 @@
+from wyze_rtsp_bridge.gop_cache import GopCache, frame_timestamp_ms
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+
+def _frame(n, is_keyframe=False):
+    frame_info = FrameInfoStruct()
+    frame_info.is_keyframe = int(is_keyframe)
+    frame_info.frame_no = n
+    frame_info.timestamp = 1000 + n // 10
+    frame_info.timestamp_ms = (n % 10) * 100
+    return f"frame-{n}".encode(), frame_info
+
+
+def test_empty_until_first_keyframe():
+    cache = GopCache()
+    cache.add(_frame(0))
+    cache.add(_frame(1))
+    assert cache.burst() == []
+    assert cache.latest_keyframe() is None
+
+    cache.add(_frame(2, is_keyframe=True))
+    cache.add(_frame(3))
+    assert [frame for frame, _ in cache.burst()] == [b"frame-2", b"frame-3"]
+
+
+def test_keyframe_starts_new_gop():
+    cache = GopCache()
+    for n in range(5):
+        cache.add(_frame(n, is_keyframe=n in (0, 3)))
+    assert [frame for frame, _ in cache.burst()] == [b"frame-3", b"frame-4"]
+    assert cache.latest_keyframe()[0] == b"frame-3"
+
+
+def test_gop_longer_than_max_frames_is_dropped():
+    cache = GopCache(max_frames=3)
+    for n in range(4):
+        cache.add(_frame(n, is_keyframe=n == 0))
+    assert cache.burst() == []
+
+
+def test_burst_timestamps_are_packed_and_copied():
+    cache = GopCache()
+    frames = [_frame(n, is_keyframe=n == 0) for n in range(15)]
+    for frame in frames:
+        cache.add(frame)
+
+    burst = cache.burst()
+    timestamps = [frame_timestamp_ms(frame_info) for _, frame_info in burst]
+    assert timestamps[-1] == frame_timestamp_ms(frames[-1][1])
+    assert timestamps == list(range(timestamps[0], timestamps[-1] + 1))
+    assert [info.frame_no for _, info in burst] == list(range(15))
+
+    # the cached frame infos must not have been modified
+    assert frame_timestamp_ms(frames[0][1]) == 1_000_000
@@ -0,0 +1,87 @@
+from wyze_rtsp_bridge.hls import HlsSegmenter
+from wyze_rtsp_bridge.mpegts import PACKET_SIZE
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+START_MS = 1_600_000_000_000
+
+
+def _frame(i, fps=10, gop=10):
+    timestamp_ms = START_MS + i * 1000 // fps
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = 78
+    frame_info.is_keyframe = int(i % gop == 0)
+    frame_info.timestamp = timestamp_ms // 1000
+    frame_info.timestamp_ms = timestamp_ms % 1000
+    return b"\x00" * 500, frame_info
+
+
+def _segmenter(frames, **kwargs):
+    segmenter = HlsSegmenter("AABBCCDDEEFF", **kwargs)
+    for i in range(frames):
+        segmenter.add(_frame(i))
+    return segmenter
+
+
+def test_segments_start_on_keyframes():
+    # keyframes every second, segments of at least 1.5s
+    segmenter = _segmenter(65, segment_seconds=1.5, part_seconds=0.5)
+    assert [s.sequence for s in segmenter.segments] == [0, 1, 2, 3]
+    assert [s.duration for s in segmenter.segments if s.complete] == [
+        2.0,
+        2.0,
+        2.0,
+    ]
+    for segment in segmenter.segments:
+        assert all(part.duration <= 0.5 for part in segment.parts)
+    # parts starting on a keyframe (every other one) are independent
+    assert [part.independent for part in segmenter.segments[0].parts] == [
+        True,
+        False,
+        True,
+        False,
+    ]
+
+
+def test_segment_is_its_parts():
+    segmenter = _segmenter(25, segment_seconds=1, part_seconds=0.3)
+    data = segmenter.segment(0)
+    assert data is not None
+    assert len(data) % PACKET_SIZE == 0
+    assert data == b"".join(
+        segmenter.part(0, n) for n in range(len(segmenter.segments[0].parts))
+    )
+    # still being filled
+    assert segmenter.segment(2) is None
+
+
+def test_window():
+    segmenter = _segmenter(100, segment_seconds=1, window_segments=3)
+    assert [s.sequence for s in segmenter.segments] == [6, 7, 8, 9]
+    assert segmenter.segment(5) is None
+
+
+def test_playlist():
+    segmenter = _segmenter(35, segment_seconds=1, part_seconds=0.5)
+    playlist = segmenter.playlist().splitlines()
+    assert playlist[0] == "#EXTM3U"
+    assert "#EXT-X-MEDIA-SEQUENCE:0" in playlist
+    assert "#EXT-X-TARGETDURATION:1" in playlist
+    assert [line for line in playlist if line.endswith(".ts")] == [
+        "seg-0.ts",
+        "seg-1.ts",
+        "seg-2.ts",
+    ]
+    assert (
+        '#EXT-X-PART:DURATION=0.500,URI="part-2.0.ts",INDEPENDENT=YES'
+        in playlist
+    )
+    assert playlist[-1] == '#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part-3.0.ts"'
+
+
+def test_blocking_waits():
+    segmenter = _segmenter(16, segment_seconds=1, part_seconds=0.5)
+    assert segmenter.wait_for(0, None, timeout=0)
+    assert segmenter.wait_for(1, 0, timeout=0)
+    assert not segmenter.wait_for(1, None, timeout=0)
+    assert not segmenter.wait_for(1, 1, timeout=0)
+    assert segmenter.next_part() == (1, 1)
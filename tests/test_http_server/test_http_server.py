@@ -0,0 +1,69 @@
+import urllib.error
+import urllib.request
+
+import pytest
+from wyze_rtsp_bridge.http_server import HttpRequest, HttpResponse, HttpServer
+
+
+@pytest.fixture
+def _server():
+    server = HttpServer("127.0.0.1", 0)
+    server.add_route(
+        "/hello", lambda request: HttpResponse(200, b"hello " + request.body)
+    )
+    server.add_route(
+        "/files",
+        lambda request: HttpResponse(200, request.path.encode("ascii")),
+        prefix=True,
+    )
+    server.start()
+    assert server.server
+    server.port = server.server.server_address[1]
+    yield server
+    server.stop()
+
+
+def _get(server, path):
+    url = f"http://127.0.0.1:{server.port}{path}"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read()
+
+
+def test_route(_server):
+    assert _get(_server, "/hello") == b"hello "
+
+
+def test_prefix_route(_server):
+    assert _get(_server, "/files/a/b.ts") == b"/files/a/b.ts"
+
+
+def test_not_found(_server):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        _get(_server, "/missing")
+    assert e.value.code == 404
+
+
+def test_method_not_allowed():
+    server = HttpServer("127.0.0.1", 0)
+    server.add_route("/hello", lambda request: HttpResponse(200))
+    response = server.handle(HttpRequest("POST", "/hello", {}, b""))
+    assert response.status == 405
+
+
+def test_response_headers():
+    server = HttpServer("127.0.0.1", 0)
+    server.add_route(
+        "/cached",
+        lambda request: HttpResponse(
+            200, b"", headers={"Cache-Control": "max-age=10"}
+        ),
+    )
+    server.start()
+    assert server.server
+    port = server.server.server_address[1]
+    try:
+        url = f"http://127.0.0.1:{port}/cached"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Cache-Control"] == "max-age=10"
+    finally:
+        server.stop()
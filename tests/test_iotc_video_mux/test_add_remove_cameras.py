@@ -0,0 +1,71 @@
+import types
+
+import pytest
+from wyze_rtsp_bridge.iotc_video_mux import WyzeIOTCVideoMux
+
+
+class _IOTC:
+    def connect_and_auth(self, account, camera):
+        return types.SimpleNamespace(camera=camera)
+
+
+def _camera(mac):
+    return types.SimpleNamespace(mac=mac)
+
+
+def _mux(macs):
+    return WyzeIOTCVideoMux(
+        _IOTC(), None, [_camera(mac) for mac in macs]  # type: ignore
+    )
+
+
+def test_add_cameras():
+    mux = _mux(["AA0000000001"])
+    listeners = mux.add_cameras([_camera("AA0000000002")])  # type: ignore
+    assert [listener.camera.mac for listener in listeners] == ["AA0000000002"]
+    assert set(mux.listeners) == {"aa0000000001", "aa0000000002"}
+    assert [c.mac for c in mux.cameras] == ["AA0000000001", "AA0000000002"]
+
+
+def test_add_camera_twice():
+    mux = _mux(["AA0000000001"])
+    with pytest.raises(ValueError):
+        mux.add_cameras([_camera("aa0000000001")])  # type: ignore
+    assert len(mux.cameras) == 1
+
+
+def test_remove_camera_drops_its_subscribers():
+    mux = _mux(["AA0000000001", "AA0000000002"])
+    cameras = mux.cameras
+    listener = mux.get_listener("AA0000000001")
+    mux.subscribe("AA0000000001", 1, lambda listener, data: None)
+    assert listener.fanout
+
+    mux.remove_camera("AA0000000001")
+    assert set(mux.listeners) == {"aa0000000002"}
+    assert [c.mac for c in mux.cameras] == ["AA0000000002"]
+    assert not listener.fanout
+    # the list the mux was made with is left alone
+    assert len(cameras) == 2
+
+
+def test_added_cameras_share_the_worker_processes():
+    mux = WyzeIOTCVideoMux(
+        None,  # type: ignore
+        None,  # type: ignore
+        [_camera("AA0000000001")],  # type: ignore
+        worker_processes=1,
+        shm_ring_bytes=1 << 16,
+        spare_cameras_per_worker=1,
+    )
+    mux.add_cameras([_camera("AA0000000002")])  # type: ignore
+    assert len(mux.shards) == 1
+    (shard,) = mux.shards
+    assert set(shard.listeners) == {"aa0000000001", "aa0000000002"}
+    assert set(mux.listeners) == set(shard.listeners)
+
+    mux.remove_camera("AA0000000001")
+    assert mux.shards == [shard]
+    mux.remove_camera("AA0000000002")
+    assert mux.shards == []
+    assert shard.rings == {}
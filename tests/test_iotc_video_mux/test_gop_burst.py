@@ -0,0 +1,81 @@
+import types
+
+import threading
+
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.hls import HlsSegmenter, HlsServer
+from wyze_rtsp_bridge.iotc_video_mux import WyzeIOTCVideoMux
+from wyze_rtsp_bridge.recorder import SegmentRecorder
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+MAC = "AABBCCDDEEFF"
+START_MS = 1_600_000_000_000
+GOP = 15
+
+
+class _IOTC:
+    def connect_and_auth(self, account, camera):
+        return types.SimpleNamespace(camera=camera)
+
+
+def _frame(i, fps=10):
+    timestamp_ms = START_MS + i * 1000 // fps
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = 78
+    frame_info.is_keyframe = int(i == 0)
+    frame_info.frame_no = i
+    frame_info.timestamp = timestamp_ms // 1000
+    frame_info.timestamp_ms = timestamp_ms % 1000
+    return b"\x00" * 100, frame_info
+
+
+def _mux_with_cached_gop():
+    mux = WyzeIOTCVideoMux(
+        _IOTC(), None, [types.SimpleNamespace(mac=MAC)]  # type: ignore
+    )
+    for i in range(GOP):
+        mux.get_listener(MAC).fanout.publish(_frame(i))
+    return mux
+
+
+class _Timestamps:
+    def __init__(self):
+        self.timestamps = []
+        self.done = threading.Event()
+
+    def __call__(self, data):
+        self.timestamps.append(frame_timestamp_ms(data[1]))
+        if len(self.timestamps) == GOP:
+            self.done.set()
+
+
+def test_recorder_and_hls_get_the_cameras_timestamps(tmp_path, monkeypatch):
+    mux = _mux_with_cached_gop()
+    original = [frame_timestamp_ms(_frame(i)[1]) for i in range(GOP)]
+
+    recorded = _Timestamps()
+    recorder = SegmentRecorder(MAC, tmp_path)
+    recorder.write = recorded  # type: ignore
+    recorder.start(mux)
+
+    segmented = _Timestamps()
+    monkeypatch.setattr(
+        HlsSegmenter, "add", lambda segmenter, data: segmented(data)
+    )
+    HlsServer(mux).segmenter(MAC.lower())
+
+    assert recorded.done.wait(5)
+    assert segmented.done.wait(5)
+    assert recorded.timestamps == original
+    assert segmented.timestamps == original
+
+
+def test_players_get_a_packed_burst():
+    mux = _mux_with_cached_gop()
+    played = _Timestamps()
+    mux.subscribe(MAC, 1, lambda listener, data: played(data), pack_burst=True)
+
+    assert played.done.wait(5)
+    # ending at the newest frame, so the live stream carries on from there
+    assert played.timestamps[-1] == frame_timestamp_ms(_frame(GOP - 1)[1])
+    assert played.timestamps[-1] - played.timestamps[0] < GOP
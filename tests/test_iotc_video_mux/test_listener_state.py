@@ -0,0 +1,139 @@
+import types
+
+import threading
+
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListener,
+    WyzeIOTCVideoListenerState,
+)
+from wyze_rtsp_bridge.reconnect_scheduler import ReconnectScheduler
+from wyzecam.iotc import WyzeIOTCSessionState
+from wyzecam.tutk import tutk
+
+
+def _listener():
+    camera = types.SimpleNamespace(mac="AABBCCDDEEFF")
+    return WyzeIOTCVideoListener(None, camera)  # type: ignore
+
+
+def test_wait_for_state_times_out():
+    listener = _listener()
+    assert not listener.wait_for_state(
+        lambda state: state == WyzeIOTCVideoListenerState.CONNECTED,
+        timeout=0.01,
+    )
+
+
+def test_wait_for_state_wakes_on_transition():
+    listener = _listener()
+    timer = threading.Timer(
+        0.05,
+        listener.transition_state,
+        args=(
+            lambda old: old == WyzeIOTCVideoListenerState.DISCONNECTED,
+            WyzeIOTCVideoListenerState.CONNECTED,
+        ),
+    )
+    timer.start()
+    assert listener.wait_for_state(
+        lambda state: state == WyzeIOTCVideoListenerState.CONNECTED,
+        timeout=5,
+    )
+    timer.join()
+
+
+def test_transition_state_checks_condition():
+    listener = _listener()
+    assert not listener.transition_state(
+        lambda old: old == WyzeIOTCVideoListenerState.STREAMING,
+        WyzeIOTCVideoListenerState.PAUSE_REQUESTED,
+    )
+    assert listener.state == WyzeIOTCVideoListenerState.DISCONNECTED
+
+
+class _DroppingSession:
+    """Connects, sends the first frame, then drops the stream"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def session_check(self):
+        return types.SimpleNamespace(mode=2)
+
+    def recv_video_data(self):
+        self.calls += 1
+        if self.calls % 2 == 0:
+            raise tutk.TutkError(-20015)
+        yield b"", types.SimpleNamespace(
+            is_keyframe=1, frame_no=0, frame_size=0
+        )
+
+
+class _RecordingScheduler(ReconnectScheduler):
+    def __init__(self):
+        super().__init__(max_concurrent=None)
+        self.failures = []
+        self.listener = None
+
+    def wait_to_retry(self, failures, wait):
+        self.failures.append(failures)
+        if len(self.failures) == 3:
+            self.listener.disconnect()
+
+
+def test_retries_reset_once_connected():
+    scheduler = _RecordingScheduler()
+    camera = types.SimpleNamespace(mac="AABBCCDDEEFF")
+    listener = WyzeIOTCVideoListener(
+        _DroppingSession(),  # type: ignore
+        camera,  # type: ignore
+        pause_after_idle_seconds=None,
+        reconnect_scheduler=scheduler,
+    )
+    scheduler.listener = listener
+    listener.start()
+    listener.join(5)
+
+    assert not listener.is_alive()
+    assert scheduler.failures == [1, 1, 1]
+    assert listener.state == WyzeIOTCVideoListenerState.DISCONNECTED
+
+
+class _DisconnectingSession(_DroppingSession):
+    """Has the listener disconnected while it reads the first frame"""
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+        self.state = WyzeIOTCSessionState.AUTHENTICATION_SUCCEEDED
+
+    def recv_video_data(self):
+        self.calls += 1
+        if self.calls == 1:
+            self.listener.disconnect()
+            yield b"", types.SimpleNamespace(
+                is_keyframe=1, frame_no=0, frame_size=0
+            )
+
+
+def test_disconnect_while_connecting_is_not_overwritten():
+    session = _DisconnectingSession()
+    camera = types.SimpleNamespace(mac="AABBCCDDEEFF")
+    listener = WyzeIOTCVideoListener(
+        session,  # type: ignore
+        camera,  # type: ignore
+        pause_after_idle_seconds=None,
+    )
+    session.listener = listener
+    listener.start()
+    listener.join(5)
+
+    assert not listener.is_alive()
+    assert session.calls == 1
+    assert listener.state == WyzeIOTCVideoListenerState.DISCONNECTED
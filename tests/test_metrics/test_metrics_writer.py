@@ -0,0 +1,46 @@
+from wyze_rtsp_bridge.metrics import Histogram, MetricsWriter
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [
+        (0.1, 2),
+        (1.0, 3),
+        (float("inf"), 4),
+    ]
+    assert histogram.count == 4
+    assert histogram.sum == 5.65
+
+
+def test_samples_are_grouped_by_metric():
+    writer = MetricsWriter()
+    writer.counter("frames_total", "Frames", 1, {"camera": "a"})
+    writer.gauge("depth", "Depth", 2, {"camera": "a"})
+    writer.counter("frames_total", "Frames", 3, {"camera": 'b"'})
+
+    assert writer.render().splitlines() == [
+        "# HELP frames_total Frames",
+        "# TYPE frames_total counter",
+        'frames_total{camera="a"} 1',
+        'frames_total{camera="b\\""} 3',
+        "# HELP depth Depth",
+        "# TYPE depth gauge",
+        'depth{camera="a"} 2',
+    ]
+
+
+def test_histogram_rendering():
+    histogram = Histogram(buckets=(1.0,))
+    histogram.observe(0.5)
+    writer = MetricsWriter()
+    writer.histogram("latency_seconds", "Latency", histogram, {"camera": "a"})
+
+    assert writer.render().splitlines()[2:] == [
+        'latency_seconds_bucket{camera="a",le="1.0"} 1',
+        'latency_seconds_bucket{camera="a",le="+Inf"} 1',
+        'latency_seconds_sum{camera="a"} 0.5',
+        'latency_seconds_count{camera="a"} 1',
+    ]
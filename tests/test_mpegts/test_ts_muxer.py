@@ -0,0 +1,97 @@
+import struct
+
+from wyze_rtsp_bridge.mpegts import (
+    PACKET_SIZE,
+    PAT_PID,
+    PMT_PID,
+    STREAM_TYPE_H265,
+    VIDEO_PID,
+    TsMuxer,
+    crc32_mpeg2,
+)
+
+
+def _packets(data):
+    assert len(data) % PACKET_SIZE == 0
+    for i in range(0, len(data), PACKET_SIZE):
+        packet = data[i : i + PACKET_SIZE]
+        assert packet[0] == 0x47
+        pid = struct.unpack(">H", packet[1:3])[0] & 0x1FFF
+        start = bool(packet[1] & 0x40)
+        control = (packet[3] >> 4) & 0x3
+        payload = packet[4:]
+        adaptation = b""
+        if control & 0x2:
+            adaptation = payload[1 : 1 + payload[0]]
+            payload = payload[1 + payload[0] :]
+        yield pid, start, packet[3] & 0x0F, adaptation, payload
+
+
+def _demux(data):
+    """Returns [(pts, payload, random_access)] for each PES packet"""
+    pes_packets = []
+    for pid, start, _, adaptation, payload in _packets(data):
+        if pid != VIDEO_PID:
+            continue
+        if start:
+            random_access = bool(adaptation and adaptation[0] & 0x40)
+            pes_packets.append([bytearray(), random_access])
+        pes_packets[-1][0] += payload
+
+    result = []
+    for pes, random_access in pes_packets:
+        assert pes[:4] == b"\x00\x00\x01\xe0"
+        p = pes[9:14]
+        pts = (
+            ((p[0] >> 1) & 0x07) << 30
+            | p[1] << 22
+            | (p[2] >> 1) << 15
+            | p[3] << 7
+            | p[4] >> 1
+        )
+        result.append((pts, bytes(pes[9 + pes[8] :]), random_access))
+    return result
+
+
+def test_tables_have_valid_crcs():
+    data = TsMuxer(STREAM_TYPE_H265).tables()
+    tables = {pid: payload for pid, _, _, _, payload in _packets(data)}
+    assert set(tables) == {PAT_PID, PMT_PID}
+    for payload in tables.values():
+        section_length = struct.unpack(">H", payload[2:4])[0] & 0x0FFF
+        section = payload[1 : 4 + section_length]
+        assert crc32_mpeg2(section) == 0
+    # the elementary stream's type, in the PMT
+    assert tables[PMT_PID][13] == STREAM_TYPE_H265
+
+
+def test_frames_round_trip():
+    muxer = TsMuxer()
+    # sizes around packet boundaries, to exercise the stuffing
+    frames = [
+        bytes([i]) * size
+        for i, size in enumerate((1, 150, 160, 161, 162, 5000))
+    ]
+    data = b"".join(
+        muxer.mux(frame, pts=i * 6000, keyframe=i == 0)
+        for i, frame in enumerate(frames)
+    )
+
+    demuxed = _demux(data)
+    assert [pts for pts, _, _ in demuxed] == [
+        i * 6000 for i in range(len(frames))
+    ]
+    assert all(
+        payload[len(payload) - len(frame) :] == frame
+        for (_, payload, _), frame in zip(demuxed, frames)
+    )
+    assert [random_access for _, _, random_access in demuxed] == [True] + [
+        False
+    ] * (len(frames) - 1)
+
+
+def test_continuity_counters_increment():
+    muxer = TsMuxer()
+    data = muxer.mux(b"\x00" * 1000, pts=0, keyframe=True)
+    counters = [cc for pid, _, cc, _, _ in _packets(data) if pid == VIDEO_PID]
+    assert counters == list(range(len(counters)))
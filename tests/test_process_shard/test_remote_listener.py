@@ -0,0 +1,68 @@
+import types
+
+import threading
+import time
+
+import pytest
+from wyze_rtsp_bridge.process_shard import ListenerShard, RemoteVideoListener
+from wyze_rtsp_bridge.shm_ring import FrameRing
+from wyze_rtsp_bridge.stream_quality import StreamQuality
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create(1 << 16)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def _frame(frame_no, frame_size):
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = 78
+    frame_info.is_keyframe = 1
+    frame_info.frame_size = frame_size
+    frame_info.frame_no = frame_no
+    return b"\x00" * 100, frame_info
+
+
+def test_doorbell_frames_are_published(ring):
+    wakeup = threading.Semaphore(0)
+    shard = types.SimpleNamespace(
+        send=lambda *message: None, close_ring=lambda mac: None
+    )
+    camera = types.SimpleNamespace(mac="AABBCCDDEEFF")
+    listener = RemoteVideoListener(camera, shard, ring, wakeup)  # type: ignore
+    received = []
+    listener.subscribe(1, lambda listener, data: received.append(data))
+    listener.start()
+    try:
+        # the reader starts at the newest frame, so keep writing until
+        # one gets through
+        deadline = time.monotonic() + 5
+        frame_no = 0
+        while not received and time.monotonic() < deadline:
+            ring.write(_frame(frame_no, StreamQuality.HD.frame_size + 3))
+            wakeup.release()
+            frame_no += 1
+            time.sleep(0.01)
+        assert received
+    finally:
+        listener.exited.set()
+        listener.join(5)
+
+
+def test_ring_is_unlinked_when_its_camera_exits():
+    camera = types.SimpleNamespace(mac="AABBCCDDEEFF")
+    shard = ListenerShard(0, None, [camera], ring_bytes=1 << 16)  # type: ignore
+    name = shard.rings["aabbccddeeff"].name
+    listener = shard.listeners["aabbccddeeff"]
+    listener.start()
+    # as when the worker reports that the camera's listener exited
+    listener.exited.set()
+    listener.join(5)
+
+    assert shard.rings == {}
+    with pytest.raises(FileNotFoundError):
+        FrameRing.attach(name)
@@ -0,0 +1,123 @@
+import threading
+import time
+
+from wyze_rtsp_bridge.reconnect_scheduler import (
+    ReconnectScheduler,
+    merge_stats,
+    slot_wait_histogram,
+)
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def _acquire_in_thread(scheduler, granted, name, has_priority=False):
+    def run():
+        if scheduler.acquire(lambda: has_priority):
+            granted.append(name)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_backoff_is_jittered_up_to_the_cap():
+    scheduler = ReconnectScheduler(
+        base_delay=1.0, max_delay=10.0, uniform=lambda low, high: high
+    )
+    assert [scheduler.backoff(n) for n in range(6)] == [
+        1.0,
+        2.0,
+        4.0,
+        8.0,
+        10.0,
+        10.0,
+    ]
+    assert scheduler.backoff(10_000) == 10.0
+
+    scheduler = ReconnectScheduler(base_delay=1.0, max_delay=10.0)
+    delays = [scheduler.backoff(3) for _ in range(200)]
+    assert all(0 <= delay <= 8.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_concurrent_attempts_are_capped():
+    scheduler = ReconnectScheduler(max_concurrent=2)
+    assert scheduler.acquire()
+    assert scheduler.acquire()
+    granted = []
+    thread = _acquire_in_thread(scheduler, granted, "third")
+    _wait_until(lambda: scheduler.stats().waiting == 1)
+    assert granted == []
+    assert scheduler.stats().in_flight == 2
+
+    scheduler.release()
+    thread.join(5)
+    assert granted == ["third"]
+    stats = scheduler.stats()
+    assert (stats.waiting, stats.in_flight, stats.attempts) == (0, 2, 3)
+
+
+def test_cameras_with_subscribers_go_first():
+    scheduler = ReconnectScheduler(max_concurrent=1)
+    assert scheduler.acquire()
+    granted = []
+    threads = [_acquire_in_thread(scheduler, granted, "idle")]
+    _wait_until(lambda: scheduler.stats().waiting == 1)
+    threads.append(
+        _acquire_in_thread(scheduler, granted, "watched", has_priority=True)
+    )
+    _wait_until(lambda: scheduler.stats().waiting == 2)
+
+    scheduler.release()
+    _wait_until(lambda: granted == ["watched"])
+    scheduler.release()
+    _wait_until(lambda: granted == ["watched", "idle"])
+    for thread in threads:
+        thread.join(5)
+    assert scheduler.stats().priority_attempts == 1
+
+
+def test_waiting_can_be_cancelled():
+    scheduler = ReconnectScheduler(max_concurrent=1)
+    assert scheduler.acquire()
+    assert not scheduler.acquire(cancelled=lambda: True)
+    assert scheduler.stats().waiting == 0
+
+
+def test_wake_cancels_waiting():
+    scheduler = ReconnectScheduler(max_concurrent=1)
+    assert scheduler.acquire()
+    cancelled = threading.Event()
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(
+            scheduler.acquire(cancelled=cancelled.is_set)
+        ),
+        daemon=True,
+    )
+    thread.start()
+    _wait_until(lambda: scheduler.stats().waiting == 1)
+
+    cancelled.set()
+    scheduler.wake()
+    thread.join(5)
+    assert results == [False]
+    assert scheduler.stats().waiting == 0
+
+
+def test_merge_stats():
+    first, second = ReconnectScheduler(), ReconnectScheduler()
+    first.acquire()
+    second.acquire()
+    second.release()
+    second.wait_to_retry(1, lambda delay: None)
+    merged = merge_stats([first.stats(), second.stats()])
+    assert merged is not None
+    assert (merged.in_flight, merged.attempts, merged.retries) == (1, 2, 1)
+    assert slot_wait_histogram(merged).count == 2
+    assert merge_stats([]) is None
@@ -0,0 +1,109 @@
+import os
+import time
+
+from wyze_rtsp_bridge.mpegts import PACKET_SIZE
+from wyze_rtsp_bridge.recorder import SegmentRecorder
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+H264 = 78
+
+
+def _frame(timestamp_ms, keyframe, size=1000):
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = H264
+    frame_info.is_keyframe = int(keyframe)
+    frame_info.timestamp = timestamp_ms // 1000
+    frame_info.timestamp_ms = timestamp_ms % 1000
+    return b"\x00" * size, frame_info
+
+
+def _record(recorder, seconds, fps=10, gop=20, start_ms=1_600_000_000_000):
+    for i in range(seconds * fps):
+        recorder.write(_frame(start_ms + i * 1000 // fps, i % gop == 0))
+
+
+def test_segments_are_cut_on_keyframes(tmp_path):
+    recorder = SegmentRecorder("AABBCCDDEEFF", tmp_path, segment_seconds=5)
+    recorder.directory.mkdir(parents=True)
+    # keyframes every 2s, so segments are cut at 0s, 6s, 12s and 18s
+    _record(recorder, 20)
+    recorder.close()
+
+    segments = recorder.segments()
+    assert [path.name for path in segments] == [
+        "20200913-122640.ts",
+        "20200913-122646.ts",
+        "20200913-122652.ts",
+        "20200913-122658.ts",
+    ]
+    for path in segments:
+        data = path.read_bytes()
+        assert len(data) % PACKET_SIZE == 0
+        assert data[0] == 0x47
+
+
+def test_waits_for_a_keyframe(tmp_path):
+    recorder = SegmentRecorder("AABBCCDDEEFF", tmp_path)
+    recorder.directory.mkdir(parents=True)
+    recorder.write(_frame(1_600_000_000_000, keyframe=False))
+    recorder.close()
+    assert recorder.segments() == []
+
+
+def test_retention_by_size(tmp_path):
+    recorder = SegmentRecorder(
+        "AABBCCDDEEFF", tmp_path, segment_seconds=1, max_bytes=100_000
+    )
+    recorder.directory.mkdir(parents=True)
+    _record(recorder, 30, gop=10)
+    recorder.close()
+
+    sizes = [path.stat().st_size for path in recorder.segments()]
+    assert sum(sizes) <= 100_000
+    assert recorder.segments_written == 30
+    # the newest segments are the ones kept
+    assert recorder.segments()[-1].name == "20200913-122709.ts"
+
+
+def test_retention_by_age(tmp_path):
+    recorder = SegmentRecorder(
+        "AABBCCDDEEFF", tmp_path, segment_seconds=1, max_age_seconds=3600
+    )
+    recorder.directory.mkdir(parents=True)
+    _record(recorder, 3, gop=10)
+    old = recorder.segments()[0]
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+
+    recorder.enforce_retention()
+    assert old not in recorder.segments()
+    assert len(recorder.segments()) == 2
+
+
+def test_existing_segments_are_not_overwritten(tmp_path):
+    recorder = SegmentRecorder("AABBCCDDEEFF", tmp_path, segment_seconds=5)
+    recorder.directory.mkdir(parents=True)
+    existing = recorder.directory / "20200913-122640.ts"
+    existing.write_bytes(b"earlier recording")
+    _record(recorder, 2)
+    recorder.close()
+
+    assert existing.read_bytes() == b"earlier recording"
+    assert [path.name for path in recorder.segments()] == [
+        "20200913-122640.ts",
+        "20200913-122640-2.ts",
+    ]
+
+
+def test_clock_stepping_back_cuts_a_segment(tmp_path):
+    recorder = SegmentRecorder("AABBCCDDEEFF", tmp_path, segment_seconds=5)
+    recorder.directory.mkdir(parents=True)
+    _record(recorder, 4)
+    # the camera's clock steps back 10s
+    _record(recorder, 4, start_ms=1_600_000_000_000 - 10_000)
+    recorder.close()
+
+    assert recorder.segments_written == 2
+    assert [path.name for path in recorder.segments()] == [
+        "20200913-122630.ts",
+        "20200913-122640.ts",
+    ]
@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from wyze_rtsp_bridge.shm_export import (
+    SHM_EXPORT_SUBSCRIBER_ID,
+    ShmExporter,
+    ring_name,
+)
+from wyze_rtsp_bridge.shm_ring import FrameRing
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+MAC = "AABBCCDDEEFF"
+
+# the client runs in a process of its own, like a real consumer would
+CLIENT = textwrap.dedent(
+    """
+    import sys
+    from wyze_rtsp_bridge.shm_client import CameraFrameReader
+
+    with CameraFrameReader(sys.argv[1], name_prefix=sys.argv[2]) as reader:
+        print("ready", flush=True)
+        for _ in range(3):
+            frame, frame_info = reader.read(timeout=10)
+            print(frame_info.frame_no, len(frame), frame[0], flush=True)
+    """
+)
+
+
+class _Mux:
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, mac, subscriber_id, callback, quality=None):
+        self.subscribers[(mac, subscriber_id)] = callback
+
+    def unsubscribe(self, mac, subscriber_id):
+        del self.subscribers[(mac, subscriber_id)]
+
+    def is_subscribed(self, mac, subscriber_id):
+        return (mac, subscriber_id) in self.subscribers
+
+
+def _frame(i, size=100):
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = 78
+    frame_info.frame_no = i
+    frame_info.is_keyframe = int(i % 10 == 0)
+    return bytes([i % 256]) * size, frame_info
+
+
+@pytest.fixture
+def prefix():
+    return f"wyze-rtsp-bridge-test-{os.getpid()}-"
+
+
+def test_client_reads_exported_frames(prefix):
+    mux = _Mux()
+    exporter = ShmExporter(MAC, ring_bytes=4096, name_prefix=prefix)
+    exporter.start(mux)  # type: ignore
+    assert mux.is_subscribed(MAC.lower(), SHM_EXPORT_SUBSCRIBER_ID)
+    try:
+        client = subprocess.Popen(
+            [sys.executable, "-c", CLIENT, MAC, prefix],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert client.stdout.readline() == "ready\n"
+        for i in range(1, 4):
+            mux.subscribers[(MAC.lower(), SHM_EXPORT_SUBSCRIBER_ID)](
+                None, _frame(i, size=100 + i)
+            )
+        output, _ = client.communicate(timeout=10)
+        assert client.returncode == 0
+        assert output.splitlines() == ["1 101 1", "2 102 2", "3 103 3"]
+    finally:
+        exporter.stop(mux)  # type: ignore
+
+    assert not mux.subscribers
+    with pytest.raises(FileNotFoundError):
+        FrameRing.attach(ring_name(MAC, prefix))
+
+
+def test_replaces_a_stale_ring(prefix):
+    stale = FrameRing.create(4096, name=ring_name(MAC, prefix))
+    stale.close()
+    mux = _Mux()
+    exporter = ShmExporter(MAC, ring_bytes=8192, name_prefix=prefix)
+    exporter.start(mux)  # type: ignore
+    try:
+        assert exporter.ring.capacity == 8192
+    finally:
+        exporter.stop(mux)  # type: ignore
@@ -0,0 +1,97 @@
+import pytest
+from wyze_rtsp_bridge.shm_ring import FrameRing, FrameRingError, FrameRingReader
+from wyzecam.tutk.tutk import FrameInfo3Struct, FrameInfoStruct
+
+
+def _frame(i, size=100, info_struct=FrameInfoStruct):
+    frame_info = info_struct()
+    frame_info.codec_id = 78
+    frame_info.frame_no = i
+    frame_info.is_keyframe = int(i % 10 == 0)
+    return bytes([i % 256]) * size, frame_info
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create(4096)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_round_trip(ring):
+    reader = FrameRingReader(ring)
+    assert reader.read() is None
+    ring.write(_frame(1))
+    ring.write(_frame(2, info_struct=FrameInfo3Struct))
+
+    frames = reader.read_all()
+    assert [frame for frame, _ in frames] == [b"\x01" * 100, b"\x02" * 100]
+    assert isinstance(frames[0][1], FrameInfoStruct)
+    assert isinstance(frames[1][1], FrameInfo3Struct)
+    assert [info.frame_no for _, info in frames] == [1, 2]
+    assert reader.read() is None
+    assert reader.dropped == 0
+    assert ring.frames_written == 2
+
+
+def test_attach(ring):
+    other = FrameRing.attach(ring.name)
+    try:
+        reader = FrameRingReader(other)
+        ring.write(_frame(3))
+        assert reader.read()[0] == b"\x03" * 100
+    finally:
+        other.close()
+
+
+def test_reader_starts_at_the_next_frame(ring):
+    ring.write(_frame(1))
+    reader = FrameRingReader(ring)
+    ring.write(_frame(2))
+    assert [info.frame_no for _, info in reader.read_all()] == [2]
+
+
+def test_wraps_around(ring):
+    reader = FrameRingReader(ring)
+    for i in range(200):
+        ring.write(_frame(i, size=50 + i))
+        frame, frame_info = reader.read()
+        assert frame == bytes([i]) * (50 + i)
+        assert frame_info.frame_no == i
+    assert ring.write_pos > ring.capacity
+    assert reader.dropped == 0
+
+
+def test_lapped_reader_skips_to_the_newest_frame(ring):
+    reader = FrameRingReader(ring)
+    for i in range(100):
+        ring.write(_frame(i))
+
+    frames = reader.read_all()
+    assert [info.frame_no for _, info in frames] == [99]
+    assert reader.dropped == 99
+
+    ring.write(_frame(100))
+    assert [info.frame_no for _, info in reader.read_all()] == [100]
+    assert reader.dropped == 99
+
+
+def test_rejects_frames_larger_than_half_the_ring(ring):
+    with pytest.raises(FrameRingError):
+        ring.write(_frame(1, size=3000))
+    assert ring.frames_written == 0
+
+
+def test_zero_copy_reads(ring):
+    reader = FrameRingReader(ring)
+    ring.write(_frame(1))
+    frame, _ = reader.read(copy=False)
+    assert isinstance(frame, memoryview)
+    assert bytes(frame) == b"\x01" * 100
+    assert reader.still_valid()
+
+    for i in range(100):
+        ring.write(_frame(i))
+    assert not reader.still_valid()
+    frame.release()
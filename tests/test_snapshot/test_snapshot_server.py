@@ -0,0 +1,127 @@
+import types
+
+import threading
+
+from wyze_rtsp_bridge.http_server import HttpRequest
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListener,
+    WyzeIOTCVideoListenerState,
+)
+from wyze_rtsp_bridge.snapshot import SNAPSHOT_SUBSCRIBER_ID, SnapshotServer
+from wyzecam.tutk.tutk import FrameInfoStruct
+
+MAC = "aabbccddeeff"
+
+
+def _frame(n, keyframe):
+    frame_info = FrameInfoStruct()
+    frame_info.codec_id = 78
+    frame_info.frame_no = n
+    frame_info.is_keyframe = int(keyframe)
+    frame_info.timestamp = 1_600_000_000 + n
+    return f"frame-{n}".encode(), frame_info
+
+
+class _Mux:
+    """Just enough of WyzeIOTCVideoMux, around a real listener"""
+
+    def __init__(self):
+        camera = types.SimpleNamespace(mac=MAC.upper())
+        self.listener = WyzeIOTCVideoListener(None, camera)  # type: ignore
+        self.listeners = {MAC: self.listener}
+        self.subscribed = threading.Event()
+        self.callback = None
+
+    def get_listener(self, mac):
+        return self.listener
+
+    def subscribe(self, mac, subscriber_id, callback, frame_filter=None):
+        assert subscriber_id == SNAPSHOT_SUBSCRIBER_ID
+        self.callback = callback
+        self.subscribed.set()
+
+    def unsubscribe(self, mac, subscriber_id):
+        self.callback = None
+
+
+class _Encoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, data, size, quality):
+        self.calls.append((data[1].frame_no, size))
+        return b"jpeg of " + data[0] + repr(size).encode()
+
+
+def _get(server, path, **query):
+    return server.handle(
+        HttpRequest("GET", path, {k: [str(v)] for k, v in query.items()}, b"")
+    )
+
+
+def _streaming_server():
+    mux = _Mux()
+    mux.listener.state = WyzeIOTCVideoListenerState.STREAMING
+    encoder = _Encoder()
+    return mux, encoder, SnapshotServer(mux, encode=encoder)  # type: ignore
+
+
+def test_one_decode_per_keyframe_and_size():
+    mux, encoder, server = _streaming_server()
+    mux.listener.fanout.publish(_frame(0, True))
+    mux.listener.fanout.publish(_frame(1, False))
+
+    for _ in range(5):
+        response = _get(server, f"/snapshot/{MAC}.jpg")
+        assert response.status == 200
+        assert response.content_type == "image/jpeg"
+        assert response.body.startswith(b"jpeg of frame-0")
+    _get(server, f"/snapshot/{MAC}.jpg", width=320)
+    _get(server, f"/snapshot/{MAC}.jpg", width=320)
+    assert encoder.calls == [(0, (None, None)), (0, (320, None))]
+
+    mux.listener.fanout.publish(_frame(2, True))
+    response = _get(server, f"/snapshot/{MAC.upper()}.jpg")
+    assert response.body.startswith(b"jpeg of frame-2")
+    assert encoder.calls[-1] == (2, (None, None))
+    assert server.snapshots[MAC].decodes == 3
+    assert server.snapshots[MAC].requests == 8
+
+
+def test_bad_requests():
+    mux, encoder, server = _streaming_server()
+    assert _get(server, "/snapshot/001122334455.jpg").status == 404
+    assert _get(server, f"/snapshot/{MAC}.png").status == 404
+    assert _get(server, f"/snapshot/{MAC}.jpg", width=0).status == 400
+    assert _get(server, f"/snapshot/{MAC}.jpg", height="tall").status == 400
+    assert not encoder.calls
+
+
+def test_waits_for_a_fresh_keyframe_when_not_streaming():
+    mux = _Mux()
+    mux.listener.fanout.publish(_frame(0, True))
+    mux.listener.state = WyzeIOTCVideoListenerState.PAUSED
+    encoder = _Encoder()
+    server = SnapshotServer(mux, encode=encoder)  # type: ignore
+
+    def resume():
+        assert mux.subscribed.wait(timeout=5)
+        # the GOP cache's old keyframe comes first, as a burst
+        mux.callback(mux.listener, mux.listener.fanout.gop_cache.burst()[0])
+        mux.callback(mux.listener, _frame(30, True))
+
+    thread = threading.Thread(target=resume)
+    thread.start()
+    response = _get(server, f"/snapshot/{MAC}.jpg")
+    thread.join()
+    assert response.status == 200
+    assert response.body.startswith(b"jpeg of frame-30")
+    assert mux.callback is None
+
+
+def test_gives_up_without_a_keyframe():
+    mux = _Mux()
+    server = SnapshotServer(
+        mux, keyframe_timeout_seconds=0.01, encode=_Encoder()  # type: ignore
+    )
+    assert _get(server, f"/snapshot/{MAC}.jpg").status == 503
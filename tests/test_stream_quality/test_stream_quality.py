@@ -0,0 +1,35 @@
+from wyze_rtsp_bridge.stream_quality import (
+    StreamQuality,
+    highest_quality,
+    parse_mount_path,
+)
+
+
+def test_highest_quality():
+    assert highest_quality(StreamQuality.SD) == StreamQuality.SD
+    assert (
+        highest_quality(StreamQuality.SD, StreamQuality.HD, StreamQuality.SD)
+        == StreamQuality.HD
+    )
+
+
+def test_parse_mount_path():
+    assert parse_mount_path("/2cabcdef1234") == ("2cabcdef1234", None)
+    assert parse_mount_path("/2cabcdef1234/sd") == (
+        "2cabcdef1234",
+        StreamQuality.SD,
+    )
+    assert parse_mount_path("/2cabcdef1234/hd/") == (
+        "2cabcdef1234",
+        StreamQuality.HD,
+    )
+
+
+def test_matches_frame_size():
+    assert StreamQuality.HD.matches_frame_size(StreamQuality.HD.frame_size)
+    # a doorbell's rotated frame size
+    assert StreamQuality.HD.matches_frame_size(StreamQuality.HD.frame_size + 3)
+    assert not StreamQuality.HD.matches_frame_size(StreamQuality.SD.frame_size)
+    assert not StreamQuality.SD.matches_frame_size(
+        StreamQuality.HD.frame_size + 3
+    )
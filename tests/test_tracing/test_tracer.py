@@ -0,0 +1,44 @@
+import json
+import time
+
+from wyze_rtsp_bridge.tracing import Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    started = tracer.begin()
+    tracer.end("recv", started)
+    assert started == 0
+    assert len(tracer.events) == 0
+
+
+def test_ring_keeps_most_recent_events():
+    tracer = Tracer(ring_size=2, enabled=True)
+    for i in range(3):
+        tracer.end("recv", tracer.begin(), args={"frame": i})
+    assert [event[5] for event in tracer.events] == [{"frame": 1}, {"frame": 2}]
+
+
+def test_dump_chrome_trace(tmp_path):
+    tracer = Tracer(enabled=True)
+    tracer.end("push-buffer", tracer.begin(), category="gst")
+
+    with open(tracer.dump(tmp_path)) as f:
+        trace = json.load(f)
+
+    complete = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert len(complete) == 1
+    assert complete[0]["name"] == "push-buffer"
+    assert complete[0]["cat"] == "gst"
+    assert complete[0]["dur"] >= 0
+    assert any(e["ph"] == "M" for e in trace["traceEvents"])
+
+
+def test_dumps_in_the_same_millisecond_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1_600_000_000.5)
+    tracer = Tracer(enabled=True)
+
+    paths = [tracer.dump(tmp_path) for _ in range(3)]
+    assert len(set(paths)) == 3
+    assert paths[0].name.endswith("-500.json")
+    assert paths[1].name.endswith("-500-2.json")
@@ -1,14 +1,18 @@
 # type: ignore[attr-defined]
+from typing import Optional
+
 import os
 import pathlib
 import sys
 from enum import Enum
 
 import typer
-from rich.console import Console
-from wyze_rtsp_bridge import __version__, config
-from wyze_rtsp_bridge.glib_init import loop
-from wyze_rtsp_bridge.rtsp_server import GstServer
+from wyze_rtsp_bridge import __version__
+
+# Importing config, rtsp_server and glib_init is deferred until they are
+# needed: between them they initialize GStreamer and pull in SQLAlchemy,
+# wyzecam and rich, which is most of the CLI's startup time and none of
+# what --version needs.
 
 
 class Color(str, Enum):
@@ -25,15 +29,14 @@ app = typer.Typer(
     help="A server that transcodes wyze native video streams to rtsp",
     add_completion=False,
 )
-console = Console()
 
 
 def version_callback(value: bool):
     """Prints the version of the package."""
     if value:
-        console.print(
-            f"[yellow]wyze-rtsp-bridge[/] version: [bold blue]{__version__}[/]"
-        )
+        name = typer.style("wyze-rtsp-bridge", fg=typer.colors.YELLOW)
+        number = typer.style(__version__, fg=typer.colors.BLUE, bold=True)
+        typer.echo(f"{name} version: {number}")
         raise typer.Exit()
 
 
@@ -66,34 +69,57 @@ def main(
         "--create-config",
         help="Creates a config file at ~/.wyzecam/config.yml",
     ),
+    headless: bool = typer.Option(
+        None,
+        "--headless/--no-headless",
+        help="Log camera state changes instead of showing a live status table.  Defaults to headless "
+        "when stdout isn't a terminal (e.g. under systemd).",
+    ),
 ):
     """Starts a server that translates local wyze camera video streams to rtsp."""
+    from wyze_rtsp_bridge import config
 
     if create_config is True:
         config.create_config()
-        console.print("Wrote example config to ~/.wyzecam/config.yml")
+        typer.echo("Wrote example config to ~/.wyzecam/config.yml")
         sys.exit(0)
 
-    conf = config.load_config(pathlib.Path(config_file) if config_file else None)
+    def load_config_with_overrides() -> Optional[config.Config]:
+        """Loads the config file, applying the command line's overrides"""
+        conf = config.load_config(
+            pathlib.Path(config_file) if config_file else None
+        )
+        if conf is None:
+            return None
+
+        if cameras is not None:
+            conf.cameras = cameras.split(",")
+
+        if port is not None:
+            conf.rtsp_server.port = port
+
+        if headless is not None:
+            conf.headless = headless
+
+        if "WYZE_EMAIL" in os.environ:
+            conf.wyze_credentials.email = os.environ["WYZE_EMAIL"]
+        if "WYZE_PASSWORD" in os.environ:
+            conf.wyze_credentials.password = os.environ["WYZE_PASSWORD"]
+        return conf
+
+    conf = load_config_with_overrides()
 
     if conf is None:
-        console.print(
+        typer.echo(
             "Config file not found, please run wyze-rtsp-bridge --create-config"
         )
         sys.exit(-1)
 
-    if cameras is not None:
-        conf.cameras = cameras.split(",")
-
-    if port is not None:
-        conf.rtsp_server.port = port
-
-    if "WYZE_EMAIL" in os.environ:
-        conf.wyze_credentials.email = os.environ["WYZE_EMAIL"]
-    if "WYZE_PASSWORD" in os.environ:
-        conf.wyze_credentials.password = os.environ["WYZE_PASSWORD"]
+    from wyze_rtsp_bridge.glib_init import loop
+    from wyze_rtsp_bridge.rtsp_server import GstServer
 
-    s = GstServer(conf)
+    # the config is re-read on SIGHUP, to add or remove cameras
+    s = GstServer(conf, config_loader=load_config_with_overrides)
     s.startup()
     s.attach_to_main_loop()
     loop.run()
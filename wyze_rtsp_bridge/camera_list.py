@@ -0,0 +1,36 @@
+"""
+Which of the account's cameras the bridge serves, and what changes when
+the config file or the account's camera list is reloaded.
+"""
+from typing import List, NamedTuple, Optional
+
+from wyzecam.api_models import WyzeCamera
+
+
+class CameraListChange(NamedTuple):
+    added: List[WyzeCamera]
+    removed: List[WyzeCamera]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def select_cameras(
+    cameras: List[WyzeCamera], macs: Optional[List[str]]
+) -> List[WyzeCamera]:
+    """The cameras to serve: those in `macs`, or all of them if it is None"""
+    if macs is None:
+        return list(cameras)
+    return [c for c in cameras if c.mac in macs]
+
+
+def diff_cameras(
+    running: List[WyzeCamera], wanted: List[WyzeCamera]
+) -> CameraListChange:
+    """The cameras to start and stop to go from `running` to `wanted`"""
+    running_macs = {c.mac.lower() for c in running}
+    wanted_macs = {c.mac.lower() for c in wanted}
+    return CameraListChange(
+        added=[c for c in wanted if c.mac.lower() not in running_macs],
+        removed=[c for c in running if c.mac.lower() not in wanted_macs],
+    )
@@ -0,0 +1,172 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import threading
+import time
+
+from rich.table import Table
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListener,
+    WyzeIOTCVideoListenerState,
+    WyzeIOTCVideoMux,
+)
+from wyzecam.api_models import WyzeCamera
+from wyzecam.tutk import tutk
+
+COLUMNS = [
+    "Camera MAC",
+    "Camera Nickname",
+    "Camera P2P Type",
+    "Camera IP",
+    "Mux Status",
+    "Session State",
+    "Error",
+]
+
+Row = Tuple[str, ...]
+
+SessionInfo = Tuple[int, str]
+"""The p2p mode and remote IP of a camera's session"""
+
+
+class CameraStatusBoard:
+    """
+    The status of each camera, as shown on the console while connecting and
+    shutting down.
+
+    Checking a camera's session is a TUTK call, so it is only done when the
+    camera's listener changes state, and otherwise every
+    `session_refresh_interval` seconds; each camera's row is only rebuilt
+    when something in it changed.  refresh() says whether anything did, so
+    the table only needs to be redrawn then.
+    """
+
+    def __init__(
+        self,
+        mux: WyzeIOTCVideoMux,
+        cameras: List[WyzeCamera],
+        session_refresh_interval: float = 30.0,
+    ) -> None:
+        self.mux: WyzeIOTCVideoMux = mux
+        self.cameras: List[WyzeCamera] = cameras
+        self.session_refresh_interval: float = session_refresh_interval
+        self.rows: Dict[str, Row] = {}
+        self.session_info: Dict[str, Optional[SessionInfo]] = {}
+        self._session_checked_at: Dict[str, float] = {}
+        self._state_changed: Set[str] = {
+            camera.mac.lower() for camera in cameras
+        }
+        self._lock = threading.Lock()
+        for listener in mux.listeners.values():
+            listener.add_state_change_listener(self._on_state_change)
+
+    def add_camera(self, camera: WyzeCamera) -> None:
+        """Starts showing a camera added to the mux"""
+        mac = camera.mac.lower()
+        self.mux.get_listener(mac).add_state_change_listener(
+            self._on_state_change
+        )
+        with self._lock:
+            self._state_changed.add(mac)
+        self.cameras = self.cameras + [camera]
+
+    def remove_camera(self, mac: str) -> None:
+        mac = mac.lower()
+        self.cameras = [c for c in self.cameras if c.mac.lower() != mac]
+        self.rows.pop(mac, None)
+        self.session_info.pop(mac, None)
+        self._session_checked_at.pop(mac, None)
+
+    def _on_state_change(
+        self,
+        listener: WyzeIOTCVideoListener,
+        new_state: WyzeIOTCVideoListenerState,
+    ) -> None:
+        # called on the listener's thread; the work is left to refresh()
+        with self._lock:
+            self._state_changed.add(listener.camera.mac.lower())
+
+    def _check_session(
+        self, listener: WyzeIOTCVideoListener
+    ) -> Optional[SessionInfo]:
+        try:
+            info = listener.session.session_check()
+        except (tutk.TutkError, AssertionError):
+            return None
+        return info.mode, info.remote_ip.decode("ascii")
+
+    def refresh(
+        self, on_session_change: Optional[Callable[[WyzeCamera], None]] = None
+    ) -> bool:
+        """
+        Brings every camera's row up to date; returns whether any changed.
+
+        `on_session_change` is called for each camera whose session info
+        (p2p mode or IP) changed.
+        """
+        with self._lock:
+            state_changed = self._state_changed
+            self._state_changed = set()
+
+        now = time.monotonic()
+        changed = False
+        for camera in self.cameras:
+            mac = camera.mac.lower()
+            listener = self.mux.get_listener(mac)
+            if (
+                mac in state_changed
+                or now - self._session_checked_at.get(mac, 0.0)
+                >= self.session_refresh_interval
+            ):
+                info = self._check_session(listener)
+                self._session_checked_at[mac] = now
+                if (
+                    mac not in self.session_info
+                    or info != self.session_info[mac]
+                ):
+                    self.session_info[mac] = info
+                    if on_session_change is not None and info is not None:
+                        on_session_change(camera)
+
+            row = self._row(camera, listener, self.session_info.get(mac))
+            if row != self.rows.get(mac):
+                self.rows[mac] = row
+                changed = True
+        return changed
+
+    @staticmethod
+    def _row(
+        camera: WyzeCamera,
+        listener: WyzeIOTCVideoListener,
+        session_info: Optional[SessionInfo],
+    ) -> Row:
+        return (
+            f"{camera.mac}",
+            f"{camera.nickname}",
+            f"{camera.p2p_type} : {session_info[0] if session_info else 'n/a'}",
+            f"{session_info[1]}" if session_info else f"[{camera.ip}]",
+            f"{listener.state.name}",
+            f"{listener.session.state.name}",
+            f"{listener.error}",
+        )
+
+    def table(self, title: str) -> Table:
+        table = Table()
+        table.title = title
+        for column in COLUMNS:
+            table.add_column(column)
+        for camera in self.cameras:
+            row = self.rows.get(camera.mac.lower())
+            if row is not None:
+                table.add_row(*row)
+        return table
+
+    def describe_session(self, camera: WyzeCamera) -> str:
+        """A log line for a camera's (new) session info"""
+        info = self.session_info.get(camera.mac.lower())
+        if info is None:
+            return f"{camera.mac} ({camera.nickname}): not connected"
+        mode, remote_ip = info
+        return (
+            f"{camera.mac} ({camera.nickname}): connected to {remote_ip} "
+            f"(p2p type {camera.p2p_type}, mode {mode})"
+        )
@@ -0,0 +1,92 @@
+from typing import Optional, Tuple
+
+import enum
+
+SECOND = 1_000_000_000
+MILLISECOND = 1_000_000
+
+
+class TimestampMode(str, enum.Enum):
+    """How buffers pushed into the rtsp pipelines get their timestamps"""
+
+    CAMERA = "camera"
+    """Derived from the camera's own frame timestamps, see CameraClockRecovery"""
+
+    ARRIVAL = "arrival"
+    """The pipeline clock at the time the frame is pushed (appsrc do-timestamp)"""
+
+
+class CameraClockRecovery:
+    """
+    Maps a camera's frame timestamps onto a pipeline's running time.
+
+    The gap between two frames' PTS is the gap between their camera
+    timestamps, so the jitter added by the network, the GIL and our queues
+    doesn't end up in the stream.  The offset between the camera clock and
+    the running time is tracked at the least-delayed frames seen: it snaps
+    down to any frame that arrives earlier than expected, and creeps up
+    slowly (by `drift_rate` of the difference per frame) to follow clock
+    drift between the camera and us.
+
+    Timestamps that go backwards (camera clock reset or wraparound) or jump
+    forward by more than `max_gap_ns` (dropped frames, a paused stream)
+    re-anchor the mapping at the frame's arrival time.  PTS always
+    increases, whatever the camera does.
+    """
+
+    def __init__(
+        self,
+        drift_rate: float = 0.001,
+        max_gap_ns: int = 2 * SECOND,
+        default_duration_ns: int = SECOND // 15,
+    ) -> None:
+        self.drift_rate: float = drift_rate
+        self.max_gap_ns: int = max_gap_ns
+        self.default_duration_ns: int = default_duration_ns
+        self.offset: Optional[float] = None
+        self.discontinuities: int = 0
+        self._last_camera_ts: Optional[int] = None
+        self._last_pts: Optional[int] = None
+        self._last_duration: int = default_duration_ns
+
+    def update(self, camera_ts_ns: int, arrival_ns: int) -> Tuple[int, int]:
+        """
+        Returns the (pts, duration) for a frame.
+
+        :param camera_ts_ns: the frame's timestamp, according to the camera
+        :param arrival_ns: the pipeline's running time when the frame arrived
+        """
+        observed = arrival_ns - camera_ts_ns
+        delta = (
+            camera_ts_ns - self._last_camera_ts
+            if self._last_camera_ts is not None
+            else None
+        )
+
+        if self.offset is None or delta is None:
+            self.offset = observed
+        elif delta <= 0 or delta > self.max_gap_ns:
+            self.discontinuities += 1
+            self.offset = observed
+        elif observed < self.offset:
+            self.offset = observed
+        else:
+            self.offset += (observed - self.offset) * self.drift_rate
+
+        if delta is not None and 0 < delta <= self.max_gap_ns:
+            self._last_duration = delta
+
+        pts = camera_ts_ns + int(self.offset)
+        if self._last_pts is not None and pts <= self._last_pts:
+            pts = self._last_pts + MILLISECOND
+        pts = max(pts, 0)
+
+        self._last_camera_ts = camera_ts_ns
+        self._last_pts = pts
+        return pts, self._last_duration
+
+    def reset(self) -> None:
+        self.offset = None
+        self._last_camera_ts = None
+        self._last_pts = None
+        self._last_duration = self.default_duration_ns
@@ -1,6 +1,7 @@
 import typing
 from typing import List, Optional
 
+import enum
 import json
 import os
 import pathlib
@@ -8,6 +9,9 @@ import textwrap
 
 import pydantic
 import yaml
+from wyze_rtsp_bridge.clock_recovery import TimestampMode
+from wyze_rtsp_bridge.frame_queue import DropPolicy
+from wyze_rtsp_bridge.stream_quality import StreamQuality
 
 
 class WyzeRtspBridgeConfig(pydantic.BaseModel):
@@ -21,6 +25,322 @@ class WyzeRtspBridgeConfig(pydantic.BaseModel):
     )
 
 
+class WyzeHttpServerConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=True,
+        description="Serve prometheus metrics (at /metrics) and traces (at /trace) over http",
+    )
+
+    host: str = pydantic.Field(
+        default="127.0.0.1",
+        description="The IP address or hostname to start the http server on",
+    )
+
+    port: pydantic.PositiveInt = pydantic.Field(
+        default=8555, description="The port number to start the http server on"
+    )
+
+
+class WyzeHlsConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=True,
+        description="Serve each camera as (low-latency) HLS over the http server, at "
+        "/hls/<mac>/index.m3u8.  A camera is only segmented while someone is watching it.",
+    )
+
+    segment_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=2.0,
+        description="Start a new segment on the first keyframe after this many seconds",
+    )
+
+    part_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=0.5,
+        description="The duration of the partial segments served to low-latency HLS clients",
+    )
+
+    window_segments: pydantic.PositiveInt = pydantic.Field(
+        default=6,
+        description="The number of segments listed in the playlist (and kept in memory)",
+    )
+
+    idle_timeout_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=30.0,
+        description="Stop segmenting a camera this long after its last HLS request",
+    )
+
+
+class WyzeSnapshotConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=True,
+        description="Serve a JPEG of each camera's latest keyframe over the http server, at "
+        "/snapshot/<mac>.jpg (optionally ?width=...&height=...).  Each keyframe is decoded at "
+        "most once per size, however often it is polled.",
+    )
+
+    jpeg_quality: int = pydantic.Field(
+        default=85,
+        ge=1,
+        le=100,
+        description="The JPEG quality of snapshots",
+    )
+
+    keyframe_timeout_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=10.0,
+        description="How long a snapshot of a camera that isn't streaming waits for it to resume "
+        "and send a keyframe",
+    )
+
+
+class WyzeStreamingConfig(pydantic.BaseModel):
+    max_queue_size: pydantic.PositiveInt = pydantic.Field(
+        default=60,
+        description="The number of frames buffered for each rtsp client before frames start getting dropped",
+    )
+
+    drop_policy: DropPolicy = pydantic.Field(
+        default=DropPolicy.DROP_UNTIL_KEYFRAME,
+        description="What to do when an rtsp client falls behind: 'drop-oldest', "
+        "'drop-until-keyframe' or 'disconnect'",
+    )
+
+    gop_cache_max_frames: pydantic.NonNegativeInt = pydantic.Field(
+        default=300,
+        description="New rtsp clients are first sent the camera's most recent keyframe and the frames "
+        "after it, so they can start decoding right away.  This caps the number of frames kept for "
+        "that; set to 0 to disable.",
+    )
+
+    pause_after_idle_seconds: Optional[
+        pydantic.NonNegativeFloat
+    ] = pydantic.Field(
+        default=30.0,
+        description="Stop streaming from a camera this many seconds after its last rtsp client "
+        "disconnects; streaming resumes when a client connects.  Set to null to always stream.",
+    )
+
+    backpressure: bool = pydantic.Field(
+        default=True,
+        description="When an rtsp client's buffer fills up, drop frames until the next keyframe "
+        "instead of buffering without bound",
+    )
+
+    appsrc_max_bytes: pydantic.PositiveInt = pydantic.Field(
+        default=2_000_000,
+        description="The number of bytes buffered in each rtsp client's pipeline before it "
+        "signals backpressure",
+    )
+
+    buffer_pool_size: pydantic.NonNegativeInt = pydantic.Field(
+        default=0,
+        description="The number of preallocated 1 MB GstBuffers to recycle frames through; "
+        "0 allocates a buffer per frame",
+    )
+
+    timestamps: TimestampMode = pydantic.Field(
+        default=TimestampMode.CAMERA,
+        description="Where frame timestamps come from: 'camera' uses the camera's own clock, "
+        "smoothed against network jitter; 'arrival' stamps frames when they are pushed",
+    )
+
+    max_concurrent_connects: pydantic.PositiveInt = pydantic.Field(
+        default=8,
+        description="The maximum number of cameras to connect to at the same time.  Cameras that "
+        "someone is watching (or recording) are connected first",
+    )
+
+    reconnect_base_delay_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=1.0,
+        description="After a camera's connection fails or drops, it is retried after a random delay "
+        "of up to this, doubling with each failure in a row",
+    )
+
+    reconnect_max_delay_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=128.0,
+        description="The longest a camera waits before being retried",
+    )
+
+    default_quality: StreamQuality = pydantic.Field(
+        default=StreamQuality.HD,
+        description="The quality served at /<mac>: 'hd' (1080p) or 'sd' (360p).  /<mac>/hd and "
+        "/<mac>/sd always ask for that quality.  Each camera streams at the highest quality "
+        "anyone is watching it at.",
+    )
+
+    worker_processes: pydantic.NonNegativeInt = pydantic.Field(
+        default=0,
+        description="Receive video from cameras in this many worker processes, to use more than "
+        "one core with many cameras; 0 receives everything in the main process",
+    )
+
+    shm_ring_bytes: pydantic.PositiveInt = pydantic.Field(
+        default=8_388_608,
+        description="With worker_processes, the size of the shared memory ring each camera's "
+        "frames are handed to the main process through",
+    )
+
+
+class WyzeShmExportConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=False,
+        description="Publish each camera's encoded frames into a shared memory ring buffer "
+        "(/dev/shm/<name_prefix><mac>), for local consumers to read with "
+        "wyze_rtsp_bridge.shm_client instead of over rtsp.  Exported cameras never pause streaming.",
+    )
+
+    cameras: Optional[List[str]] = pydantic.Field(
+        description="The MAC addresses of the cameras to export; exports every camera if unset",
+        example=["2CABCDEF1234", "..."],
+    )
+
+    quality: Optional[StreamQuality] = pydantic.Field(
+        description="The quality to export at: 'hd' or 'sd'; defaults to streaming.default_quality",
+        example="sd",
+    )
+
+    ring_bytes: pydantic.PositiveInt = pydantic.Field(
+        default=8_388_608,
+        description="The size of each camera's ring buffer; readers falling further behind than "
+        "this skip ahead",
+    )
+
+    name_prefix: str = pydantic.Field(
+        default="wyze-rtsp-bridge-",
+        description="Prefixed to the (lower case) camera MAC to name its shared memory",
+    )
+
+
+class WyzeTracingConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=False,
+        description="Record per-frame timings of each streaming stage from startup.  Send "
+        "SIGUSR1 to turn recording on or off at runtime, and SIGUSR2 to dump what was recorded.  With "
+        "worker processes, receiving from the camera happens in the workers and isn't traced: frames are "
+        "traced from when they're read from shared memory",
+    )
+
+    ring_size: pydantic.PositiveInt = pydantic.Field(
+        default=100_000,
+        description="The number of most recent timings to keep",
+    )
+
+    dump_dir: pathlib.Path = pydantic.Field(
+        default=pathlib.Path("~/.wyzecam/traces"),
+        description="Where to write Chrome trace files (open them in chrome://tracing or Perfetto)",
+    )
+
+
+class WyzeCloudCacheConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=True,
+        description="Start up from the account info and camera list saved in the database, "
+        "instead of waiting on the wyze cloud",
+    )
+
+    ttl_seconds: pydantic.NonNegativeFloat = pydantic.Field(
+        default=86400.0,
+        description="Once the saved account info and camera list are older than this, they are "
+        "still used to start up, but get refreshed from the wyze cloud in the background",
+    )
+
+
+class WyzeReloadConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=True,
+        description="Reload the camera list on SIGHUP, or a POST to /reload on the http server: "
+        "cameras added to (or removed from) the config file or the wyze account are started (or "
+        "stopped) without restarting the bridge.  Other settings still need a restart",
+    )
+
+    spare_av_channels: pydantic.NonNegativeInt = pydantic.Field(
+        default=4,
+        description="How many more cameras than there are at startup can be added by reloading (with "
+        "worker processes, to each worker, once there are worker_processes of them)",
+    )
+
+
+class WyzeRecordingConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=False,
+        description="Record each camera's stream to disk, as MPEG-TS segments cut on keyframes "
+        "(without transcoding)",
+    )
+
+    directory: pathlib.Path = pydantic.Field(
+        default=pathlib.Path("~/.wyzecam/recordings"),
+        description="Where to write recordings; each camera gets a directory named after its MAC",
+    )
+
+    cameras: Optional[List[str]] = pydantic.Field(
+        description="The MAC addresses of the cameras to record; records every camera if unset",
+        example=["2CABCDEF1234", "..."],
+    )
+
+    quality: Optional[StreamQuality] = pydantic.Field(
+        description="The quality to record at: 'hd' or 'sd'; defaults to streaming.default_quality.  "
+        "Note that a camera that is being recorded never pauses streaming.",
+        example="sd",
+    )
+
+    segment_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=60.0,
+        description="Start a new segment on the first keyframe after this many seconds",
+    )
+
+    max_bytes_per_camera: Optional[pydantic.PositiveInt] = pydantic.Field(
+        description="Delete a camera's oldest segments once its recordings take up more than this",
+        example=10_000_000_000,
+    )
+
+    max_age_hours: Optional[pydantic.PositiveFloat] = pydantic.Field(
+        description="Delete segments older than this",
+        example=72,
+    )
+
+    fsync_interval_seconds: pydantic.NonNegativeFloat = pydantic.Field(
+        default=10.0,
+        description="How often to flush recordings to disk; at most this much recording is lost on a crash",
+    )
+
+    write_buffer_bytes: pydantic.PositiveInt = pydantic.Field(
+        default=1_048_576,
+        description="The size of each camera's write buffer",
+    )
+
+
+class WyzeEventBufferConfig(pydantic.BaseModel):
+    enabled: bool = pydantic.Field(
+        default=False,
+        description="Keep the last few seconds of each camera's video in memory, so that clips "
+        "starting before an event can be exported (POST /clips/<mac>?before=30&after=10)",
+    )
+
+    cameras: Optional[List[str]] = pydantic.Field(
+        description="The MAC addresses of the cameras to buffer; buffers every camera if unset",
+        example=["2CABCDEF1234", "..."],
+    )
+
+    seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=30.0,
+        description="How much video to keep; the buffer always starts on a keyframe, so it "
+        "can hold up to a GOP more than this.  A buffered camera never pauses streaming.",
+    )
+
+    max_bytes_per_camera: pydantic.PositiveInt = pydantic.Field(
+        default=16_777_216,
+        description="The most memory each camera's buffer may use",
+    )
+
+    max_after_seconds: pydantic.PositiveFloat = pydantic.Field(
+        default=60.0,
+        description="The longest a clip may run past the time it was asked for",
+    )
+
+    clip_dir: pathlib.Path = pydantic.Field(
+        default=pathlib.Path("~/.wyzecam/clips"),
+        description="Where to write exported clips",
+    )
+
+
 class WyzeCredentialConfig(pydantic.BaseModel):
     email: typing.Union[
         pydantic.EmailStr, typing.Literal["<REQUIRED>"]
@@ -33,6 +353,21 @@ class WyzeCredentialConfig(pydantic.BaseModel):
 class Config(pydantic.BaseModel):
     wyze_credentials: WyzeCredentialConfig
     rtsp_server: WyzeRtspBridgeConfig = WyzeRtspBridgeConfig()
+    http_server: WyzeHttpServerConfig = WyzeHttpServerConfig()
+    hls: WyzeHlsConfig = WyzeHlsConfig()
+    snapshots: WyzeSnapshotConfig = WyzeSnapshotConfig()
+    streaming: WyzeStreamingConfig = WyzeStreamingConfig()
+    cloud_cache: WyzeCloudCacheConfig = WyzeCloudCacheConfig()
+    recording: WyzeRecordingConfig = WyzeRecordingConfig()
+    event_buffer: WyzeEventBufferConfig = WyzeEventBufferConfig()
+    shm_export: WyzeShmExportConfig = WyzeShmExportConfig()
+    tracing: WyzeTracingConfig = WyzeTracingConfig()
+    reload: WyzeReloadConfig = WyzeReloadConfig()
+    headless: Optional[bool] = pydantic.Field(
+        description="Log camera state changes instead of showing a live status table (for running "
+        "as a daemon, e.g. under systemd); by default, headless when stdout isn't a terminal",
+        example=True,
+    )
     db_path: pydantic.FilePath = pathlib.Path(
         "~/.wyzecam/wyze_rtsp_bridge.db"
     ).expanduser()
@@ -84,14 +419,15 @@ def make_default_config(
             result.append("")
         else:
             example_val = field.field_info.extra.get("example")
+            default = field.default
+            if isinstance(default, enum.Enum):
+                default = default.value
             if field.required and not field.default:
                 result.append(textwrap.indent(f"{name}: <REQUIRED>", istr))
             elif field.required and field.default:
-                result.append(textwrap.indent(f"{name}: {field.default}", istr))
-            elif not field.required and field.default:
-                result.append(
-                    textwrap.indent(f"# {name}: {field.default}", istr)
-                )
+                result.append(textwrap.indent(f"{name}: {default}", istr))
+            elif not field.required and field.default is not None:
+                result.append(textwrap.indent(f"# {name}: {default}", istr))
             elif not field.required and example_val:
                 result.append(
                     textwrap.indent(
@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import List, Optional
 
+import datetime
 import pathlib
 import sqlite3
 
@@ -7,7 +8,7 @@ import sqlalchemy
 import sqlalchemy.engine
 import sqlalchemy.orm
 import wyzecam.api_models
-from sqlalchemy import select, update
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
 from wyze_rtsp_bridge.config import Config
 from wyze_rtsp_bridge.db import models
@@ -66,3 +67,65 @@ def set_credentials(
         )
         session.merge(model)
         session.commit()
+
+
+def is_stale(fetched_at: datetime.datetime, ttl_seconds: float) -> bool:
+    """True if something cached at `fetched_at` is older than `ttl_seconds`"""
+    age = datetime.datetime.utcnow() - fetched_at
+    return age.total_seconds() > ttl_seconds
+
+
+def get_account(db: WyzeRtspDatabase) -> Optional[models.AccountModel]:
+    with db.session() as session:
+        result = session.execute(
+            select(models.Account).where(models.Account.id == models.ACCOUNT_ID)
+        ).first()
+
+    if result is None:
+        return None
+
+    from_orm: models.AccountModel = models.AccountModel.from_orm(result[0])
+    return from_orm
+
+
+def set_account(
+    db: WyzeRtspDatabase, account_info: wyzecam.api_models.WyzeAccount
+) -> None:
+    with db.session() as session:
+        model = models.Account(
+            **dict(
+                account_info.dict(),
+                id=models.ACCOUNT_ID,
+                fetched_at=datetime.datetime.utcnow(),
+            )
+        )
+        session.merge(model)
+        session.commit()
+
+
+def get_cameras(db: WyzeRtspDatabase) -> List[models.CameraModel]:
+    with db.session() as session:
+        result = session.execute(
+            select(models.Camera).order_by(models.Camera.mac)
+        ).all()
+
+    return [models.CameraModel.from_orm(row[0]) for row in result]
+
+
+def set_cameras(
+    db: WyzeRtspDatabase, cameras: List[wyzecam.api_models.WyzeCamera]
+) -> None:
+    """Replaces the cached camera list with `cameras`"""
+    fetched_at = datetime.datetime.utcnow()
+    with db.session() as session:
+        session.execute(delete(models.Camera))
+        for camera in cameras:
+            session.add(
+                models.Camera(
+                    **dict(
+                        camera.dict(exclude={"fetched_at"}),
+                        fetched_at=fetched_at,
+                    )
+                )
+            )
+        session.commit()
@@ -1,10 +1,13 @@
-from sqlalchemy import JSON, Column, Integer, String
+import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String
 from sqlalchemy.orm import declarative_base
-from wyzecam.api_models import WyzeCredential
+from wyzecam.api_models import WyzeAccount, WyzeCamera, WyzeCredential
 
 Base = declarative_base()
 
 CREDENTIAL_ID = 1
+ACCOUNT_ID = 1
 
 
 class Credential(Base):
@@ -26,3 +29,49 @@ class CredentialModel(WyzeCredential):
 
     class Config:
         orm_mode = True
+
+
+class Account(Base):
+    __tablename__ = "account"
+
+    id = Column(Integer, primary_key=True)
+    phone_id = Column(String)
+    logo = Column(String)
+    nickname = Column(String)
+    email = Column(String)
+    user_code = Column(String)
+    user_center_id = Column(String)
+    open_user_id = Column(String)
+
+    fetched_at = Column(DateTime)
+
+
+class AccountModel(WyzeAccount):
+    id: int
+    fetched_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
+
+
+class Camera(Base):
+    __tablename__ = "camera"
+
+    mac = Column(String, primary_key=True)
+    p2p_id = Column(String)
+    p2p_type = Column(Integer)
+    ip = Column(String)
+    enr = Column(String)
+    product_model = Column(String)
+    camera_info = Column(JSON, nullable=True)
+    nickname = Column(String, nullable=True)
+    timezone_name = Column(String, nullable=True)
+
+    fetched_at = Column(DateTime)
+
+
+class CameraModel(WyzeCamera):
+    fetched_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,172 @@
+from typing import BinaryIO, Deque, List, NamedTuple, Optional
+
+import collections
+import pathlib
+import threading
+import time
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.mpegts import TsMuxer, stream_type_for
+
+CLIP_POLL_INTERVAL = 0.5
+"""How often a clip export checks the buffer for frames after the event"""
+
+CLIP_GRACE_SECONDS = 5.0
+"""How long past the end of a clip to wait for frames, if the camera stalls"""
+
+
+class EventBuffer:
+    """
+    Keeps the last `max_seconds` of a camera's frames in memory, as whole
+    GOPs, so that a clip starting before an event can be cut from it.
+
+    The buffer always starts on a keyframe: the oldest GOP is only dropped
+    once the next one still covers `max_seconds`, or once the buffer holds
+    more than `max_bytes` of video.
+    """
+
+    def __init__(self, max_seconds: float, max_bytes: int) -> None:
+        self.max_seconds: float = max_seconds
+        self.max_bytes: int = max_bytes
+        self.size_bytes: int = 0
+        # each GOP is a keyframe followed by the frames that depend on it
+        self._gops: Deque[List[VideoFrame]] = collections.deque()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(gop) for gop in self._gops)
+
+    def add(self, frame: VideoFrame) -> None:
+        with self._lock:
+            if frame[1].is_keyframe:
+                self._gops.append([frame])
+            elif self._gops:
+                self._gops[-1].append(frame)
+            else:
+                return
+            self.size_bytes += len(frame[0])
+
+            newest_ms = frame_timestamp_ms(frame[1])
+            while self._gops and (
+                self.size_bytes > self.max_bytes
+                or len(self._gops) > 1
+                and newest_ms - frame_timestamp_ms(self._gops[1][0][1])
+                >= self.max_seconds * 1000
+            ):
+                # a single GOP over budget gets dropped too; the buffer
+                # starts over at the next keyframe
+                gop = self._gops.popleft()
+                self.size_bytes -= sum(len(f) for f, _ in gop)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._gops.clear()
+            self.size_bytes = 0
+
+    def newest_timestamp_ms(self) -> Optional[int]:
+        with self._lock:
+            if not self._gops:
+                return None
+            return frame_timestamp_ms(self._gops[-1][-1][1])
+
+    def frames_since(self, timestamp_ms: int) -> List[VideoFrame]:
+        """
+        The buffered frames from the last keyframe at or before
+        `timestamp_ms` (or the oldest keyframe, if there is none) onwards.
+        """
+        with self._lock:
+            gops = list(self._gops)
+        start = 0
+        for i, gop in enumerate(gops):
+            if frame_timestamp_ms(gop[0][1]) <= timestamp_ms:
+                start = i
+        return [frame for gop in gops[start:] for frame in gop]
+
+    def frames_after(self, timestamp_ms: int) -> List[VideoFrame]:
+        """The buffered frames stamped strictly after `timestamp_ms`"""
+        with self._lock:
+            gops = list(self._gops)
+        return [
+            frame
+            for gop in gops
+            for frame in gop
+            if frame_timestamp_ms(frame[1]) > timestamp_ms
+        ]
+
+
+class Clip(NamedTuple):
+    path: pathlib.Path
+    frames: int
+    start_ms: int
+    end_ms: int
+
+
+def export_clip(
+    buffer: EventBuffer,
+    path: pathlib.Path,
+    before_seconds: float,
+    after_seconds: float,
+) -> Clip:
+    """
+    Writes the `before_seconds` leading up to now, and (blocking until
+    they have arrived) the `after_seconds` following it, as an MPEG-TS
+    file.  The clip starts on the keyframe at or before its start time.
+
+    Only reads from `buffer`; the live stream is not touched.  If `path`
+    already exists, the clip is written next to it, with a suffix.
+    """
+    event_ms = buffer.newest_timestamp_ms()
+    if event_ms is None:
+        raise ValueError("Nothing has been buffered yet")
+    frames = buffer.frames_since(event_ms - int(before_seconds * 1000))
+    stream_type = stream_type_for(frames[0][1].codec_id)
+    if stream_type is None:
+        raise ValueError(f"Unsupported codec: {frames[0][1].codec_id}")
+
+    end_ms = event_ms + int(after_seconds * 1000)
+    last_ms = frame_timestamp_ms(frames[-1][1])
+    deadline = time.monotonic() + after_seconds + CLIP_GRACE_SECONDS
+    done = last_ms >= end_ms
+    while not done and time.monotonic() < deadline:
+        time.sleep(CLIP_POLL_INTERVAL)
+        for frame in buffer.frames_after(last_ms):
+            if frame_timestamp_ms(frame[1]) > end_ms:
+                done = True
+                break
+            frames.append(frame)
+            last_ms = frame_timestamp_ms(frame[1])
+
+    path = pathlib.Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    muxer = TsMuxer(stream_type)
+    with _create_new(path) as f:
+        for frame, frame_info in frames:
+            f.write(
+                muxer.mux(
+                    frame,
+                    frame_timestamp_ms(frame_info) * 90,
+                    bool(frame_info.is_keyframe),
+                )
+            )
+    return Clip(
+        pathlib.Path(f.name),
+        len(frames),
+        frame_timestamp_ms(frames[0][1]),
+        last_ms,
+    )
+
+
+def _create_new(path: pathlib.Path) -> BinaryIO:
+    """
+    Creates `path`, or if it exists (another clip of the same moment),
+    `path` with a -2, -3, ... suffix: an existing clip is never overwritten.
+    """
+    candidate, sequence = path, 1
+    while True:
+        try:
+            return open(candidate, "xb")
+        except FileExistsError:
+            sequence += 1
+            candidate = path.with_name(f"{path.stem}-{sequence}{path.suffix}")
@@ -0,0 +1,167 @@
+import types
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import queue
+import threading
+import warnings
+
+from wyze_rtsp_bridge.frame_filter import FrameFilter
+from wyze_rtsp_bridge.frame_queue import (
+    DropPolicy,
+    SubscriberThread,
+    VideoFrame,
+)
+from wyze_rtsp_bridge.gop_cache import GopCache
+from wyze_rtsp_bridge.metrics import Histogram
+from wyze_rtsp_bridge.tracing import tracer
+
+
+class FrameFanout:
+    """
+    Publishes the frames of a single camera to any number of subscribers.
+
+    The subscriber table is copy-on-write: subscribe() and unsubscribe()
+    swap in a new read-only mapping, so publish() can iterate over a
+    snapshot of it without copying anything per frame.  Each subscriber has
+    its own bounded queue and drain thread (see SubscriberThread), so
+    publish() never blocks on a slow consumer.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_queue_size: int = 60,
+        drop_policy: DropPolicy = DropPolicy.DROP_UNTIL_KEYFRAME,
+        gop_cache_max_frames: int = 300,
+        on_idle: Optional[Callable[[], None]] = None,
+        latency: Optional[Histogram] = None,
+    ) -> None:
+        self.name: str = name
+        self.latency: Optional[Histogram] = latency
+        self.on_idle: Optional[Callable[[], None]] = on_idle
+        self.max_queue_size: int = max_queue_size
+        self.drop_policy: DropPolicy = drop_policy
+        self.subscribers: Mapping[
+            int, SubscriberThread
+        ] = types.MappingProxyType({})
+        self.gop_cache: Optional[GopCache] = (
+            GopCache(gop_cache_max_frames) if gop_cache_max_frames > 0 else None
+        )
+        # held while publishing a frame into the gop cache, and while priming
+        # a new subscriber with it, so no live frame can be fanned out
+        # between the gop burst and the subscriber joining the stream
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def __contains__(self, subscriber_id: object) -> bool:
+        return subscriber_id in self.subscribers
+
+    def subscribe(
+        self,
+        subscriber_id: int,
+        callback: Callable[[VideoFrame], None],
+        frame_filter: Optional[FrameFilter] = None,
+        pack_burst: bool = False,
+    ) -> bool:
+        """
+        Adds a subscriber; returns False if it was already subscribed.
+
+        Only frames `frame_filter` passes (if given) are queued for it.  The
+        GOP burst it starts with keeps the camera's timestamps, unless
+        `pack_burst` (for players; see GopCache.burst()).
+        """
+        with self._lock:
+            if subscriber_id in self.subscribers:
+                return False
+
+            burst = (
+                self.gop_cache.burst(pack_timestamps=pack_burst)
+                if self.gop_cache
+                else []
+            )
+            if frame_filter is not None:
+                burst = [frame for frame in burst if frame_filter(frame)]
+            subscriber = SubscriberThread(
+                subscriber_id,
+                callback,
+                self.max_queue_size + len(burst),
+                self.drop_policy,
+                latency=self.latency,
+                frame_filter=frame_filter,
+            )
+            for frame in burst:
+                subscriber.put(frame)
+            subscribers = dict(self.subscribers)
+            subscribers[subscriber_id] = subscriber
+            self.subscribers = types.MappingProxyType(subscribers)
+
+        subscriber.start()
+        return True
+
+    def unsubscribe(self, subscriber_id: int) -> Optional[SubscriberThread]:
+        """
+        Removes a subscriber; returns None if it wasn't subscribed.
+
+        Calls on_idle if this was the last subscriber.
+        """
+        with self._lock:
+            if subscriber_id not in self.subscribers:
+                return None
+            subscribers = dict(self.subscribers)
+            subscriber = subscribers.pop(subscriber_id)
+            self.subscribers = types.MappingProxyType(subscribers)
+
+        subscriber.stop()
+        if not subscribers and self.on_idle is not None:
+            self.on_idle()
+        return subscriber
+
+    def publish(self, frame: VideoFrame) -> None:
+        with self._lock:
+            if self.gop_cache is not None:
+                self.gop_cache.add(frame)
+            subscribers = self.subscribers
+
+        for subscriber_id, subscriber in subscribers.items():
+            self._try_add_data(frame, subscriber_id, subscriber)
+
+    def _try_add_data(
+        self,
+        frame: VideoFrame,
+        subscriber_id: int,
+        subscriber: SubscriberThread,
+    ) -> None:
+        if subscriber.error is not None:
+            self.unsubscribe(subscriber_id)
+            return
+        frame_filter = subscriber.frame_filter
+        if frame_filter is not None and not frame_filter(frame):
+            return
+        enqueue_started = tracer.begin()
+        try:
+            subscriber.put(frame)
+            tracer.end(
+                "enqueue",
+                enqueue_started,
+                args={"subscriber": subscriber_id, "frame": frame[1].frame_no}
+                if tracer.enabled
+                else None,
+            )
+        except queue.Full:
+            warnings.warn(
+                f"Subscriber {subscriber_id} has hit the max queue size; "
+                f"either fell behind or stopped listening"
+            )
+            self.unsubscribe(subscriber_id)
+
+    def clear_cache(self) -> None:
+        if self.gop_cache is not None:
+            self.gop_cache.clear()
+
+    def get_subscriber_stats(self) -> Dict[int, Tuple[int, int]]:
+        return {
+            subscriber_id: (subscriber.queue_depth, subscriber.dropped_frames)
+            for subscriber_id, subscriber in self.subscribers.items()
+        }
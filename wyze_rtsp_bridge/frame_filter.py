@@ -0,0 +1,72 @@
+"""
+Per-subscriber frame filters, for derived streams that forward a subset
+of a camera's frames as they are, without decoding or re-encoding them:
+
+    /<mac>/keyframes   only keyframes
+    /<mac>?fps=0.5     at most one keyframe every two seconds
+
+Without decoding, only keyframes can be decoded on their own, so a
+decimated stream is always made of keyframes; asking for more frames a
+second than the camera sends keyframes gets every keyframe.
+"""
+from typing import Callable, Dict, List, Optional
+
+import urllib.parse
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+
+FrameFilter = Callable[[VideoFrame], bool]
+"""Decides whether a frame is passed on to a subscriber"""
+
+KEYFRAMES_PATH = "keyframes"
+
+TIMESTAMP_SLACK_MS = 50
+"""How early a keyframe may arrive and still count as the next one"""
+
+
+class KeyframeFilter:
+    """Passes keyframes only"""
+
+    def __call__(self, frame: VideoFrame) -> bool:
+        return bool(frame[1].is_keyframe)
+
+
+class FpsFilter:
+    """Passes at most `fps` keyframes a second, by the camera's clock"""
+
+    def __init__(self, fps: float) -> None:
+        self.fps: float = fps
+        self.interval_ms: float = 1000 / fps
+        self.last_passed_ms: Optional[int] = None
+
+    def __call__(self, frame: VideoFrame) -> bool:
+        if not frame[1].is_keyframe:
+            return False
+        timestamp_ms = frame_timestamp_ms(frame[1])
+        if (
+            self.last_passed_ms is not None
+            # a camera whose clock jumps back starts over
+            and self.last_passed_ms <= timestamp_ms
+            and timestamp_ms - self.last_passed_ms
+            < self.interval_ms - TIMESTAMP_SLACK_MS
+        ):
+            return False
+        self.last_passed_ms = timestamp_ms
+        return True
+
+
+def parse_frame_filter(path: str, query: str = "") -> Optional[FrameFilter]:
+    """
+    A new filter for a mount path and query string, like /<mac>/keyframes
+    or fps=1; None to pass every frame.  Raises ValueError for a bad fps.
+    """
+    params: Dict[str, List[str]] = urllib.parse.parse_qs(query or "")
+    if "fps" in params:
+        fps = float(params["fps"][-1])
+        if not fps > 0:
+            raise ValueError(f"fps must be positive, not {fps}")
+        return FpsFilter(fps)
+    if KEYFRAMES_PATH in path.strip("/").split("/")[1:]:
+        return KeyframeFilter()
+    return None
@@ -0,0 +1,184 @@
+import typing
+from typing import Callable, Deque, Optional, Tuple, Union
+
+import collections
+import enum
+import queue
+import threading
+import time
+
+from wyze_rtsp_bridge.metrics import Histogram
+
+if typing.TYPE_CHECKING:
+    from wyzecam.tutk.tutk import FrameInfo3Struct, FrameInfoStruct
+
+VideoFrame = Tuple[bytes, Union["FrameInfoStruct", "FrameInfo3Struct"]]
+"""A frame of video data, as yielded by WyzeIOTCSession.recv_video_data()"""
+
+
+class DropPolicy(str, enum.Enum):
+    """What a SubscriberQueue does when a frame arrives and it is already full"""
+
+    DROP_OLDEST = "drop-oldest"
+    """Discard the oldest queued frame to make room for the new one"""
+
+    DROP_UNTIL_KEYFRAME = "drop-until-keyframe"
+    """Discard everything queued, then discard new frames until the next keyframe"""
+
+    DISCONNECT = "disconnect"
+    """Raise queue.Full, so that the slow subscriber gets unsubscribed"""
+
+
+class SubscriberQueue:
+    """
+    A bounded ring buffer of video frames for a single subscriber.
+
+    put() never blocks, so that the camera's receive thread is never held
+    up by a slow consumer; frames that do not fit are handled according to
+    the queue's DropPolicy.  get() blocks until a frame is available, or
+    the queue is closed.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        drop_policy: DropPolicy = DropPolicy.DROP_UNTIL_KEYFRAME,
+    ) -> None:
+        assert max_size > 0, "max_size must be positive"
+        self.max_size: int = max_size
+        self.drop_policy: DropPolicy = drop_policy
+        self.dropped: int = 0
+        self.closed: bool = False
+        # each frame is queued with the (monotonic) time it was put()
+        self._frames: Deque[Tuple[VideoFrame, float]] = collections.deque()
+        self._waiting_for_keyframe: bool = False
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    def put(self, frame: VideoFrame) -> None:
+        with self._not_empty:
+            if self.closed:
+                return
+
+            if self._waiting_for_keyframe:
+                if not frame[1].is_keyframe:
+                    self.dropped += 1
+                    return
+                self._waiting_for_keyframe = False
+
+            if len(self._frames) >= self.max_size:
+                if self.drop_policy == DropPolicy.DISCONNECT:
+                    raise queue.Full()
+                elif self.drop_policy == DropPolicy.DROP_OLDEST:
+                    self._frames.popleft()
+                    self.dropped += 1
+                else:
+                    self.dropped += len(self._frames)
+                    self._frames.clear()
+                    if not frame[1].is_keyframe:
+                        self.dropped += 1
+                        self._waiting_for_keyframe = True
+                        return
+
+            self._frames.append((frame, time.monotonic()))
+            self._not_empty.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[VideoFrame]:
+        """
+        Removes and returns the oldest frame in the queue.
+
+        Returns None if the queue was closed, or if no frame arrived
+        within `timeout` seconds.
+        """
+        entry = self.get_with_time(timeout)
+        return entry[0] if entry is not None else None
+
+    def get_with_time(
+        self, timeout: Optional[float] = None
+    ) -> Optional[Tuple[VideoFrame, float]]:
+        """Like get(), but also returns the time.monotonic() the frame was put()"""
+        with self._not_empty:
+            self._not_empty.wait_for(
+                lambda: self._frames or self.closed, timeout
+            )
+            if self.closed or not self._frames:
+                return None
+            return self._frames.popleft()
+
+    def close(self) -> None:
+        with self._not_empty:
+            self.closed = True
+            self._frames.clear()
+            self._not_empty.notify_all()
+
+
+class SubscriberThread(threading.Thread):
+    """
+    Drains a SubscriberQueue on its own thread, handing each frame to a
+    subscriber callback.
+
+    If given a `latency` histogram, records the time from each frame being
+    queued until the callback is done with it.  `frame_filter` is kept for
+    whoever publishes to it (see FrameFanout), and decides which frames are
+    queued at all.
+    """
+
+    def __init__(
+        self,
+        subscriber_id: int,
+        callback: Callable[[VideoFrame], None],
+        max_queue_size: int,
+        drop_policy: DropPolicy,
+        latency: Optional[Histogram] = None,
+        frame_filter: Optional[Callable[[VideoFrame], bool]] = None,
+    ) -> None:
+        super(SubscriberThread, self).__init__(
+            name=f"subscriber-{subscriber_id}", daemon=True
+        )
+        self.subscriber_id: int = subscriber_id
+        self.callback: Callable[[VideoFrame], None] = callback
+        self.queue: SubscriberQueue = SubscriberQueue(
+            max_queue_size, drop_policy
+        )
+        self.latency: Optional[Histogram] = latency
+        self.frame_filter: Optional[Callable[[VideoFrame], bool]] = frame_filter
+        self.delivered: int = 0
+        self.error: Optional[Exception] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.depth
+
+    @property
+    def dropped_frames(self) -> int:
+        return self.queue.dropped
+
+    def put(self, frame: VideoFrame) -> None:
+        self.queue.put(frame)
+
+    def stop(self) -> None:
+        self.queue.close()
+
+    def run(self) -> None:
+        while True:
+            entry = self.queue.get_with_time()
+            if entry is None:
+                return
+            frame, enqueued_at = entry
+            # noinspection PyBroadException
+            try:
+                self.callback(frame)
+                self.delivered += 1
+                if self.latency is not None:
+                    self.latency.observe(time.monotonic() - enqueued_at)
+            except Exception as e:
+                self.error = e
+                self.stop()
+                print(f"Subscriber {self.subscriber_id} failed: {e!r}")
+                return
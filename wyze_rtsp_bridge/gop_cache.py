@@ -0,0 +1,95 @@
+import typing
+from typing import List, Optional
+
+import threading
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+
+if typing.TYPE_CHECKING:
+    from wyzecam.tutk.tutk import FrameInfo3Struct, FrameInfoStruct
+
+BURST_FRAME_SPACING_MS = 1
+"""The spacing between the rewritten timestamps of a GOP burst"""
+
+
+def frame_timestamp_ms(
+    frame_info: typing.Union["FrameInfoStruct", "FrameInfo3Struct"]
+) -> int:
+    """The camera's timestamp of a frame, in milliseconds"""
+    return int(frame_info.timestamp) * 1000 + int(frame_info.timestamp_ms)
+
+
+def with_timestamp_ms(
+    frame_info: typing.Union["FrameInfoStruct", "FrameInfo3Struct"],
+    timestamp_ms: int,
+) -> typing.Union["FrameInfoStruct", "FrameInfo3Struct"]:
+    """Returns a copy of `frame_info` with its timestamp fields replaced"""
+    copy = type(frame_info).from_buffer_copy(frame_info)
+    copy.timestamp = timestamp_ms // 1000
+    copy.timestamp_ms = timestamp_ms % 1000
+    return copy
+
+
+class GopCache:
+    """
+    Keeps the most recent group of pictures of a camera: the last keyframe,
+    plus every frame received since.
+
+    New subscribers are sent this as a burst before joining the live
+    stream, so that their decoders can start on a keyframe right away,
+    instead of waiting for the camera's next one.
+    """
+
+    def __init__(self, max_frames: int = 300) -> None:
+        self.max_frames: int = max_frames
+        self._frames: List[VideoFrame] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def add(self, frame: VideoFrame) -> None:
+        with self._lock:
+            if frame[1].is_keyframe:
+                self._frames = [frame]
+            elif self._frames:
+                if len(self._frames) >= self.max_frames:
+                    # the camera's GOP is longer than we're willing to hold
+                    # on to; wait for the next keyframe
+                    self._frames = []
+                else:
+                    self._frames.append(frame)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames = []
+
+    def latest_keyframe(self) -> Optional[VideoFrame]:
+        with self._lock:
+            return self._frames[0] if self._frames else None
+
+    def burst(self, pack_timestamps: bool = True) -> List[VideoFrame]:
+        """
+        Returns a copy of the cached GOP, to be sent to a new subscriber.
+
+        If `pack_timestamps`, the timestamps are rewritten so that the burst
+        is packed into a few milliseconds, ending at the timestamp of the
+        newest cached frame, so the frames that follow from the live stream
+        carry on seamlessly for a player.  Otherwise they are the camera's.
+        """
+        with self._lock:
+            frames = list(self._frames)
+        if not frames or not pack_timestamps:
+            return frames
+
+        end_ms = frame_timestamp_ms(frames[-1][1])
+        start_ms = end_ms - (len(frames) - 1) * BURST_FRAME_SPACING_MS
+        return [
+            (
+                frame,
+                with_timestamp_ms(
+                    frame_info, start_ms + i * BURST_FRAME_SPACING_MS
+                ),
+            )
+            for i, (frame, frame_info) in enumerate(frames)
+        ]
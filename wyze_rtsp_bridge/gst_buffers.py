@@ -0,0 +1,77 @@
+import typing
+from typing import Dict, Optional, Tuple
+
+import collections
+import threading
+
+from .glib_init import Gst
+
+MAX_CACHED_FRAMES_PER_CAMERA = 64
+
+
+class SharedBufferCache:
+    """
+    Turns received frames into GstBuffers, once per frame per camera.
+
+    Every subscriber of a camera is handed the very same `bytes` object for
+    a frame, so the first subscriber to push it wraps it into a GstBuffer
+    (the only copy we make), and every other subscriber gets a shallow copy
+    of that buffer: its own metadata (pts, duration, flags), backed by the
+    same refcounted GstMemory.
+
+    If `pool_size` is non-zero, frames that fit are copied into buffers
+    taken from a GstBufferPool of preallocated `pool_buffer_size` buffers,
+    rather than into freshly allocated memory.
+    """
+
+    def __init__(
+        self, pool_size: int = 0, pool_buffer_size: int = 1_048_576
+    ) -> None:
+        self.pool_buffer_size: int = pool_buffer_size
+        self.pool: Optional[Gst.BufferPool] = None
+        self.frames_wrapped: int = 0
+        self.bytes_copied: int = 0
+        self._frames: Dict[
+            str, "collections.OrderedDict[int, Tuple[bytes, Gst.Buffer]]"
+        ] = collections.defaultdict(collections.OrderedDict)
+        self._lock = threading.Lock()
+
+        if pool_size > 0:
+            self.pool = Gst.BufferPool.new()
+            config = self.pool.get_config()
+            Gst.BufferPool.config_set_params(
+                config, None, pool_buffer_size, pool_size, 0
+            )
+            self.pool.set_config(config)
+            self.pool.set_active(True)
+
+    def get(self, mac: str, frame: bytes) -> Gst.Buffer:
+        """Returns a GstBuffer for `frame` that is safe to modify and push"""
+        with self._lock:
+            frames = self._frames[mac]
+            # keyed by id(), which is safe since we hold on to the frame
+            entry = frames.get(id(frame))
+            if entry is None or entry[0] is not frame:
+                entry = (frame, self._wrap(frame))
+                frames[id(frame)] = entry
+                if len(frames) > MAX_CACHED_FRAMES_PER_CAMERA:
+                    frames.popitem(last=False)
+        return entry[1].copy()
+
+    def clear(self, mac: Optional[str] = None) -> None:
+        with self._lock:
+            if mac is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(mac, None)
+
+    def _wrap(self, frame: bytes) -> Gst.Buffer:
+        self.frames_wrapped += 1
+        self.bytes_copied += len(frame)
+        if self.pool is not None and len(frame) <= self.pool_buffer_size:
+            ret, buf = self.pool.acquire_buffer(None)
+            if ret == Gst.FlowReturn.OK:
+                buf.fill(0, frame)
+                buf.set_size(len(frame))
+                return typing.cast(Gst.Buffer, buf)
+        return Gst.Buffer.new_wrapped(frame)
@@ -0,0 +1,421 @@
+import typing
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+import collections
+import math
+import re
+import threading
+import time
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.http_server import HttpRequest, HttpResponse, HttpServer
+from wyze_rtsp_bridge.mpegts import TsMuxer, stream_type_for
+
+if typing.TYPE_CHECKING:
+    from wyze_rtsp_bridge.iotc_video_mux import (
+        WyzeIOTCVideoListener,
+        WyzeIOTCVideoMux,
+    )
+
+HLS_SUBSCRIBER_ID = -2
+"""The mux subscriber id of a camera's HLS segmenter (see RECORDER_SUBSCRIBER_ID)"""
+
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+SEGMENT_CONTENT_TYPE = "video/mp2t"
+
+PARTS_LISTED_FOR_SEGMENTS = 3
+"""How many of the newest segments have their partial segments listed"""
+
+_PATH = re.compile(
+    r"^/hls/(?P<mac>[0-9a-f]+)/"
+    r"(?:(?P<playlist>index\.m3u8)"
+    r"|seg-(?P<segment>\d+)\.ts"
+    r"|part-(?P<part_segment>\d+)\.(?P<part>\d+)\.ts)$"
+)
+
+
+class HlsPart(NamedTuple):
+    data: bytes
+    duration: float
+    independent: bool
+
+
+class HlsSegment:
+    def __init__(self, sequence: int, start_ms: int) -> None:
+        self.sequence: int = sequence
+        self.start_ms: int = start_ms
+        self.parts: List[HlsPart] = []
+        self.duration: float = 0.0
+        self.complete: bool = False
+        self.data: bytes = b""
+
+    def finish(self, end_ms: int) -> None:
+        self.duration = (end_ms - self.start_ms) / 1000
+        self.data = b"".join(part.data for part in self.parts)
+        self.complete = True
+
+
+class HlsSegmenter:
+    """
+    Cuts a camera's stream into (low-latency) HLS segments in memory, to be
+    shared by every HLS viewer of the camera.
+
+    Segments start on a keyframe, once the current one is `segment_seconds`
+    long, and are published in `part_seconds` partial segments as they are
+    filled, for LL-HLS clients.  The last `window_segments` segments are
+    kept around.
+
+    Playlist and part requests can block until what they ask for exists
+    (the LL-HLS "blocking playlist reload" and preload hints).
+    """
+
+    def __init__(
+        self,
+        mac: str,
+        segment_seconds: float = 2.0,
+        part_seconds: float = 0.5,
+        window_segments: int = 6,
+    ) -> None:
+        self.mac: str = mac.lower()
+        self.segment_seconds: float = segment_seconds
+        self.part_seconds: float = part_seconds
+        self.window_segments: int = window_segments
+        self.segments: Deque[HlsSegment] = collections.deque()
+        self.last_access: float = time.monotonic()
+        self.changed = threading.Condition(threading.Lock())
+        self._muxer: Optional[TsMuxer] = None
+        self._part = bytearray()
+        self._part_started_ms: int = 0
+        self._part_independent: bool = False
+        self._last_timestamp_ms: Optional[int] = None
+        self._frame_interval_ms: int = 0
+        self._next_sequence: int = 0
+
+    def on_frame(
+        self, listener: "WyzeIOTCVideoListener", data: VideoFrame
+    ) -> None:
+        self.add(data)
+
+    def add(self, data: VideoFrame) -> None:
+        frame, frame_info = data
+        stream_type = stream_type_for(frame_info.codec_id)
+        if stream_type is None:
+            return
+        timestamp_ms = frame_timestamp_ms(frame_info)
+        keyframe = bool(frame_info.is_keyframe)
+
+        with self.changed:
+            if self._last_timestamp_ms is not None:
+                interval_ms = timestamp_ms - self._last_timestamp_ms
+                if interval_ms > 0:
+                    self._frame_interval_ms = interval_ms
+            self._last_timestamp_ms = timestamp_ms
+
+            current = self.segments[-1] if self.segments else None
+            if keyframe and (
+                current is None
+                or timestamp_ms - current.start_ms
+                >= self.segment_seconds * 1000
+                or self._muxer is None
+                or stream_type != self._muxer.stream_type
+            ):
+                if current is not None:
+                    self._finish_part(timestamp_ms)
+                    current.finish(timestamp_ms)
+                self._start_segment(timestamp_ms, keyframe)
+                if (
+                    self._muxer is None
+                    or self._muxer.stream_type != stream_type
+                ):
+                    self._muxer = TsMuxer(stream_type)
+            elif current is None or self._muxer is None:
+                # waiting for the first keyframe
+                return
+            elif (
+                # cut the part before this frame would take it past
+                # part_seconds
+                timestamp_ms + self._frame_interval_ms - self._part_started_ms
+                > self.part_seconds * 1000
+            ):
+                self._finish_part(timestamp_ms)
+                self._part_started_ms = timestamp_ms
+                self._part_independent = keyframe
+
+            self._part += self._muxer.mux(frame, timestamp_ms * 90, keyframe)
+            self.changed.notify_all()
+
+    def _start_segment(self, timestamp_ms: int, keyframe: bool) -> None:
+        self.segments.append(HlsSegment(self._next_sequence, timestamp_ms))
+        self._next_sequence += 1
+        # the segment being filled doesn't count towards the window
+        while len(self.segments) > self.window_segments + 1:
+            self.segments.popleft()
+        self._part_started_ms = timestamp_ms
+        self._part_independent = keyframe
+
+    def _finish_part(self, end_ms: int) -> None:
+        if not self._part:
+            return
+        self.segments[-1].parts.append(
+            HlsPart(
+                bytes(self._part),
+                (end_ms - self._part_started_ms) / 1000,
+                self._part_independent,
+            )
+        )
+        self._part.clear()
+
+    def clear(self) -> None:
+        with self.changed:
+            self.segments.clear()
+            self._part.clear()
+            self._muxer = None
+            self._last_timestamp_ms = None
+            self.changed.notify_all()
+
+    def _find(self, sequence: int) -> Optional[HlsSegment]:
+        for segment in self.segments:
+            if segment.sequence == sequence:
+                return segment
+        return None
+
+    def _has_part(self, sequence: int, part: Optional[int]) -> bool:
+        """Whether segment `sequence` (or its part `part`) is done"""
+        segment = self._find(sequence)
+        if segment is None:
+            # it's either gone from the window already, or way in the future
+            return bool(self.segments) and sequence < self.segments[0].sequence
+        if part is None or segment.complete:
+            return segment.complete
+        return part < len(segment.parts)
+
+    def wait_for(
+        self, sequence: int, part: Optional[int], timeout: float
+    ) -> bool:
+        with self.changed:
+            return self.changed.wait_for(
+                lambda: self._has_part(sequence, part), timeout=timeout
+            )
+
+    def wait_for_first_segment(self, timeout: float) -> bool:
+        with self.changed:
+            return self.changed.wait_for(
+                lambda: any(segment.parts for segment in self.segments),
+                timeout=timeout,
+            )
+
+    def next_part(self) -> Optional[typing.Tuple[int, int]]:
+        """The (segment, part) the segment being filled will publish next"""
+        with self.changed:
+            if not self.segments:
+                return None
+            current = self.segments[-1]
+            return current.sequence, len(current.parts)
+
+    def segment(self, sequence: int) -> Optional[bytes]:
+        with self.changed:
+            segment = self._find(sequence)
+            if segment is None or not segment.complete:
+                return None
+            return segment.data
+
+    def part(self, sequence: int, part: int) -> Optional[bytes]:
+        with self.changed:
+            segment = self._find(sequence)
+            if segment is None or part >= len(segment.parts):
+                return None
+            return segment.parts[part].data
+
+    def playlist(self) -> str:
+        with self.changed:
+            segments = list(self.segments)
+            segment_parts = [list(segment.parts) for segment in segments]
+
+        target_duration = math.ceil(
+            max(
+                [self.segment_seconds]
+                + [segment.duration for segment in segments]
+            )
+        )
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:6",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            f"#EXT-X-PART-INF:PART-TARGET={self.part_seconds:.3f}",
+            "#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,"
+            f"PART-HOLD-BACK={3 * self.part_seconds:.3f}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0].sequence if segments else 0}",
+        ]
+        for i, (segment, parts) in enumerate(zip(segments, segment_parts)):
+            if i >= len(segments) - PARTS_LISTED_FOR_SEGMENTS:
+                for n, part in enumerate(parts):
+                    lines.append(
+                        f"#EXT-X-PART:DURATION={part.duration:.3f},"
+                        f'URI="part-{segment.sequence}.{n}.ts"'
+                        + (",INDEPENDENT=YES" if part.independent else "")
+                    )
+            if segment.complete:
+                lines.append(f"#EXTINF:{segment.duration:.3f},")
+                lines.append(f"seg-{segment.sequence}.ts")
+        if segments:
+            current = segments[-1]
+            lines.append(
+                "#EXT-X-PRELOAD-HINT:TYPE=PART,"
+                f'URI="part-{current.sequence}.{len(segment_parts[-1])}.ts"'
+            )
+        return "\n".join(lines) + "\n"
+
+
+class HlsServer:
+    """
+    Serves each camera as HLS over the bridge's http server:
+
+        /hls/<mac>/index.m3u8
+
+    A camera's segmenter subscribes to the mux on the first request, and
+    unsubscribes once nobody has requested anything for
+    `idle_timeout_seconds`, so that the camera can pause.
+    """
+
+    def __init__(
+        self,
+        mux: "WyzeIOTCVideoMux",
+        segment_seconds: float = 2.0,
+        part_seconds: float = 0.5,
+        window_segments: int = 6,
+        idle_timeout_seconds: float = 30.0,
+    ) -> None:
+        self.mux = mux
+        self.segment_seconds: float = segment_seconds
+        self.part_seconds: float = part_seconds
+        self.window_segments: int = window_segments
+        self.idle_timeout_seconds: float = idle_timeout_seconds
+        self.segmenters: Dict[str, HlsSegmenter] = {}
+        self._lock = threading.Lock()
+
+    def add_routes(self, http_server: HttpServer) -> None:
+        http_server.add_route("/hls", self.handle, prefix=True)
+
+    @property
+    def request_timeout(self) -> float:
+        """How long a blocking request waits before giving up"""
+        return 3 * self.segment_seconds + 1
+
+    def segmenter(self, mac: str) -> HlsSegmenter:
+        with self._lock:
+            segmenter = self.segmenters.get(mac)
+            if segmenter is None:
+                segmenter = HlsSegmenter(
+                    mac,
+                    segment_seconds=self.segment_seconds,
+                    part_seconds=self.part_seconds,
+                    window_segments=self.window_segments,
+                )
+                self.segmenters[mac] = segmenter
+            segmenter.last_access = time.monotonic()
+            if not self.mux.is_subscribed(mac, HLS_SUBSCRIBER_ID):
+                segmenter.clear()
+                self.mux.subscribe(
+                    mac,
+                    HLS_SUBSCRIBER_ID,
+                    lambda listener, data: self._on_frame(
+                        segmenter, listener, data
+                    ),
+                )
+            return segmenter
+
+    def _on_frame(
+        self,
+        segmenter: HlsSegmenter,
+        listener: "WyzeIOTCVideoListener",
+        data: VideoFrame,
+    ) -> None:
+        if time.monotonic() - segmenter.last_access > self.idle_timeout_seconds:
+            with self._lock:
+                if self.mux.is_subscribed(segmenter.mac, HLS_SUBSCRIBER_ID):
+                    self.mux.unsubscribe(segmenter.mac, HLS_SUBSCRIBER_ID)
+            return
+        segmenter.on_frame(listener, data)
+
+    def remove_camera(self, mac: str) -> None:
+        """Stops segmenting a camera that is being removed from the mux"""
+        with self._lock:
+            if self.segmenters.pop(mac, None) is None:
+                return
+            if self.mux.is_subscribed(mac, HLS_SUBSCRIBER_ID):
+                self.mux.unsubscribe(mac, HLS_SUBSCRIBER_ID)
+
+    def stop(self) -> None:
+        with self._lock:
+            for mac in self.segmenters:
+                if self.mux.is_subscribed(mac, HLS_SUBSCRIBER_ID):
+                    self.mux.unsubscribe(mac, HLS_SUBSCRIBER_ID)
+
+    def handle(self, request: HttpRequest) -> HttpResponse:
+        match = _PATH.match(request.path.lower())
+        if match is None or match["mac"] not in self.mux.listeners:
+            return HttpResponse(404, b"not found\n")
+        segmenter = self.segmenter(match["mac"])
+
+        if match["playlist"]:
+            return self._playlist(segmenter, request)
+        if match["segment"] is not None:
+            data = segmenter.segment(int(match["segment"]))
+            return self._media(data)
+
+        sequence, part = int(match["part_segment"]), int(match["part"])
+        if segmenter.next_part() == (sequence, part):
+            # a preload hint; hold the request until the part is ready
+            segmenter.wait_for(sequence, part, timeout=self.request_timeout)
+        return self._media(segmenter.part(sequence, part))
+
+    def _playlist(
+        self, segmenter: HlsSegmenter, request: HttpRequest
+    ) -> HttpResponse:
+        if "_HLS_msn" in request.query:
+            try:
+                sequence = int(request.query["_HLS_msn"][0])
+                part = (
+                    int(request.query["_HLS_part"][0])
+                    if "_HLS_part" in request.query
+                    else None
+                )
+            except ValueError:
+                return HttpResponse(400, b"bad _HLS_msn or _HLS_part\n")
+            next_part = segmenter.next_part()
+            if next_part is not None and sequence > next_part[0] + 2:
+                return HttpResponse(400, b"_HLS_msn is too far ahead\n")
+            ready = segmenter.wait_for(
+                sequence, part, timeout=self.request_timeout
+            )
+        else:
+            ready = segmenter.wait_for_first_segment(
+                timeout=self.request_timeout
+            )
+        if not ready:
+            return HttpResponse(503, b"camera is not streaming\n")
+        return HttpResponse(
+            200,
+            segmenter.playlist().encode("utf-8"),
+            PLAYLIST_CONTENT_TYPE,
+            headers={
+                "Cache-Control": "no-cache",
+                "Access-Control-Allow-Origin": "*",
+            },
+        )
+
+    def _media(self, data: Optional[bytes]) -> HttpResponse:
+        if data is None:
+            return HttpResponse(404, b"not found\n")
+        # segments and parts never change once published
+        max_age = int(self.segment_seconds * (self.window_segments + 1))
+        return HttpResponse(
+            200,
+            data,
+            SEGMENT_CONTENT_TYPE,
+            headers={
+                "Cache-Control": f"public, max-age={max_age}",
+                "Access-Control-Allow-Origin": "*",
+            },
+        )
@@ -0,0 +1,126 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import http.server
+import threading
+import traceback
+import urllib.parse
+
+
+class HttpRequest(NamedTuple):
+    method: str
+    path: str
+    query: Dict[str, List[str]]
+    body: bytes
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Optional[Dict[str, str]] = None
+
+
+RouteHandler = Callable[[HttpRequest], HttpResponse]
+
+
+class HttpServer:
+    """
+    A small threaded HTTP server for the bridge's side endpoints (metrics
+    and the like), separate from the rtsp server.
+
+    Handlers are registered per path with add_route(); a route added with
+    `prefix=True` handles every path under it as well.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.routes: Dict[Tuple[str, str], Tuple[RouteHandler, bool]] = {}
+        self.server: Optional[http.server.ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def add_route(
+        self,
+        path: str,
+        handler: RouteHandler,
+        methods: Tuple[str, ...] = ("GET",),
+        prefix: bool = False,
+    ) -> None:
+        for method in methods:
+            self.routes[(method, path)] = (handler, prefix)
+
+    def find_route(self, method: str, path: str) -> Optional[RouteHandler]:
+        route = self.routes.get((method, path))
+        if route is not None:
+            return route[0]
+        # the longest matching prefix wins
+        matches = [
+            (len(route_path), handler)
+            for (route_method, route_path), (
+                handler,
+                prefix,
+            ) in self.routes.items()
+            if prefix
+            and route_method == method
+            and path.startswith(route_path.rstrip("/") + "/")
+        ]
+        if not matches:
+            return None
+        return max(matches, key=lambda match: match[0])[1]
+
+    def handle(self, request: HttpRequest) -> HttpResponse:
+        handler = self.find_route(request.method, request.path)
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return HttpResponse(405, b"method not allowed\n")
+            return HttpResponse(404, b"not found\n")
+        # noinspection PyBroadException
+        try:
+            return handler(request)
+        except Exception:
+            traceback.print_exc()
+            return HttpResponse(500, b"internal server error\n")
+
+    def start(self) -> None:
+        server = self
+
+        class RequestHandler(http.server.BaseHTTPRequestHandler):
+            def _dispatch(self) -> None:
+                url = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                request = HttpRequest(
+                    method=self.command,
+                    path=url.path,
+                    query=urllib.parse.parse_qs(url.query),
+                    body=self.rfile.read(length) if length else b"",
+                )
+                response = server.handle(request)
+                self.send_response(response.status)
+                self.send_header("Content-Type", response.content_type)
+                self.send_header("Content-Length", str(len(response.body)))
+                for name, value in (response.headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(response.body)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(
+            (self.host, self.port), RequestHandler
+        )
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="http-server", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.server = None
+        self.thread = None
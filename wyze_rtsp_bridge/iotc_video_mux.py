@@ -1,6 +1,9 @@
-from typing import Callable, Dict, List, Optional, Tuple, Union
+import typing
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, Union
 
 import enum
+import functools
+import pathlib
 import queue
 import threading
 import time
@@ -9,10 +12,36 @@ import warnings
 from queue import Queue
 from threading import Thread
 
+from wyze_rtsp_bridge.event_buffer import Clip, EventBuffer, export_clip
+from wyze_rtsp_bridge.fanout import FrameFanout
+from wyze_rtsp_bridge.frame_filter import FrameFilter
+from wyze_rtsp_bridge.frame_queue import (
+    DropPolicy,
+    SubscriberThread,
+    VideoFrame,
+)
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.metrics import Histogram, MetricsWriter
+from wyze_rtsp_bridge.reconnect_scheduler import (
+    ReconnectScheduler,
+    ReconnectStats,
+    merge_stats,
+    slot_wait_histogram,
+)
+from wyze_rtsp_bridge.stream_quality import StreamQuality, highest_quality
+from wyze_rtsp_bridge.tracing import tracer
 from wyzecam.api_models import WyzeAccount, WyzeCamera
 from wyzecam.iotc import WyzeIOTC, WyzeIOTCSession, WyzeIOTCSessionState
 from wyzecam.tutk import tutk
 from wyzecam.tutk.tutk import FrameInfo3Struct, FrameInfoStruct
+from wyzecam.tutk.tutk_protocol import (
+    K10010ControlChannel,
+    K10052DBSetResolvingBit,
+    K10056SetResolvingBit,
+)
+
+if typing.TYPE_CHECKING:
+    from wyze_rtsp_bridge.process_shard import ListenerShard
 
 
 class WyzeIOTCVideoMux:
@@ -22,31 +51,230 @@ class WyzeIOTCVideoMux:
     """
 
     def __init__(
-        self, iotc: WyzeIOTC, account: WyzeAccount, cameras: List[WyzeCamera]
+        self,
+        iotc: WyzeIOTC,
+        account: WyzeAccount,
+        cameras: List[WyzeCamera],
+        max_queue_size: int = 60,
+        drop_policy: DropPolicy = DropPolicy.DROP_UNTIL_KEYFRAME,
+        gop_cache_max_frames: int = 300,
+        pause_after_idle_seconds: Optional[float] = 30.0,
+        max_concurrent_connects: Optional[int] = 8,
+        default_quality: StreamQuality = StreamQuality.HD,
+        worker_processes: int = 0,
+        reconnect_base_delay: float = 1.0,
+        reconnect_max_delay: float = 128.0,
+        shm_ring_bytes: int = 8 * 1024 * 1024,
+        iotc_factory: Optional[Callable[[int], WyzeIOTC]] = None,
+        spare_cameras_per_worker: int = 0,
     ):
         self.iotc = iotc
         self.account = account
         self.cameras = cameras
         self.listeners: Dict[str, WyzeIOTCVideoListener] = {}
+        self.started_at: Optional[float] = None
+        # bounds the number of cameras connecting (and probing for their
+        # first frame) at the same time, and spreads out their retries;
+        # with worker processes, each worker has its own
+        self.reconnect_scheduler: Optional[ReconnectScheduler] = None
+        self._reconnect_base_delay: float = reconnect_base_delay
+        self._reconnect_max_delay: float = reconnect_max_delay
+        self.shards: List["ListenerShard"] = []
+        self.worker_processes: int = worker_processes
+        # for the listeners of cameras added later, by add_cameras()
+        self._listener_kwargs: Dict[str, typing.Any] = dict(
+            max_queue_size=max_queue_size,
+            drop_policy=drop_policy,
+            gop_cache_max_frames=gop_cache_max_frames,
+            default_quality=default_quality,
+        )
+        self._pause_after_idle_seconds = pause_after_idle_seconds
+        self._iotc_factory = iotc_factory
+        self._shard_ring_bytes = shm_ring_bytes
+        self._shard_connect_slots: Optional[int] = None
+        # how many more cameras add_cameras() can put in a worker
+        self._spare_cameras_per_worker: int = spare_cameras_per_worker
+        self._shards_added: int = 0
+        if worker_processes:
+            self._start_shards(worker_processes, max_concurrent_connects)
+            return
+
+        self.reconnect_scheduler = ReconnectScheduler(
+            max_concurrent_connects or None,
+            base_delay=reconnect_base_delay,
+            max_delay=reconnect_max_delay,
+        )
+
         for camera in self.cameras:
-            thread = WyzeIOTCVideoListener(
-                self.iotc.connect_and_auth(self.account, camera), camera
-            )
-            self.listeners[camera.mac.lower()] = thread
-            thread.add_state_change_listener(self.print_state_change)
+            self._add_listener(camera)
+
+    def _add_listener(self, camera: WyzeCamera) -> "WyzeIOTCVideoListener":
+        listener = WyzeIOTCVideoListener(
+            self.iotc.connect_and_auth(self.account, camera),
+            camera,
+            pause_after_idle_seconds=self._pause_after_idle_seconds,
+            reconnect_scheduler=self.reconnect_scheduler,
+            **self._listener_kwargs,
+        )
+        self.listeners[camera.mac.lower()] = listener
+        listener.add_state_change_listener(self.print_state_change)
+        return listener
+
+    def _start_shards(
+        self,
+        worker_processes: int,
+        max_concurrent_connects: Optional[int],
+    ) -> None:
+        """
+        Splits the cameras between `worker_processes` worker processes,
+        each running the listeners of its cameras (see process_shard).
+        """
+        num_shards = min(worker_processes, len(self.cameras))
+        # each worker gets its share of the connection slots
+        self._shard_connect_slots = (
+            -(-max_concurrent_connects // max(num_shards, 1))
+            if max_concurrent_connects
+            else None
+        )
+        for index in range(num_shards):
+            self._add_shard(self.cameras[index::num_shards])
+
+    def _add_shard(self, cameras: List[WyzeCamera]) -> "ListenerShard":
+        from wyze_rtsp_bridge.process_shard import (
+            ListenerShard,
+            default_iotc_factory,
+        )
+
+        shard = ListenerShard(
+            self._shards_added,
+            self.account,
+            cameras,
+            iotc_factory=self._iotc_factory or default_iotc_factory,
+            ring_bytes=self._shard_ring_bytes,
+            pause_after_idle_seconds=self._pause_after_idle_seconds,
+            max_concurrent_connects=self._shard_connect_slots,
+            reconnect_base_delay=self._reconnect_base_delay,
+            reconnect_max_delay=self._reconnect_max_delay,
+            max_cameras=len(cameras) + self._spare_cameras_per_worker,
+            **self._listener_kwargs,
+        )
+        self._shards_added += 1
+        self.shards.append(shard)
+        for mac, listener in shard.listeners.items():
+            self.listeners[mac] = listener
+            listener.add_state_change_listener(self.print_state_change)
+        return shard
+
+    def add_cameras(
+        self, cameras: List[WyzeCamera]
+    ) -> List["WyzeIOTCVideoListener"]:
+        """
+        Adds listeners for more cameras, starting them if the mux has been
+        started.  With worker processes, a new camera gets a worker of its
+        own while there are fewer than `worker_processes`, and otherwise
+        goes to the worker with the fewest cameras that has room for it.
+        """
+        for camera in cameras:
+            if camera.mac.lower() in self.listeners:
+                raise ValueError(f"Camera {camera.mac} is already added")
+        if not cameras:
+            return []
+        self.cameras = self.cameras + list(cameras)
+
+        if self.worker_processes:
+            listeners: List[WyzeIOTCVideoListener] = [
+                self._add_to_shard(camera) for camera in cameras
+            ]
+        else:
+            listeners = [self._add_listener(camera) for camera in cameras]
+        if self.started_at is not None:
+            for listener in listeners:
+                listener.start()
+        return listeners
+
+    def _add_to_shard(self, camera: WyzeCamera) -> "WyzeIOTCVideoListener":
+        mac = camera.mac.lower()
+        if len(self.shards) < self.worker_processes:
+            shard = self._add_shard([camera])
+            if self.started_at is not None:
+                shard.start()
+            return shard.listeners[mac]
+
+        roomy = [
+            shard
+            for shard in self.shards
+            # a removed camera's slot is freed once its listener has exited
+            if shard.has_room and mac not in shard.listeners
+        ]
+        if roomy:
+            shard = min(roomy, key=lambda s: len(s.cameras))
+            listener = shard.add_camera(camera)
+            self.listeners[mac] = listener
+            listener.add_state_change_listener(self.print_state_change)
+            return listener
+
+        warnings.warn(
+            f"Every worker process is full; starting another one for camera "
+            f"{camera.mac} (raise spare_av_channels to make room)"
+        )
+        shard = self._add_shard([camera])
+        if self.started_at is not None:
+            shard.start()
+        return shard.listeners[mac]
+
+    def remove_camera(self, mac: str, block: bool = True) -> None:
+        """
+        Disconnects a camera and drops its listener, along with any
+        subscribers it still has; other cameras are left alone.  A worker
+        process is stopped once its last camera is removed.
+        """
+        listener = self.listeners.pop(mac.lower())
+        self.cameras = [c for c in self.cameras if c.mac.lower() != mac.lower()]
+        for subscriber_id in list(listener.fanout.subscribers):
+            listener.unsubscribe(subscriber_id)
+        shard = next(
+            (
+                s
+                for s in self.shards
+                if s.listeners.get(mac.lower()) is listener
+            ),
+            None,
+        )
+        if shard is None:
+            listener.disconnect()
+        else:
+            shard.remove_camera(mac.lower())
+            if not shard.cameras:
+                # its worker exits once the camera's listener has
+                self.shards.remove(shard)
+        if block and listener.is_alive():
+            listener.join()
+        if (
+            block
+            and shard is not None
+            and not shard.cameras
+            and self.started_at is not None
+        ):
+            shard.join()
 
     def get_listener(self, mac: str) -> "WyzeIOTCVideoListener":
         return self.listeners[mac.lower()]
 
     def start(self):
-        for thread in self.listeners.values():
+        self.started_at = time.monotonic()
+        for shard in self.shards:
+            shard.start()
+        for thread in list(self.listeners.values()):
             thread.start()
 
     def stop(self, block=True):
-        for thread in self.listeners.values():
+        for thread in list(self.listeners.values()):
             thread.disconnect()
             if block:
                 thread.join()
+        if block:
+            for shard in self.shards:
+                shard.join()
 
     def subscribe(
         self,
@@ -62,12 +290,53 @@ class WyzeIOTCVideoMux:
             ],
             None,
         ],
+        quality: Optional[StreamQuality] = None,
+        frame_filter: Optional[FrameFilter] = None,
+        pack_burst: bool = False,
     ) -> None:
-        self.get_listener(mac).subscribe(subscriber_id, callback=callback)
+        self.get_listener(mac).subscribe(
+            subscriber_id,
+            callback=callback,
+            quality=quality,
+            frame_filter=frame_filter,
+            pack_burst=pack_burst,
+        )
 
     def unsubscribe(self, mac: str, subscriber_id: int) -> None:
         self.get_listener(mac).unsubscribe(subscriber_id)
 
+    def enable_event_buffer(
+        self, mac: str, max_seconds: float, max_bytes: int
+    ) -> None:
+        """
+        Keeps the last `max_seconds` of a camera's frames in memory, for
+        export_clip().  The camera then streams even without subscribers.
+        """
+        self.get_listener(mac).enable_event_buffer(max_seconds, max_bytes)
+
+    def export_clip(
+        self,
+        mac: str,
+        path: pathlib.Path,
+        before_seconds: float,
+        after_seconds: float,
+    ) -> Clip:
+        """
+        Writes a clip from `before_seconds` ago to `after_seconds` from now
+        out of the camera's event buffer; blocks until it is written.
+        """
+        buffer = self.get_listener(mac).event_buffer
+        if buffer is None:
+            raise ValueError(f"Camera {mac} has no event buffer")
+        return export_clip(buffer, path, before_seconds, after_seconds)
+
+    def is_subscribed(self, mac: str, subscriber_id: int) -> bool:
+        return subscriber_id in self.get_listener(mac).fanout
+
+    def get_subscriber_stats(self, mac: str) -> Dict[int, Tuple[int, int]]:
+        """Returns (queue depth, dropped frames) for each subscriber of a camera"""
+        return self.get_listener(mac).get_subscriber_stats()
+
     def get_sample_frame_info(
         self, mac: str
     ) -> Optional[Union[FrameInfoStruct, FrameInfo3Struct]]:
@@ -79,7 +348,7 @@ class WyzeIOTCVideoMux:
     def is_all_connected(self) -> bool:
         return all(
             listener.state > WyzeIOTCVideoListenerState.CONNECTING
-            for listener in self.listeners.values()
+            for listener in list(self.listeners.values())
         )
 
     def is_any_connected(self) -> bool:
@@ -89,16 +358,182 @@ class WyzeIOTCVideoMux:
                 WyzeIOTCVideoListenerState.DISCONNECTED,
                 WyzeIOTCVideoListenerState.FATAL_ERROR,
             ]
-            for listener in self.listeners.values()
+            for listener in list(self.listeners.values())
         )
 
-    def wait_for_all_connected(self, debug=False):
-        while not self.is_all_connected():
-            if debug:
-                for mac, listener in self.listeners.items():
-                    print(f"{mac} {listener.state}")
+    def wait_for_all(
+        self,
+        predicate: Callable[["WyzeIOTCVideoListenerState"], bool],
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Blocks until every listener's state satisfies `predicate`.
 
-            time.sleep(0.1)
+        Returns False if that didn't happen within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for listener in list(self.listeners.values()):
+            remaining = (
+                None
+                if deadline is None
+                else max(deadline - time.monotonic(), 0)
+            )
+            if not listener.wait_for_state(predicate, timeout=remaining):
+                return False
+        return True
+
+    def wait_for_all_connected(self, timeout: Optional[float] = None) -> bool:
+        return self.wait_for_all(
+            lambda state: state > WyzeIOTCVideoListenerState.CONNECTING,
+            timeout=timeout,
+        )
+
+    def wait_for_all_disconnected(
+        self, timeout: Optional[float] = None
+    ) -> bool:
+        return self.wait_for_all(
+            lambda state: state
+            in [
+                WyzeIOTCVideoListenerState.DISCONNECTED,
+                WyzeIOTCVideoListenerState.FATAL_ERROR,
+            ],
+            timeout=timeout,
+        )
+
+    def startup_report(self) -> str:
+        """Summarizes how long each camera took to connect"""
+        lines = []
+        for mac, listener in list(self.listeners.items()):
+            if listener.connect_duration is None:
+                lines.append(f"{mac}  not connected ({listener.state.name})")
+            else:
+                lines.append(
+                    f"{mac}  waited {listener.connect_wait:6.2f}s  "
+                    f"connected in {listener.connect_duration:6.2f}s"
+                )
+        durations = [
+            listener.connect_duration
+            for listener in list(self.listeners.values())
+            if listener.connect_duration is not None
+        ]
+        if durations and self.started_at is not None:
+            lines.append(
+                f"{len(durations)}/{len(self.listeners)} cameras connected in "
+                f"{time.monotonic() - self.started_at:.2f}s "
+                f"(slowest camera {max(durations):.2f}s, "
+                f"sum of all cameras {sum(durations):.2f}s)"
+            )
+        return "\n".join(lines)
+
+    def reconnect_stats(self) -> Optional[ReconnectStats]:
+        """The reconnect scheduler's stats, added up over worker processes"""
+        if self.reconnect_scheduler is not None:
+            return self.reconnect_scheduler.stats()
+        return merge_stats(
+            shard.reconnect_stats
+            for shard in self.shards
+            if shard.reconnect_stats is not None
+        )
+
+    def collect_metrics(self, writer: MetricsWriter) -> None:
+        stats = self.reconnect_stats()
+        if stats is not None:
+            writer.gauge(
+                "wyze_reconnect_waiting",
+                "Connection attempts waiting for a slot",
+                stats.waiting,
+            )
+            writer.gauge(
+                "wyze_reconnect_in_flight",
+                "Connection attempts holding a slot",
+                stats.in_flight,
+            )
+            writer.counter(
+                "wyze_reconnect_attempts_total",
+                "Connection attempts given a slot",
+                stats.attempts,
+            )
+            writer.counter(
+                "wyze_reconnect_priority_attempts_total",
+                "Connection attempts given a slot ahead of others because the camera had subscribers",
+                stats.priority_attempts,
+            )
+            writer.counter(
+                "wyze_reconnect_retries_total",
+                "Retries scheduled after a failed or dropped connection",
+                stats.retries,
+            )
+            writer.histogram(
+                "wyze_reconnect_slot_wait_seconds",
+                "Time connection attempts waited for a slot",
+                slot_wait_histogram(stats),
+            )
+        for mac, listener in list(self.listeners.items()):
+            labels = {"camera": mac}
+            writer.counter(
+                "wyze_camera_frames_total",
+                "Frames received from the camera",
+                listener.frames_received,
+                labels,
+            )
+            writer.counter(
+                "wyze_camera_bytes_total",
+                "Bytes of video received from the camera",
+                listener.bytes_received,
+                labels,
+            )
+            if listener.keyframe_interval is not None:
+                writer.gauge(
+                    "wyze_camera_keyframe_interval_seconds",
+                    "Time between the camera's two most recent keyframes",
+                    listener.keyframe_interval,
+                    labels,
+                )
+            writer.counter(
+                "wyze_camera_reconnects_total",
+                "Times the camera's session has been reconnected",
+                listener.reconnects,
+                labels,
+            )
+            current_state = listener.state
+            for state in WyzeIOTCVideoListenerState:
+                writer.gauge(
+                    "wyze_camera_state",
+                    "1 for the state the camera's listener is in, 0 otherwise",
+                    int(state == current_state),
+                    dict(labels, state=state.name),
+                )
+            if listener.event_buffer is not None:
+                writer.gauge(
+                    "wyze_camera_event_buffer_bytes",
+                    "Bytes of video held in the camera's event buffer",
+                    listener.event_buffer.size_bytes,
+                    labels,
+                )
+            if listener.fanout.latency is not None:
+                writer.histogram(
+                    "wyze_camera_push_latency_seconds",
+                    "Time from receiving a frame to a subscriber being done pushing it",
+                    listener.fanout.latency,
+                    labels,
+                )
+            for subscriber_id, (
+                depth,
+                dropped,
+            ) in listener.get_subscriber_stats().items():
+                subscriber_labels = dict(labels, subscriber=str(subscriber_id))
+                writer.gauge(
+                    "wyze_subscriber_queue_depth",
+                    "Frames waiting in the subscriber's queue",
+                    depth,
+                    subscriber_labels,
+                )
+                writer.counter(
+                    "wyze_subscriber_dropped_frames_total",
+                    "Frames dropped because the subscriber's queue was full",
+                    dropped,
+                    subscriber_labels,
+                )
 
     def print_state_change(self, listener, new_state):
         print(
@@ -137,7 +572,47 @@ class WyzeIOTCVideoListenerState(enum.IntEnum):
     """Unrecoverable error; see listener.error"""
 
 
-LISTENER_SLEEP_INTERVAL = 0.5
+class ConnectSlot:
+    """
+    Holds one of a ReconnectScheduler's limited number of concurrent
+    connection attempts, from entering the `with` block until release() is
+    called (or the block exits).  If `cancelled()` became true while
+    waiting for one, the block is entered without a slot: see `held`.
+    """
+
+    def __init__(
+        self,
+        scheduler: ReconnectScheduler,
+        has_priority: Callable[[], bool] = lambda: False,
+        cancelled: Callable[[], bool] = lambda: False,
+    ) -> None:
+        self.scheduler = scheduler
+        self.has_priority = has_priority
+        self.cancelled = cancelled
+        self.held = False
+
+    def __enter__(self) -> "ConnectSlot":
+        self.held = self.scheduler.acquire(self.has_priority, self.cancelled)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.scheduler.release()
+
+
+# The key and values of the K10010 "control channel" command, as the Wyze
+# app sends them to turn a camera's video (key 1; audio is 2) on (1) or off
+# (2); wyzecam's K10010ControlChannel() defaults to (1, 2), stopping video.
+# Not yet confirmed against any particular camera firmware; the synthetic
+# camera in benchmarks/ only mirrors these values.
+CONTROL_CHANNEL_VIDEO = 1
+CONTROL_CHANNEL_START = 1
+CONTROL_CHANNEL_STOP = 2
+IOCTL_TIMEOUT = 5
 
 
 class WyzeIOTCVideoListener(Thread):
@@ -147,14 +622,24 @@ class WyzeIOTCVideoListener(Thread):
         self,
         session: WyzeIOTCSession,
         camera: WyzeCamera,
-        max_queue_size: int = 10_000,
+        max_queue_size: int = 60,
+        drop_policy: DropPolicy = DropPolicy.DROP_UNTIL_KEYFRAME,
+        gop_cache_max_frames: int = 300,
+        pause_after_idle_seconds: Optional[float] = 30.0,
+        reconnect_scheduler: Optional[ReconnectScheduler] = None,
+        default_quality: StreamQuality = StreamQuality.HD,
     ) -> None:
-        super(WyzeIOTCVideoListener, self).__init__(daemon=True)
+        super(WyzeIOTCVideoListener, self).__init__(
+            name=f"listener-{camera.mac}", daemon=True
+        )
         self.session: WyzeIOTCSession = session
         self.camera: WyzeCamera = camera
         self._state = WyzeIOTCVideoListenerState.DISCONNECTED
         self.state_lock: threading.RLock = threading.RLock()
-        self.max_queue_size: int = max_queue_size
+        # notified on every state change; see wait_for_state()
+        self.state_changed: threading.Condition = threading.Condition(
+            self.state_lock
+        )
         self.example_frame_info: Optional[
             Union[FrameInfoStruct, FrameInfo3Struct]
         ] = None
@@ -164,20 +649,42 @@ class WyzeIOTCVideoListener(Thread):
             ]
         ] = []
         self.error: Optional[Exception] = None
-        self.data_available_listeners: Dict[
-            int,
-            Callable[
-                [
-                    "WyzeIOTCVideoListener",
-                    Tuple[
-                        bytes,
-                        Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct],
-                    ],
-                ],
-                None,
-            ],
-        ] = {}
+        self.fanout: FrameFanout = FrameFanout(
+            camera.mac,
+            max_queue_size=max_queue_size,
+            drop_policy=drop_policy,
+            gop_cache_max_frames=gop_cache_max_frames,
+            on_idle=self._schedule_idle_pause,
+            latency=Histogram(),
+        )
+        # serializes pausing / resuming the stream with subscriber changes
+        self.demand_lock: threading.RLock = threading.RLock()
+        self.pause_after_idle_seconds: Optional[
+            float
+        ] = pause_after_idle_seconds
+        self.idle_timer: Optional[threading.Timer] = None
+        self.camera_stream_stopped = False
+        self.default_quality: StreamQuality = default_quality
+        # what the camera is currently asked to stream at
+        self.streaming_quality: StreamQuality = default_quality
+        self.subscriber_qualities: Dict[int, StreamQuality] = {}
+        self.reconnect_scheduler: ReconnectScheduler = (
+            reconnect_scheduler or ReconnectScheduler(max_concurrent=None)
+        )
+        self.connect_wait: Optional[float] = None
+        self.connect_duration: Optional[float] = None
         self.retries = 0
+        self.reconnects: int = 0
+        self.frames_received: int = 0
+        self.bytes_received: int = 0
+        self.keyframe_interval: Optional[float] = None
+        self._last_keyframe_ms: Optional[int] = None
+        # the last few seconds of frames, for clips; see enable_event_buffer()
+        self.event_buffer: Optional[EventBuffer] = None
+
+    @property
+    def data_available_listeners(self) -> Mapping[int, SubscriberThread]:
+        return self.fanout.subscribers
 
     def add_state_change_listener(
         self,
@@ -198,6 +705,7 @@ class WyzeIOTCVideoListener(Thread):
             for listener in self.state_change_listeners:
                 listener(self, new_state)
             self._state = new_state
+            self.state_changed.notify_all()
 
         if new_state == WyzeIOTCVideoListenerState.CONNECTED:
             self.retries = 0
@@ -206,80 +714,138 @@ class WyzeIOTCVideoListener(Thread):
         self,
         condition: Callable[[WyzeIOTCVideoListenerState], bool],
         new_state: WyzeIOTCVideoListenerState,
-    ) -> None:
-
+    ) -> bool:
+        """Moves to `new_state` if `condition` holds for the current state"""
         with self.state_lock:
-            if condition(self._state):
-                for listener in self.state_change_listeners:
-                    listener(self, new_state)
-                self._state = new_state
+            if not condition(self._state):
+                return False
+            for listener in self.state_change_listeners:
+                listener(self, new_state)
+            self._state = new_state
+            self.state_changed.notify_all()
+
+        if new_state == WyzeIOTCVideoListenerState.CONNECTED:
+            self.retries = 0
+        return True
+
+    def wait_for_state(
+        self,
+        predicate: Callable[[WyzeIOTCVideoListenerState], bool],
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Blocks until the state satisfies `predicate`.
+
+        Returns False if that didn't happen within `timeout` seconds.
+        """
+        with self.state_changed:
+            return self.state_changed.wait_for(
+                lambda: predicate(self._state), timeout=timeout
+            )
 
     def run(self) -> None:
         while True:
             self.connect_and_start_streaming()
             self.retries += 1
-            if self.retries > 7:
-                self.retries = 7
             if self.state == WyzeIOTCVideoListenerState.DISCONNECTED:
                 break
 
-            # exponential backoff up to 128 seconds (2 ** 7)
-            for _ in range(2 ** self.retries):
-                time.sleep(1)
-                self.transition_state(
-                    lambda old: old
-                    == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED,
-                    WyzeIOTCVideoListenerState.DISCONNECTED,
+            if self.state != WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED:
+                # a jittered exponential backoff, cut short by a call to
+                # disconnect()
+                self.reconnect_scheduler.wait_to_retry(
+                    self.retries,
+                    lambda delay: self.wait_for_state(
+                        lambda state: state
+                        == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED,
+                        timeout=delay,
+                    ),
                 )
-                if self.state == WyzeIOTCVideoListenerState.DISCONNECTED:
-                    break
+            if self.transition_state(
+                lambda old: old
+                == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED,
+                WyzeIOTCVideoListenerState.DISCONNECTED,
+            ):
+                break
+            self.reconnects += 1
             print(f"Reconnecting to {self.camera.mac} retry={self.retries}")
 
     def connect_and_start_streaming(self):
         self.state = WyzeIOTCVideoListenerState.CONNECTING
         self.error = None
+        self.camera_stream_stopped = False
+        self.fanout.clear_cache()
+        # the session asks the camera for this quality as it authenticates
+        self.streaming_quality = self.requested_quality
+        self.session.preferred_frame_size = self.streaming_quality.frame_size
+        self.session.preferred_bitrate = self.streaming_quality.bitrate
+        attempt_started_at = time.monotonic()
         try:
-            with self.session:
-                if (
-                    self.state
-                    == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED
-                ):
+            with ConnectSlot(
+                self.reconnect_scheduler,
+                # a camera someone is waiting on goes first
+                has_priority=lambda: bool(self.fanout),
+                cancelled=lambda: self.state
+                == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED,
+            ) as slot:
+                if not slot.held:
                     return
+                self.connect_wait = time.monotonic() - attempt_started_at
+                connect_started_at = time.monotonic()
+                with self.session:
+                    if (
+                        self.state
+                        == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED
+                    ):
+                        return
 
-                session_info = self.session.session_check()
-                if session_info.mode != 2:
-                    warning = Warning(
-                        f"Refusing to use non-LAN mode to connect to session for"
-                        f" camera {self.camera.mac} (was using mode={session_info.mode})"
-                    )
-                    warnings.warn(warning)
-                    self.error = warning
-                    self.state = WyzeIOTCVideoListenerState.FATAL_ERROR
-                    return
+                    session_info = self.session.session_check()
+                    if session_info.mode != 2:
+                        warning = Warning(
+                            f"Refusing to use non-LAN mode to connect to session for"
+                            f" camera {self.camera.mac} (was using mode={session_info.mode})"
+                        )
+                        warnings.warn(warning)
+                        self.error = warning
+                        self.state = WyzeIOTCVideoListenerState.FATAL_ERROR
+                        return
 
-                # read one frame, and safe the frame info data for later use
-                _, self.example_frame_info = next(
-                    self.session.recv_video_data()
-                )
+                    # read one frame, and safe the frame info data for later use
+                    _, self.example_frame_info = next(
+                        self.session.recv_video_data()
+                    )
+                    self.connect_duration = (
+                        time.monotonic() - connect_started_at
+                    )
+                    slot.release()
 
-                self.transition_state(
-                    lambda old: old == WyzeIOTCVideoListenerState.DISCONNECTED,
-                    WyzeIOTCVideoListenerState.CONNECTED,
-                )
-                self.state = WyzeIOTCVideoListenerState.STREAMING_REQUESTED
-                while True:
-                    if (
-                        self.state
-                        == WyzeIOTCVideoListenerState.STREAMING_REQUESTED
+                    # disconnect() may have been called while connecting
+                    if not self.transition_state(
+                        lambda old: old
+                        == WyzeIOTCVideoListenerState.CONNECTING,
+                        WyzeIOTCVideoListenerState.CONNECTED,
+                    ) or not self.transition_state(
+                        lambda old: old == WyzeIOTCVideoListenerState.CONNECTED,
+                        WyzeIOTCVideoListenerState.STREAMING_REQUESTED,
                     ):
+                        return
+                    if not self.data_available_listeners:
+                        self._schedule_idle_pause()
+                    while True:
+                        # sleeps while paused, until resumed or disconnected
+                        self.wait_for_state(
+                            lambda state: state
+                            in [
+                                WyzeIOTCVideoListenerState.STREAMING_REQUESTED,
+                                WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED,
+                            ]
+                        )
+                        if (
+                            self.state
+                            == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED
+                        ):
+                            break
                         self._stream_until_paused()
-                    elif (
-                        self.state
-                        == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED
-                    ):
-                        break
-                    else:
-                        time.sleep(LISTENER_SLEEP_INTERVAL)
         except tutk.TutkError as e:
             self.error = e
             self.state = WyzeIOTCVideoListenerState.FATAL_ERROR
@@ -289,28 +855,181 @@ class WyzeIOTCVideoListener(Thread):
         )
 
     def _stream_until_paused(self):
-        assert self.state == WyzeIOTCVideoListenerState.STREAMING_REQUESTED
+        wait_for_keyframe = self.camera_stream_stopped
+        if self.camera_stream_stopped:
+            self._set_camera_streaming(True)
 
-        self.state = WyzeIOTCVideoListenerState.STREAMING
+        self.transition_state(
+            lambda old: old == WyzeIOTCVideoListenerState.STREAMING_REQUESTED,
+            WyzeIOTCVideoListenerState.STREAMING,
+        )
+        recv_started = tracer.begin()
         for data in self.session.recv_video_data():
-            for subscriber_id in list(self.data_available_listeners.keys()):
-                self._try_add_data(data, subscriber_id)
+            if self.requested_quality != self.streaming_quality:
+                self._set_camera_quality(self.requested_quality)
+                wait_for_keyframe = True
+            if wait_for_keyframe:
+                # skip anything buffered from before the pause
+                if not data[1].is_keyframe:
+                    continue
+                wait_for_keyframe = False
+            trace_args = (
+                {"camera": self.camera.mac, "frame": data[1].frame_no}
+                if tracer.enabled
+                else None
+            )
+            tracer.end("recv", recv_started, args=trace_args)
+            self._record_frame(data)
+            publish_started = tracer.begin()
+            self.fanout.publish(data)
+            if self.event_buffer is not None:
+                self.event_buffer.add(data)
+            tracer.end("publish", publish_started, args=trace_args)
             if self.state == WyzeIOTCVideoListenerState.PAUSE_REQUESTED:
-                self.state = WyzeIOTCVideoListenerState.PAUSED
+                self._set_camera_streaming(False)
+                self.fanout.clear_cache()
+                self.transition_state(
+                    lambda old: old
+                    == WyzeIOTCVideoListenerState.PAUSE_REQUESTED,
+                    WyzeIOTCVideoListenerState.PAUSED,
+                )
                 return
             if self.state == WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED:
                 return
+            recv_started = tracer.begin()
+
+    def _record_frame(self, data: VideoFrame) -> None:
+        frame, frame_info = data
+        self.frames_received += 1
+        self.bytes_received += len(frame)
+        if frame_info.is_keyframe:
+            timestamp_ms = frame_timestamp_ms(frame_info)
+            if self._last_keyframe_ms is not None:
+                interval_ms = timestamp_ms - self._last_keyframe_ms
+                if interval_ms > 0:
+                    self.keyframe_interval = interval_ms / 1000
+            self._last_keyframe_ms = timestamp_ms
+
+    @property
+    def requested_quality(self) -> StreamQuality:
+        """The highest quality any current subscriber asked for"""
+        with self.demand_lock:
+            qualities = [
+                quality
+                for subscriber_id, quality in self.subscriber_qualities.items()
+                if subscriber_id in self.fanout
+            ]
+        if not qualities:
+            return self.streaming_quality
+        return highest_quality(*qualities)
+
+    def _forget_departed_subscribers(self) -> None:
+        # subscribers the fanout dropped on its own (errors, full queues)
+        # never went through unsubscribe()
+        with self.demand_lock:
+            for subscriber_id in list(self.subscriber_qualities):
+                if subscriber_id not in self.fanout:
+                    del self.subscriber_qualities[subscriber_id]
 
-    def _try_add_data(self, data, subscriber_id):
+    def _set_camera_quality(self, quality: StreamQuality) -> None:
+        """
+        Asks the camera to switch to streaming at `quality`.
+
+        Frames at the old quality still in flight are dropped by the
+        session, which only yields frames of its preferred frame size.
+        """
+        print(
+            f"Switching {self.camera.mac} from {self.streaming_quality.value} "
+            f"to {quality.value}"
+        )
+        self.session.preferred_frame_size = quality.frame_size
+        self.session.preferred_bitrate = quality.bitrate
+        if self.camera.product_model == "WYZEDB3":
+            msg = K10052DBSetResolvingBit(quality.frame_size, quality.bitrate)
+        else:
+            msg = K10056SetResolvingBit(quality.frame_size, quality.bitrate)
         try:
-            if subscriber_id in self.data_available_listeners:
-                self.data_available_listeners[subscriber_id](self, data)
-        except queue.Full:
+            with self.session.iotctrl_mux() as mux:
+                mux.send_ioctl(msg).result(timeout=IOCTL_TIMEOUT)
+        except queue.Empty:
             warnings.warn(
-                f"Subscriber {subscriber_id} has hit the max queue size; "
-                f"either fell behind or stopped listening"
+                f"Camera {self.camera.mac} did not acknowledge "
+                f"switching to {quality.value}"
             )
-            self.unsubscribe(subscriber_id)
+        self.streaming_quality = quality
+        self.fanout.clear_cache()
+
+    def _set_camera_streaming(self, enabled: bool) -> None:
+        """Asks the camera to start or stop sending video over the AV channel"""
+        msg = K10010ControlChannel(
+            CONTROL_CHANNEL_VIDEO,
+            CONTROL_CHANNEL_START if enabled else CONTROL_CHANNEL_STOP,
+        )
+        try:
+            with self.session.iotctrl_mux() as mux:
+                mux.send_ioctl(msg).result(timeout=IOCTL_TIMEOUT)
+        except queue.Empty:
+            warnings.warn(
+                f"Camera {self.camera.mac} did not acknowledge "
+                f"{'start' if enabled else 'stop'} video request"
+            )
+        self.camera_stream_stopped = not enabled
+
+    def _schedule_idle_pause(self) -> None:
+        if self.pause_after_idle_seconds is None:
+            return
+        with self.demand_lock:
+            self._cancel_idle_pause()
+            self.idle_timer = threading.Timer(
+                self.pause_after_idle_seconds, self._pause_if_idle
+            )
+            self.idle_timer.daemon = True
+            self.idle_timer.start()
+
+    def _cancel_idle_pause(self) -> None:
+        with self.demand_lock:
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+                self.idle_timer = None
+
+    def _pause_if_idle(self) -> None:
+        with self.demand_lock:
+            if self.fanout or self.event_buffer is not None:
+                return
+            self.transition_state(
+                lambda old: old
+                in [
+                    WyzeIOTCVideoListenerState.STREAMING_REQUESTED,
+                    WyzeIOTCVideoListenerState.STREAMING,
+                ],
+                WyzeIOTCVideoListenerState.PAUSE_REQUESTED,
+            )
+
+    def _resume(self) -> None:
+        self._cancel_idle_pause()
+        # if the stream loop hasn't gotten around to pausing yet, just
+        # keep streaming
+        self.transition_state(
+            lambda old: old == WyzeIOTCVideoListenerState.PAUSE_REQUESTED,
+            WyzeIOTCVideoListenerState.STREAMING,
+        )
+        self.transition_state(
+            lambda old: old == WyzeIOTCVideoListenerState.PAUSED,
+            WyzeIOTCVideoListenerState.STREAMING_REQUESTED,
+        )
+
+    def set_subscriber_quality(
+        self, subscriber_id: int, quality: StreamQuality
+    ) -> None:
+        """Changes the quality an existing subscriber asks for"""
+        with self.demand_lock:
+            if subscriber_id in self.subscriber_qualities:
+                self.subscriber_qualities[subscriber_id] = quality
+
+    def enable_event_buffer(self, max_seconds: float, max_bytes: int) -> None:
+        with self.demand_lock:
+            self.event_buffer = EventBuffer(max_seconds, max_bytes)
+            self._resume()
 
     def subscribe(
         self,
@@ -325,23 +1044,55 @@ class WyzeIOTCVideoListener(Thread):
             ],
             None,
         ],
+        quality: Optional[StreamQuality] = None,
+        frame_filter: Optional[FrameFilter] = None,
+        pack_burst: bool = False,
     ) -> None:
-        if subscriber_id in self.data_available_listeners:
+        """
+        Subscribes to the camera's frames (those passing `frame_filter`,
+        if given).  A player should ask to `pack_burst`, see
+        FrameFanout.subscribe().
+
+        The camera streams at the highest quality any subscriber asks for,
+        so a subscriber asking for SD gets HD frames while someone else is
+        watching in HD.
+        """
+        if not callback:
             return
 
-        if callback:
-            self.data_available_listeners[subscriber_id] = callback
+        quality = quality or self.default_quality
+        with self.demand_lock:
+            self._forget_departed_subscribers()
+            if (
+                highest_quality(quality, *self.subscriber_qualities.values())
+                != self.streaming_quality
+            ):
+                # don't start the new subscriber on a GOP at the old quality
+                self.fanout.clear_cache()
+            self.subscriber_qualities[subscriber_id] = quality
+            if self.fanout.subscribe(
+                subscriber_id,
+                functools.partial(callback, self),
+                frame_filter=frame_filter,
+                pack_burst=pack_burst,
+            ):
+                self._resume()
+        # a camera waiting for a connection slot now has priority
+        self.reconnect_scheduler.wake()
 
     def unsubscribe(self, subscriber_id: int) -> None:
-        if subscriber_id not in self.data_available_listeners:
+        with self.demand_lock:
+            self.subscriber_qualities.pop(subscriber_id, None)
+        if self.fanout.unsubscribe(subscriber_id) is None:
             warnings.warn(
                 f"Double-unsubscribed to camera {self.camera.mac} with subscriber_id {subscriber_id}"
             )
-            return
 
-        del self.data_available_listeners[subscriber_id]
+    def get_subscriber_stats(self) -> Dict[int, Tuple[int, int]]:
+        return self.fanout.get_subscriber_stats()
 
     def disconnect(self):
+        self._cancel_idle_pause()
         if self.state in [WyzeIOTCVideoListenerState.DISCONNECTED]:
             return
 
@@ -355,3 +1106,5 @@ class WyzeIOTCVideoListener(Thread):
             )
 
         self.state = WyzeIOTCVideoListenerState.DISCONNECT_REQUESTED
+        # stop waiting for a connection slot
+        self.reconnect_scheduler.wake()
@@ -0,0 +1,149 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import bisect
+import collections
+import threading
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+"""Histogram buckets for per-frame latencies, in seconds"""
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""The content type of the prometheus text exposition format"""
+
+
+class Histogram:
+    """A cumulative histogram of observations, in the style of prometheus"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations <= upper bound) for each bucket, ending with +Inf"""
+        with self._lock:
+            counts = list(self.counts)
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        for value in labels.values()
+    )
+    pairs = ",".join(
+        f'{name}="{value}"' for name, value in zip(labels.keys(), escaped)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsWriter:
+    """
+    Collects samples and renders them in the prometheus text format.
+
+    Samples of the same metric are grouped under a single HELP / TYPE
+    header, however many collectors contribute to it.
+    """
+
+    def __init__(self) -> None:
+        self._families: Dict[
+            str, Tuple[str, str, List[str]]
+        ] = collections.OrderedDict()
+
+    def _family(self, name: str, kind: str, help_text: str) -> List[str]:
+        if name not in self._families:
+            self._families[name] = (kind, help_text, [])
+        return self._families[name][2]
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str,
+        value: float,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self._family(name, "gauge", help_text).append(
+            f"{name}{_format_labels(labels)} {_format_value(value)}"
+        )
+
+    def counter(
+        self,
+        name: str,
+        help_text: str,
+        value: float,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self._family(name, "counter", help_text).append(
+            f"{name}{_format_labels(labels)} {_format_value(value)}"
+        )
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        histogram: Histogram,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> None:
+        lines = self._family(name, "histogram", help_text)
+        labels = labels or {}
+        cumulative = histogram.cumulative_counts()
+        for bound, count in cumulative:
+            bucket_labels = dict(labels, le=_format_value(bound))
+            lines.append(
+                f"{name}_bucket{_format_labels(bucket_labels)} {count}"
+            )
+        lines.append(
+            f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}"
+        )
+        lines.append(
+            f"{name}_count{_format_labels(labels)} {cumulative[-1][1]}"
+        )
+
+    def render(self) -> str:
+        result = []
+        for name, (kind, help_text, lines) in self._families.items():
+            result.append(f"# HELP {name} {help_text}")
+            result.append(f"# TYPE {name} {kind}")
+            result.extend(lines)
+        return "\n".join(result) + "\n"
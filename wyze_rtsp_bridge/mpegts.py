@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional
+
+import struct
+
+PACKET_SIZE = 188
+SYNC_BYTE = 0x47
+
+PAT_PID = 0x0000
+PMT_PID = 0x1000
+VIDEO_PID = 0x0100
+PROGRAM_NUMBER = 1
+
+STREAM_TYPE_H264 = 0x1B
+STREAM_TYPE_H265 = 0x24
+
+CODEC_STREAM_TYPES = {78: STREAM_TYPE_H264, 80: STREAM_TYPE_H265}
+"""FrameInfoStruct.codec_id -> MPEG-TS stream type"""
+
+ACCESS_UNIT_DELIMITERS = {
+    STREAM_TYPE_H264: b"\x00\x00\x00\x01\x09\xf0",
+    STREAM_TYPE_H265: b"\x00\x00\x00\x01\x46\x01\x50",
+}
+
+PTS_CLOCK_HZ = 90_000
+PTS_WRAP = 1 << 33
+
+
+def _make_crc32_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_CRC32_TABLE = _make_crc32_table()
+
+
+def crc32_mpeg2(data: bytes) -> int:
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC32_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def _encode_pts(marker: int, pts: int) -> bytes:
+    return bytes(
+        [
+            (marker << 4) | (((pts >> 30) & 0x07) << 1) | 1,
+            (pts >> 22) & 0xFF,
+            (((pts >> 15) & 0x7F) << 1) | 1,
+            (pts >> 7) & 0xFF,
+            ((pts & 0x7F) << 1) | 1,
+        ]
+    )
+
+
+def _encode_pcr(pts: int) -> bytes:
+    # 33 bit base, 6 reserved bits, 9 bit extension (always 0 here)
+    return struct.pack(
+        ">IH", (pts >> 1) & 0xFFFFFFFF, ((pts & 1) << 15) | 0x7E00
+    )
+
+
+class TsMuxer:
+    """
+    Packs H.264 / H.265 access units (as yielded by the camera) into a
+    single-program MPEG transport stream, without touching the video.
+
+    The PAT and PMT are repeated in front of every keyframe, so a stream
+    can be cut (or joined) at any keyframe.
+    """
+
+    def __init__(self, stream_type: int = STREAM_TYPE_H264) -> None:
+        self.stream_type: int = stream_type
+        self.continuity: Dict[int, int] = {}
+
+    def _next_continuity(self, pid: int) -> int:
+        counter = self.continuity.get(pid, -1)
+        counter = (counter + 1) & 0x0F
+        self.continuity[pid] = counter
+        return counter
+
+    def _psi_packet(self, pid: int, table: bytes) -> bytes:
+        section = table + struct.pack(">I", crc32_mpeg2(table))
+        header = struct.pack(
+            ">BHB",
+            SYNC_BYTE,
+            0x4000 | pid,
+            0x10 | self._next_continuity(pid),
+        )
+        # pointer_field, then the section, padded with 0xff
+        packet = header + b"\x00" + section
+        return packet + b"\xff" * (PACKET_SIZE - len(packet))
+
+    def tables(self) -> bytes:
+        """The PAT and PMT, as two transport stream packets"""
+        pat = struct.pack(
+            ">BHHBBBHH",
+            0x00,  # table_id: program_association_section
+            0xB000 | 13,  # section_syntax_indicator, section_length
+            1,  # transport_stream_id
+            0xC1,  # version 0, current_next_indicator
+            0,  # section_number
+            0,  # last_section_number
+            PROGRAM_NUMBER,
+            0xE000 | PMT_PID,
+        )
+        pmt = struct.pack(
+            ">BHHBBBHHBHH",
+            0x02,  # table_id: TS_program_map_section
+            0xB000 | 18,
+            PROGRAM_NUMBER,
+            0xC1,
+            0,
+            0,
+            0xE000 | VIDEO_PID,  # PCR_PID
+            0xF000,  # program_info_length
+            self.stream_type,
+            0xE000 | VIDEO_PID,
+            0xF000,  # ES_info_length
+        )
+        return self._psi_packet(PAT_PID, pat) + self._psi_packet(PMT_PID, pmt)
+
+    def mux(self, frame: bytes, pts: int, keyframe: bool) -> bytes:
+        """
+        Packs one access unit, with the given 90 kHz presentation timestamp,
+        into transport stream packets (preceded by the PAT and PMT, if it is
+        a keyframe).
+        """
+        pts %= PTS_WRAP
+        delimiter = ACCESS_UNIT_DELIMITERS.get(self.stream_type, b"")
+        pes = (
+            b"\x00\x00\x01\xe0\x00\x00"  # video stream 0, unbounded length
+            + b"\x80\x80\x05"  # PTS only
+            + _encode_pts(0x2, pts)
+            + delimiter
+            + frame
+        )
+
+        packets: List[bytes] = [self.tables()] if keyframe else []
+        offset = 0
+        while offset < len(pes):
+            first = offset == 0
+            adaptation: Optional[bytes] = None
+            if first:
+                # PCR on every access unit (they share the PTS clock), and
+                # the random access flag on keyframes
+                flags = 0x10 | (0x40 if keyframe else 0)
+                adaptation = bytes([flags]) + _encode_pcr(pts)
+
+            room = PACKET_SIZE - 4
+            if adaptation is not None:
+                room -= 1 + len(adaptation)
+            remaining = len(pes) - offset
+            if remaining < room:
+                # fill up the last packet by stuffing the adaptation field
+                if adaptation is not None:
+                    adaptation += b"\xff" * (room - remaining)
+                else:
+                    size = PACKET_SIZE - 4 - remaining
+                    adaptation = (
+                        b"" if size == 1 else b"\x00" + b"\xff" * (size - 2)
+                    )
+                room = remaining
+
+            header = struct.pack(
+                ">BHB",
+                SYNC_BYTE,
+                (0x4000 if first else 0) | VIDEO_PID,
+                (0x10 if adaptation is None else 0x30)
+                | self._next_continuity(VIDEO_PID),
+            )
+            if adaptation is not None:
+                header += bytes([len(adaptation)]) + adaptation
+            packets.append(header + pes[offset : offset + room])
+            offset += room
+        return b"".join(packets)
+
+
+def stream_type_for(codec_id: int) -> Optional[int]:
+    return CODEC_STREAM_TYPES.get(codec_id)
@@ -0,0 +1,579 @@
+"""
+Runs groups of camera listeners in worker processes, so that receiving
+video from many cameras isn't bound to a single core by the GIL (see
+WyzeIOTCVideoMux's `worker_processes`).
+
+Each worker runs ordinary WyzeIOTCVideoListeners, and writes every frame
+into a shared memory FrameRing per camera.  In the main process, each
+camera is represented by a RemoteVideoListener, which reads its ring into
+a local fanout, so that subscribers are none the wiser.  Only small
+control messages (subscriber demand, state changes) go over a pipe.
+"""
+import types
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import functools
+import multiprocessing
+import threading
+import time
+import warnings
+from multiprocessing.connection import Connection
+
+from wyze_rtsp_bridge.frame_filter import FrameFilter
+from wyze_rtsp_bridge.frame_queue import DropPolicy, VideoFrame
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListener,
+    WyzeIOTCVideoListenerState,
+)
+from wyze_rtsp_bridge.reconnect_scheduler import (
+    ReconnectScheduler,
+    ReconnectStats,
+)
+from wyze_rtsp_bridge.shm_ring import (
+    FRAME_INFO_TYPES,
+    FrameRing,
+    FrameRingError,
+    FrameRingReader,
+)
+from wyze_rtsp_bridge.stream_quality import StreamQuality
+from wyze_rtsp_bridge.tracing import tracer
+from wyzecam.api_models import WyzeAccount, WyzeCamera
+from wyzecam.iotc import WyzeIOTC, WyzeIOTCSessionState
+from wyzecam.tutk import tutk
+from wyzecam.tutk.tutk import FrameInfo3Struct
+
+RING_SUBSCRIBER_ID = 0
+"""The worker-side subscriber that copies a camera's frames into its ring"""
+
+POLL_INTERVAL = 0.5
+"""How often blocked readers check whether they should stop"""
+
+IotcFactory = Callable[[int], WyzeIOTC]
+"""Makes an initialized WyzeIOTC for the given number of cameras"""
+
+
+def default_iotc_factory(num_cameras: int) -> WyzeIOTC:
+    iotc = WyzeIOTC(max_num_av_channels=num_cameras)
+    iotc.initialize()
+    return iotc
+
+
+class RemoteError(Exception):
+    """An error a worker's listener ran into"""
+
+
+class RemoteSession:
+    """Stands in for a WyzeIOTCSession living in a worker process"""
+
+    def __init__(self) -> None:
+        self.state: WyzeIOTCSessionState = WyzeIOTCSessionState.DISCONNECTED
+        self.session_info: Optional[types.SimpleNamespace] = None
+
+    def session_check(self) -> types.SimpleNamespace:
+        """The session info the worker saw when the camera connected"""
+        if self.session_info is None:
+            raise AssertionError("Not connected")
+        return self.session_info
+
+
+class RemoteVideoListener(WyzeIOTCVideoListener):
+    """
+    The main process' side of a camera whose listener runs in a worker.
+
+    Frames are read out of the camera's ring and published to a local
+    fanout (with its own GOP cache), exactly like a local listener would.
+    Subscriber demand, and the quality it asks for, is forwarded to the
+    worker, which pauses, resumes and switches the camera's quality.
+    """
+
+    def __init__(
+        self,
+        camera: WyzeCamera,
+        shard: "ListenerShard",
+        ring: FrameRing,
+        wakeup: Any,
+        max_queue_size: int = 60,
+        drop_policy: DropPolicy = DropPolicy.DROP_UNTIL_KEYFRAME,
+        gop_cache_max_frames: int = 300,
+        default_quality: StreamQuality = StreamQuality.HD,
+    ) -> None:
+        super(RemoteVideoListener, self).__init__(
+            RemoteSession(),  # type: ignore
+            camera,
+            max_queue_size=max_queue_size,
+            drop_policy=drop_policy,
+            gop_cache_max_frames=gop_cache_max_frames,
+            # the worker pauses idle cameras
+            pause_after_idle_seconds=None,
+            default_quality=default_quality,
+        )
+        self.mac: str = camera.mac.lower()
+        self.shard: ListenerShard = shard
+        self.ring: FrameRing = ring
+        self.wakeup = wakeup
+        self.exited: threading.Event = threading.Event()
+        self._demand: Optional[Tuple[bool, Optional[StreamQuality]]] = None
+
+    def run(self) -> None:
+        reader = FrameRingReader(self.ring)
+        dropped = 0
+        wait_for_keyframe = False
+        while not self.exited.is_set():
+            if not self.wakeup.acquire(timeout=POLL_INTERVAL):
+                continue
+            for data in reader.read_all():
+                if reader.dropped != dropped:
+                    # lapped by the worker; resume on a keyframe
+                    dropped = reader.dropped
+                    wait_for_keyframe = True
+                    self.fanout.clear_cache()
+                if not self.streaming_quality.matches_frame_size(
+                    data[1].frame_size
+                ):
+                    # sent before the worker switched to the new quality
+                    wait_for_keyframe = True
+                    continue
+                if wait_for_keyframe:
+                    if not data[1].is_keyframe:
+                        continue
+                    wait_for_keyframe = False
+                self._record_frame(data)
+                publish_started = tracer.begin()
+                self.fanout.publish(data)
+                if self.event_buffer is not None:
+                    self.event_buffer.add(data)
+                tracer.end("publish", publish_started)
+        # the worker's listener is gone, so nothing writes to the ring
+        self.shard.close_ring(self.mac)
+
+    def apply_report(self, report: Dict[str, Any]) -> None:
+        """Mirrors the state of the worker's listener"""
+        state = WyzeIOTCVideoListenerState(report["state"])
+        self.error = RemoteError(report["error"]) if report["error"] else None
+        self.reconnects = report["reconnects"]
+        self.connect_wait = report["connect_wait"]
+        self.connect_duration = report["connect_duration"]
+        if report["frame_info"] is not None:
+            info_type, info = report["frame_info"]
+            self.example_frame_info = FRAME_INFO_TYPES[
+                info_type
+            ].from_buffer_copy(info)
+        session: RemoteSession = self.session  # type: ignore
+        session.state = WyzeIOTCSessionState(report["session_state"])
+        if report["session_info"] is not None:
+            mode, remote_ip = report["session_info"]
+            session.session_info = types.SimpleNamespace(
+                mode=mode, remote_ip=remote_ip
+            )
+        elif state <= WyzeIOTCVideoListenerState.CONNECTING:
+            session.session_info = None
+        self.state = state
+
+    def _send_demand(self) -> None:
+        with self.demand_lock:
+            active = bool(self.fanout) or self.event_buffer is not None
+            quality = self.requested_quality if active else None
+            if (active, quality) == self._demand:
+                return
+            self._demand = (active, quality)
+            if quality is not None:
+                self.streaming_quality = quality
+            self.shard.send(
+                "demand", self.mac, active, quality.value if quality else None
+            )
+
+    def _resume(self) -> None:
+        self._send_demand()
+
+    def _schedule_idle_pause(self) -> None:
+        self._send_demand()
+
+    def subscribe(
+        self,
+        subscriber_id: int,
+        callback: Callable[..., None],
+        quality: Optional[StreamQuality] = None,
+        frame_filter: Optional[FrameFilter] = None,
+        pack_burst: bool = False,
+    ) -> None:
+        super(RemoteVideoListener, self).subscribe(
+            subscriber_id,
+            callback,
+            quality=quality,
+            frame_filter=frame_filter,
+            pack_burst=pack_burst,
+        )
+        # a new subscriber may raise the quality the camera streams at
+        self._send_demand()
+
+    def unsubscribe(self, subscriber_id: int) -> None:
+        super(RemoteVideoListener, self).unsubscribe(subscriber_id)
+        self._send_demand()
+
+    def disconnect(self) -> None:
+        self.shard.send("disconnect", self.mac)
+
+
+class ListenerShard:
+    """
+    A worker process running the listeners of a group of cameras, and the
+    RemoteVideoListeners standing in for them in this process.
+
+    Up to `max_cameras` cameras can be added to a running worker (see
+    add_camera()): its AV channels, and the semaphores waking up readers of
+    its cameras' rings, are set aside when the process is spawned, as
+    semaphores can't be handed over later.  The worker exits once all its
+    cameras have been removed.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        account: WyzeAccount,
+        cameras: List[WyzeCamera],
+        iotc_factory: IotcFactory = default_iotc_factory,
+        ring_bytes: int = 8 * 1024 * 1024,
+        max_queue_size: int = 60,
+        drop_policy: DropPolicy = DropPolicy.DROP_UNTIL_KEYFRAME,
+        gop_cache_max_frames: int = 300,
+        pause_after_idle_seconds: Optional[float] = 30.0,
+        max_concurrent_connects: Optional[int] = 8,
+        default_quality: StreamQuality = StreamQuality.HD,
+        reconnect_base_delay: float = 1.0,
+        reconnect_max_delay: float = 128.0,
+        max_cameras: Optional[int] = None,
+    ) -> None:
+        # GLib and TUTK threads don't survive a fork()
+        context = multiprocessing.get_context("spawn")
+        self.max_cameras: int = max(max_cameras or 0, len(cameras))
+        self.cameras: List[WyzeCamera] = list(cameras)
+        self.ring_bytes: int = ring_bytes
+        self.rings: Dict[str, FrameRing] = {}
+        # a camera's ring is woken up by the semaphore of its slot
+        self.wakeups: List[Any] = [
+            context.Semaphore(0) for _ in range(self.max_cameras)
+        ]
+        self.slots: Dict[str, int] = {}
+        self._free_slots: List[int] = list(range(self.max_cameras))
+        self._rings_lock = threading.Lock()
+        self.conn, child_conn = context.Pipe()
+        self._send_lock = threading.Lock()
+        self._remote_listener_kwargs: Dict[str, Any] = dict(
+            max_queue_size=max_queue_size,
+            drop_policy=drop_policy,
+            gop_cache_max_frames=gop_cache_max_frames,
+            default_quality=default_quality,
+        )
+        # as of the worker's last report
+        self.reconnect_stats: Optional[ReconnectStats] = None
+        self.listeners: Dict[str, RemoteVideoListener] = {}
+        for camera in cameras:
+            self._add_remote_listener(camera)
+        self.process = context.Process(
+            target=run_shard,
+            args=(
+                child_conn,
+                account,
+                cameras,
+                iotc_factory,
+                self.max_cameras,
+                {mac: ring.name for mac, ring in self.rings.items()},
+                dict(self.slots),
+                self.wakeups,
+                dict(
+                    max_queue_size=max_queue_size,
+                    drop_policy=drop_policy,
+                    # the main process keeps the GOP cache
+                    gop_cache_max_frames=0,
+                    pause_after_idle_seconds=pause_after_idle_seconds,
+                    default_quality=default_quality,
+                ),
+                dict(
+                    max_concurrent=max_concurrent_connects,
+                    base_delay=reconnect_base_delay,
+                    max_delay=reconnect_max_delay,
+                ),
+            ),
+            name=f"listener-shard-{index}",
+            daemon=True,
+        )
+        self._child_conn: Optional[Connection] = child_conn
+        self.events_thread = threading.Thread(
+            target=self._receive_events,
+            name=f"listener-shard-{index}-events",
+            daemon=True,
+        )
+
+    @property
+    def has_room(self) -> bool:
+        with self._rings_lock:
+            return bool(self._free_slots)
+
+    def _add_remote_listener(self, camera: WyzeCamera) -> RemoteVideoListener:
+        mac = camera.mac.lower()
+        with self._rings_lock:
+            if mac in self.listeners:
+                raise ValueError(f"Camera {camera.mac} is already added")
+            if not self._free_slots:
+                raise ValueError(f"{self.max_cameras} cameras already added")
+            slot = self._free_slots.pop(0)
+            self.slots[mac] = slot
+            ring = FrameRing.create(self.ring_bytes)
+            self.rings[mac] = ring
+            listener = RemoteVideoListener(
+                camera,
+                self,
+                ring,
+                self.wakeups[slot],
+                **self._remote_listener_kwargs,
+            )
+            self.listeners[mac] = listener
+        return listener
+
+    def add_camera(self, camera: WyzeCamera) -> RemoteVideoListener:
+        """
+        Has the worker (started or not) listen to another camera; the
+        RemoteVideoListener is started by the caller, like the others.
+        """
+        listener = self._add_remote_listener(camera)
+        self.cameras = self.cameras + [camera]
+        mac = camera.mac.lower()
+        self.send("add", mac, camera, self.rings[mac].name, self.slots[mac])
+        return listener
+
+    def remove_camera(self, mac: str) -> None:
+        """
+        Disconnects a camera.  Its ring and slot are freed once the worker
+        reports that its listener exited.
+        """
+        self.cameras = [c for c in self.cameras if c.mac.lower() != mac]
+        self.listeners[mac].disconnect()
+        if self._child_conn is not None:
+            # never started, so nothing will report the listener exiting
+            self.close_ring(mac)
+
+    def start(self) -> None:
+        self.process.start()
+        if self._child_conn is not None:
+            self._child_conn.close()
+            self._child_conn = None
+        self.events_thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self.events_thread.join(timeout)
+
+    def send(self, *message: Any) -> None:
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                # the worker is gone; _receive_events cleans up
+                pass
+
+    def close_ring(self, mac: str) -> None:
+        """
+        Closes and unlinks a camera's ring once its listener has exited, and
+        frees its slot for another camera
+        """
+        with self._rings_lock:
+            ring = self.rings.pop(mac, None)
+            if ring is None:
+                return
+            self.listeners.pop(mac, None)
+            self._free_slots.append(self.slots.pop(mac))
+        ring.close()
+        ring.unlink()
+
+    def _receive_events(self) -> None:
+        while True:
+            try:
+                kind, mac, *args = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            listener = self.listeners.get(mac)
+            if listener is None:
+                continue
+            if kind == "listener":
+                listener.apply_report(args[0])
+                self.reconnect_stats = args[0]["reconnect_stats"]
+            elif kind == "exited":
+                listener.exited.set()
+
+        self.process.join()
+        for listener in list(self.listeners.values()):
+            if listener.state not in [
+                WyzeIOTCVideoListenerState.DISCONNECTED,
+                WyzeIOTCVideoListenerState.FATAL_ERROR,
+            ]:
+                listener.error = RemoteError(
+                    f"{self.process.name} exited with {self.process.exitcode}"
+                )
+                listener.state = WyzeIOTCVideoListenerState.FATAL_ERROR
+            listener.exited.set()
+            if listener.is_alive():
+                listener.join()
+        # those of listeners that never ran
+        for mac in list(self.rings):
+            self.close_ring(mac)
+
+
+def _report(
+    send: Callable[..., None],
+    scheduler: ReconnectScheduler,
+    listener: WyzeIOTCVideoListener,
+    new_state: WyzeIOTCVideoListenerState,
+) -> None:
+    session_info = None
+    if (
+        WyzeIOTCVideoListenerState.CONNECTED
+        <= new_state
+        <= WyzeIOTCVideoListenerState.PAUSED
+    ):
+        try:
+            info = listener.session.session_check()
+            session_info = (info.mode, bytes(info.remote_ip))
+        except (tutk.TutkError, AssertionError):
+            pass
+    frame_info = listener.example_frame_info
+    send(
+        "listener",
+        listener.camera.mac.lower(),
+        {
+            "state": new_state.value,
+            "error": repr(listener.error) if listener.error else None,
+            "reconnects": listener.reconnects,
+            "connect_wait": listener.connect_wait,
+            "connect_duration": listener.connect_duration,
+            "frame_info": None
+            if frame_info is None
+            else (
+                3 if isinstance(frame_info, FrameInfo3Struct) else 1,
+                bytes(frame_info),  # type: ignore
+            ),
+            "session_state": listener.session.state.value,
+            "session_info": session_info,
+            "reconnect_stats": scheduler.stats(),
+        },
+    )
+
+
+def _write_to_ring(
+    ring: FrameRing,
+    wakeup: Any,
+    listener: WyzeIOTCVideoListener,
+    data: VideoFrame,
+) -> None:
+    try:
+        ring.write(data)
+    except FrameRingError as e:
+        warnings.warn(f"Dropped a frame from {listener.camera.mac}: {e}")
+        return
+    wakeup.release()
+
+
+def run_shard(
+    conn: Connection,
+    account: WyzeAccount,
+    cameras: List[WyzeCamera],
+    iotc_factory: IotcFactory,
+    max_cameras: int,
+    ring_names: Dict[str, str],
+    slots: Dict[str, int],
+    wakeups: List[Any],
+    listener_kwargs: Dict[str, Any],
+    scheduler_kwargs: Dict[str, Any],
+) -> None:
+    """The worker process' main function"""
+    send_lock = threading.Lock()
+
+    def send(*message: Any) -> None:
+        with send_lock:
+            try:
+                conn.send(message)
+            except (BrokenPipeError, OSError):
+                pass
+
+    iotc = iotc_factory(max_cameras)
+    scheduler = ReconnectScheduler(**scheduler_kwargs)
+    rings: Dict[str, FrameRing] = {}
+    camera_wakeups: Dict[str, Any] = {}
+    listeners: Dict[str, WyzeIOTCVideoListener] = {}
+
+    def add(camera: WyzeCamera, ring_name: str, slot: int) -> None:
+        mac = camera.mac.lower()
+        rings[mac] = FrameRing.attach(ring_name)
+        camera_wakeups[mac] = wakeups[slot]
+        listener = WyzeIOTCVideoListener(
+            iotc.connect_and_auth(account, camera),
+            camera,
+            reconnect_scheduler=scheduler,
+            **listener_kwargs,
+        )
+        listener.add_state_change_listener(
+            functools.partial(_report, send, scheduler)
+        )
+        listeners[mac] = listener
+
+    for camera in cameras:
+        add(camera, ring_names[camera.mac.lower()], slots[camera.mac.lower()])
+    for listener in listeners.values():
+        listener.start()
+
+    exited = set()
+    orphaned = False
+    while len(exited) < len(listeners):
+        for mac, listener in listeners.items():
+            if mac not in exited and not listener.is_alive():
+                exited.add(mac)
+                # the main process unlinks the ring once told
+                subscriber = listener.fanout.unsubscribe(RING_SUBSCRIBER_ID)
+                if subscriber is not None:
+                    subscriber.join()
+                rings.pop(mac).close()
+                send("exited", mac)
+        if orphaned:
+            time.sleep(POLL_INTERVAL)
+            continue
+        try:
+            if not conn.poll(POLL_INTERVAL):
+                continue
+            command, mac, *args = conn.recv()
+        except (EOFError, OSError):
+            # the main process went away; wind down
+            orphaned = True
+            for listener in listeners.values():
+                listener.disconnect()
+            continue
+
+        if command == "add":
+            camera, ring_name, slot = args
+            add(camera, ring_name, slot)
+            # the camera may have been here before
+            exited.discard(mac)
+            listeners[mac].start()
+            continue
+        if mac in exited:
+            continue
+
+        listener = listeners[mac]
+        if command == "demand":
+            active, quality = args
+            if not active:
+                if RING_SUBSCRIBER_ID in listener.fanout:
+                    listener.unsubscribe(RING_SUBSCRIBER_ID)
+            elif RING_SUBSCRIBER_ID in listener.fanout:
+                listener.set_subscriber_quality(
+                    RING_SUBSCRIBER_ID, StreamQuality(quality)
+                )
+            else:
+                listener.subscribe(
+                    RING_SUBSCRIBER_ID,
+                    functools.partial(
+                        _write_to_ring, rings[mac], camera_wakeups[mac]
+                    ),
+                    quality=StreamQuality(quality),
+                )
+        elif command == "disconnect":
+            listener.disconnect()
+
+    iotc.deinitialize()
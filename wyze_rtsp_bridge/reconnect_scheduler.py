@@ -0,0 +1,205 @@
+"""
+Paces the connection attempts of a mux's cameras, so that after a network
+blip they don't all retry at once, fail together, and retry in lockstep:
+
+- a retry waits a random delay between 0 and the exponential backoff
+  ("full jitter"), which spreads the cameras' retries out;
+- at most `max_concurrent` attempts run at a time, an attempt lasting
+  from connecting until the camera's first frame;
+- cameras with subscribers are given free slots before those without,
+  and otherwise cameras get them in the order they asked.
+"""
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+import random
+import threading
+import time
+
+from wyze_rtsp_bridge.metrics import Histogram
+
+SLOT_WAIT_BUCKETS: Tuple[float, ...] = (
+    0.01,
+    0.1,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+"""Histogram buckets for the time spent waiting for a connection slot"""
+
+MAX_DOUBLINGS = 32
+"""Past this many failures, the backoff stops growing (max_delay caps it anyway)"""
+
+
+class ReconnectStats(NamedTuple):
+    waiting: int
+    """Attempts waiting for a slot"""
+
+    in_flight: int
+    """Attempts holding a slot"""
+
+    attempts: int
+    """Attempts given a slot"""
+
+    priority_attempts: int
+    """Attempts given a slot ahead of others because the camera had subscribers"""
+
+    retries: int
+    """Retries scheduled after a failed or dropped connection"""
+
+    slot_wait_counts: Tuple[int, ...]
+    slot_wait_sum: float
+
+
+class _Waiter:
+    def __init__(self, has_priority: Callable[[], bool]) -> None:
+        self.has_priority = has_priority
+        self.asked_at: float = time.monotonic()
+        self.granted = False
+
+
+class ReconnectScheduler:
+    """
+    Shared by all the listeners of a mux (or of a worker process); see
+    ConnectSlot for how listeners take a slot.  `max_concurrent` of None
+    lets any number of attempts run at once.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 128.0,
+        uniform: Callable[[float, float], float] = random.uniform,
+    ) -> None:
+        self.max_concurrent: Optional[int] = max_concurrent
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.uniform = uniform
+        self.waiting: List[_Waiter] = []
+        self.in_flight: int = 0
+        self.attempts: int = 0
+        self.priority_attempts: int = 0
+        self.retries: int = 0
+        self.slot_wait: Histogram = Histogram(SLOT_WAIT_BUCKETS)
+        self._cond = threading.Condition()
+
+    def backoff(self, failures: int) -> float:
+        """How long to wait before retrying after `failures` failures"""
+        doublings = min(failures, MAX_DOUBLINGS)
+        return self.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** doublings)
+        )
+
+    def wait_to_retry(
+        self, failures: int, wait: Callable[[float], object]
+    ) -> None:
+        """Calls `wait` (which may return early) with the backoff to wait"""
+        with self._cond:
+            self.retries += 1
+        wait(self.backoff(failures))
+
+    def acquire(
+        self,
+        has_priority: Callable[[], bool] = lambda: False,
+        cancelled: Callable[[], bool] = lambda: False,
+    ) -> bool:
+        """
+        Blocks until given a slot; returns False, without one, if
+        `cancelled()` became true meanwhile.  Waiting attempts only look at
+        `cancelled()` again when woken up, so whatever cancels them must
+        call wake().
+        """
+        waiter = _Waiter(has_priority)
+        with self._cond:
+            self.waiting.append(waiter)
+            self._grant()
+            while not waiter.granted:
+                if cancelled():
+                    self.waiting.remove(waiter)
+                    return False
+                self._cond.wait()
+        return True
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._grant()
+
+    def wake(self) -> None:
+        """
+        Has waiting attempts look again at whether they were cancelled, and
+        at which of them has priority
+        """
+        with self._cond:
+            self._grant()
+            self._cond.notify_all()
+
+    def _grant(self) -> None:
+        # slots are handed over here, rather than taken by the waiters as
+        # they wake up, so that stats() is up to date as soon as a slot is
+        # released
+        granted = False
+        while self.waiting and (
+            self.max_concurrent is None or self.in_flight < self.max_concurrent
+        ):
+            # priority is looked at now, as subscribers come and go
+            ranked = sorted(
+                enumerate(self.waiting),
+                key=lambda w: (not w[1].has_priority(), w[0]),
+            )
+            index, waiter = ranked[0]
+            if index != 0:
+                self.priority_attempts += 1
+            del self.waiting[index]
+            waiter.granted = True
+            self.in_flight += 1
+            self.attempts += 1
+            self.slot_wait.observe(time.monotonic() - waiter.asked_at)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self) -> ReconnectStats:
+        with self._cond:
+            return ReconnectStats(
+                waiting=len(self.waiting),
+                in_flight=self.in_flight,
+                attempts=self.attempts,
+                priority_attempts=self.priority_attempts,
+                retries=self.retries,
+                slot_wait_counts=tuple(self.slot_wait.counts),
+                slot_wait_sum=self.slot_wait.sum,
+            )
+
+
+def merge_stats(stats: Iterable[ReconnectStats]) -> Optional[ReconnectStats]:
+    """Adds up the stats of several schedulers (e.g. one per worker)"""
+    merged: Optional[ReconnectStats] = None
+    for s in stats:
+        if merged is None:
+            merged = s
+            continue
+        merged = ReconnectStats(
+            waiting=merged.waiting + s.waiting,
+            in_flight=merged.in_flight + s.in_flight,
+            attempts=merged.attempts + s.attempts,
+            priority_attempts=merged.priority_attempts + s.priority_attempts,
+            retries=merged.retries + s.retries,
+            slot_wait_counts=tuple(
+                a + b
+                for a, b in zip(merged.slot_wait_counts, s.slot_wait_counts)
+            ),
+            slot_wait_sum=merged.slot_wait_sum + s.slot_wait_sum,
+        )
+    return merged
+
+
+def slot_wait_histogram(stats: ReconnectStats) -> Histogram:
+    histogram = Histogram(SLOT_WAIT_BUCKETS)
+    histogram.counts = list(stats.slot_wait_counts)
+    histogram.sum = stats.slot_wait_sum
+    return histogram
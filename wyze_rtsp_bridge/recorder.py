@@ -0,0 +1,241 @@
+import typing
+from typing import BinaryIO, List, Optional, Tuple
+
+import os
+import pathlib
+import threading
+import time
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.mpegts import TsMuxer, stream_type_for
+from wyze_rtsp_bridge.stream_quality import StreamQuality
+
+if typing.TYPE_CHECKING:
+    from wyze_rtsp_bridge.iotc_video_mux import (
+        WyzeIOTCVideoListener,
+        WyzeIOTCVideoMux,
+    )
+
+RECORDER_SUBSCRIBER_ID = -1
+"""The mux subscriber id of a camera's recorder (rtsp clients count up from 0)"""
+
+SEGMENT_SUFFIX = ".ts"
+
+
+class SegmentRecorder:
+    """
+    Records a camera's stream to disk as it comes off the camera, as a
+    series of MPEG-TS segments of (at least) `segment_seconds` each.
+
+    Segments are only ever cut on a keyframe, so each one can be played
+    on its own, and are named after the camera's timestamp of their first
+    frame: <directory>/<mac>/<YYYYmmdd-HHMMSS>.ts (in UTC).  Existing
+    recordings are never overwritten: a segment whose name is taken (say,
+    after the camera's clock stepped back) gets a -2, -3, ... suffix.
+
+    Writes go through a `write_buffer_bytes` buffer, and are only fsync()ed
+    every `fsync_interval_seconds` (and when a segment is closed), so that
+    recording a camera costs a handful of write()s a second.  Each time a
+    segment is closed, the camera's oldest segments are deleted until its
+    recordings fit within `max_bytes` and `max_age_seconds`.
+    """
+
+    def __init__(
+        self,
+        mac: str,
+        directory: pathlib.Path,
+        segment_seconds: float = 60.0,
+        max_bytes: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+        fsync_interval_seconds: float = 10.0,
+        write_buffer_bytes: int = 1_048_576,
+    ) -> None:
+        self.mac: str = mac.lower()
+        self.directory: pathlib.Path = (
+            pathlib.Path(directory).expanduser() / self.mac
+        )
+        self.segment_seconds: float = segment_seconds
+        self.max_bytes: Optional[int] = max_bytes
+        self.max_age_seconds: Optional[float] = max_age_seconds
+        self.fsync_interval_seconds: float = fsync_interval_seconds
+        self.write_buffer_bytes: int = write_buffer_bytes
+        self.segment_path: Optional[pathlib.Path] = None
+        self.segments_written: int = 0
+        self.bytes_written: int = 0
+        self.error: Optional[Exception] = None
+        self._file: Optional[BinaryIO] = None
+        self._muxer: Optional[TsMuxer] = None
+        self._segment_started_ms: int = 0
+        self._synced_at: float = 0.0
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        mux: "WyzeIOTCVideoMux",
+        quality: Optional[StreamQuality] = None,
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        mux.subscribe(
+            self.mac, RECORDER_SUBSCRIBER_ID, self.on_frame, quality=quality
+        )
+
+    def stop(self, mux: "WyzeIOTCVideoMux") -> None:
+        if mux.is_subscribed(self.mac, RECORDER_SUBSCRIBER_ID):
+            mux.unsubscribe(self.mac, RECORDER_SUBSCRIBER_ID)
+        self.close()
+
+    def on_frame(
+        self, listener: "WyzeIOTCVideoListener", data: VideoFrame
+    ) -> None:
+        try:
+            self.write(data)
+        except OSError as e:
+            # e.g. the disk filled up; give up on this segment, and try
+            # again with a new one on the next keyframe
+            self.error = e
+            print(f"Recording {self.mac} failed: {e!r}")
+            with self._lock:
+                self._abandon_segment()
+
+    def write(self, data: VideoFrame) -> None:
+        frame, frame_info = data
+        timestamp_ms = frame_timestamp_ms(frame_info)
+        stream_type = stream_type_for(frame_info.codec_id)
+        if stream_type is None:
+            return
+
+        with self._lock:
+            elapsed_ms = timestamp_ms - self._segment_started_ms
+            muxer = self._muxer
+            if frame_info.is_keyframe and (
+                self._file is None
+                or muxer is None
+                or elapsed_ms >= self.segment_seconds * 1000
+                # the camera's clock stepped back
+                or elapsed_ms < 0
+                or stream_type != muxer.stream_type
+            ):
+                self._close_segment()
+                self._open_segment(timestamp_ms, stream_type)
+            if self._file is None or self._muxer is None:
+                # waiting for the first keyframe
+                return
+
+            packets = self._muxer.mux(
+                frame, timestamp_ms * 90, bool(frame_info.is_keyframe)
+            )
+            self._file.write(packets)
+            self.bytes_written += len(packets)
+
+            now = time.monotonic()
+            if now - self._synced_at >= self.fsync_interval_seconds:
+                self._sync()
+                self._synced_at = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+
+    def _open_segment(self, timestamp_ms: int, stream_type: int) -> None:
+        name = time.strftime("%Y%m%d-%H%M%S", time.gmtime(timestamp_ms // 1000))
+        self.segment_path = self.directory / f"{name}{SEGMENT_SUFFIX}"
+        sequence = 1
+        while True:
+            try:
+                self._file = typing.cast(
+                    BinaryIO,
+                    open(
+                        self.segment_path,
+                        "xb",
+                        buffering=self.write_buffer_bytes,
+                    ),
+                )
+                break
+            except FileExistsError:
+                sequence += 1
+                self.segment_path = (
+                    self.directory / f"{name}-{sequence}{SEGMENT_SUFFIX}"
+                )
+        self._muxer = TsMuxer(stream_type)
+        self._segment_started_ms = timestamp_ms
+        self._synced_at = time.monotonic()
+
+    def _sync(self) -> None:
+        assert self._file is not None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close_segment(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._sync()
+        finally:
+            self._file.close()
+            self._file = None
+            self.segments_written += 1
+        self._enforce_retention()
+
+    def _abandon_segment(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def segments(self) -> List[pathlib.Path]:
+        """This camera's segments on disk, oldest first"""
+        return sorted(
+            self.directory.glob(f"*{SEGMENT_SUFFIX}"), key=_segment_order
+        )
+
+    def enforce_retention(self) -> None:
+        with self._lock:
+            self._enforce_retention()
+
+    def _enforce_retention(self) -> None:
+        if self.max_bytes is None and self.max_age_seconds is None:
+            return
+
+        segments = []
+        for path in self.segments():
+            if path == self.segment_path and self._file is not None:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            segments.append((path, stat.st_size, stat.st_mtime))
+
+        total = sum(size for _, size, _ in segments)
+        if self._file is not None:
+            total += self._file.tell()
+        now = time.time()
+        for path, size, mtime in segments:
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            too_old = (
+                self.max_age_seconds is not None
+                and now - mtime > self.max_age_seconds
+            )
+            if not too_big and not too_old:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _segment_order(path: pathlib.Path) -> Tuple[str, int]:
+    # <YYYYmmdd-HHMMSS>-2.ts comes after <YYYYmmdd-HHMMSS>.ts, and -10 after -9
+    name, sequence = path.stem, 1
+    if name.count("-") == 2:
+        name, suffix = name.rsplit("-", 1)
+        if suffix.isdigit():
+            sequence = int(suffix)
+        else:
+            name = path.stem
+    return name, sequence
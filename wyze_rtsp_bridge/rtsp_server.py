@@ -1,29 +1,66 @@
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 
+import json
 import signal
 import sys
+import threading
 import time
 import traceback
 
 import wyzecam
 from rich.errors import LiveError
 from rich.live import Live
-from rich.table import Table
 from wyze_rtsp_bridge import config
-from wyze_rtsp_bridge.db import db
+from wyze_rtsp_bridge.camera_list import (
+    CameraListChange,
+    diff_cameras,
+    select_cameras,
+)
+from wyze_rtsp_bridge.camera_status import CameraStatusBoard
+from wyze_rtsp_bridge.db import db, models
 from wyze_rtsp_bridge.db.db import WyzeRtspDatabase
-from wyze_rtsp_bridge.iotc_video_mux import WyzeIOTCVideoMux
+from wyze_rtsp_bridge.frame_filter import KEYFRAMES_PATH
+from wyze_rtsp_bridge.hls import HlsServer
+from wyze_rtsp_bridge.http_server import HttpRequest, HttpResponse, HttpServer
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListenerState,
+    WyzeIOTCVideoMux,
+)
+from wyze_rtsp_bridge.metrics import CONTENT_TYPE, MetricsWriter
+from wyze_rtsp_bridge.recorder import SegmentRecorder
 from wyze_rtsp_bridge.rtsp_server_media_factory import WyzeCameraMediaFactory
+from wyze_rtsp_bridge.shm_export import ShmExporter
+from wyze_rtsp_bridge.snapshot import SnapshotServer
+from wyze_rtsp_bridge.stream_quality import StreamQuality
+from wyze_rtsp_bridge.tracing import tracer
 from wyzecam import api, api_models
 from wyzecam.iotc import WyzeIOTC
-from wyzecam.tutk import tutk
-from wyzecam.tutk.tutk import SInfoStruct
 
 from .glib_init import GstRtspServer, loop
 
+STATUS_REFRESH_INTERVAL = 0.25
+"""How often the camera status table is checked for changes while waiting on cameras"""
+
+RELOAD_CONNECT_TIMEOUT = 30.0
+"""How long a reload waits for added cameras to connect before mounting them anyway"""
+
+
+def camera_mount_paths(mac: str) -> List[str]:
+    """The rtsp mount points of a camera's streams"""
+    path = f"/{mac.lower()}"
+    paths = [path, f"{path}/{KEYFRAMES_PATH}"]
+    for quality in StreamQuality:
+        paths.append(f"{path}/{quality.value}")
+        paths.append(f"{path}/{quality.value}/{KEYFRAMES_PATH}")
+    return paths
+
 
 class GstServer:
-    def __init__(self, conf: config.Config):
+    def __init__(
+        self,
+        conf: config.Config,
+        config_loader: Optional[Callable[[], Optional[config.Config]]] = None,
+    ):
         if (
             conf.wyze_credentials.email == "<REQUIRED>"
             or conf.wyze_credentials.password == "<REQUIRED>"
@@ -37,20 +74,46 @@ class GstServer:
         self.server = GstRtspServer.RTSPServer()
         self.db = WyzeRtspDatabase(conf)
         self.config: config.Config = conf
+        # re-reads the config file (with any command line overrides), for
+        # reload()
+        self.config_loader = config_loader
         self.iotc: Optional[WyzeIOTC] = None
         self.auth_info: Optional[api_models.WyzeCredential] = None
         self.account_info: Optional[api_models.WyzeAccount] = None
+        # every camera on the account, and those of them being served
+        self.all_cameras: List[api_models.WyzeCamera] = []
         self.cameras: List[api_models.WyzeCamera] = []
         self.mux: Optional[WyzeIOTCVideoMux] = None
+        self.status_board: Optional[CameraStatusBoard] = None
+        self.headless: bool = (
+            conf.headless
+            if conf.headless is not None
+            else not sys.stdout.isatty()
+        )
+        self.factory: Optional[WyzeCameraMediaFactory] = None
+        self.http_server: Optional[HttpServer] = None
+        self.hls_server: Optional[HlsServer] = None
+        self.snapshot_server: Optional[SnapshotServer] = None
+        self.recorders: List[SegmentRecorder] = []
+        self.shm_exporters: List[ShmExporter] = []
         self.is_shutting_down = False
+        # held while starting up, and while applying a new camera list
+        self.reload_lock = threading.Lock()
 
     def startup(self):
-        self.init_db()
-        self.authenticate_with_wyze()
-        self.configure_server()
-        self.init_iotc()
-        self.connect_to_cameras()
-        self.configure_mount_points()
+        with self.reload_lock:
+            self.configure_tracing()
+            self.init_db()
+            self.authenticate_with_wyze()
+            self.configure_server()
+            self.init_iotc()
+            self.connect_to_cameras()
+            self.enable_event_buffers()
+            self.start_recording()
+            self.start_shm_export()
+            self.configure_mount_points()
+            self.start_http_server()
+            self.configure_reload()
 
     def shutdown(self, *args):
         if self.iotc is None:
@@ -63,33 +126,94 @@ class GstServer:
             sys.exit(1)
 
         self.is_shutting_down = True
+        if self.http_server is not None:
+            self.http_server.stop()
+        if self.hls_server is not None:
+            self.hls_server.stop()
+        for recorder in self.recorders:
+            recorder.stop(self.mux)
+        for exporter in self.shm_exporters:
+            exporter.stop(self.mux)
         self.mux.stop(block=False)
         while self.mux.is_any_connected():
             try:
-                with Live(
-                    self.camera_statuses(title="Shutting down"),
-                    refresh_per_second=4,
-                ) as live:
-                    while self.mux.is_any_connected():
-                        time.sleep(0.25)
-                        live.update(self.camera_statuses(title="Shutting down"))
+                self.wait_showing_statuses(
+                    self.mux.wait_for_all_disconnected, title="Shutting down"
+                )
             except LiveError:
                 pass
 
-        self.iotc.deinitialize()
+        # lets worker processes exit and their shared memory be unlinked
+        self.mux.stop(block=True)
+        if self.iotc.initd:
+            self.iotc.deinitialize()
         loop.quit()
         sys.exit(0)
 
+    def configure_tracing(self):
+        tracer.resize(self.config.tracing.ring_size)
+        tracer.enabled = self.config.tracing.enabled
+        signal.signal(signal.SIGUSR1, self.toggle_tracing)
+        signal.signal(signal.SIGUSR2, self.dump_trace)
+
+    def toggle_tracing(self, *args):
+        print(f"Tracing {'enabled' if tracer.toggle() else 'disabled'}")
+
+    def dump_trace(self, *args):
+        path = tracer.dump(self.config.tracing.dump_dir)
+        print(f"Wrote {len(tracer.events)} trace events to {path}")
+
     def init_db(self):
         self.db.open()
 
     def authenticate_with_wyze(self):
-        success = True
         self.auth_info = db.get_credentials(self.db)
+
+        cached = self.load_cloud_cache()
+        if cached is not None:
+            account_info, cameras = cached
+            self.account_info = account_info
+            self.cameras = list(cameras)
+            fetched_at = min(
+                [account_info.fetched_at] + [c.fetched_at for c in cameras]
+            )
+            print(
+                f"Using the {len(cameras)} cameras saved at "
+                f"{fetched_at:%Y-%m-%d %H:%M} UTC"
+            )
+            if db.is_stale(fetched_at, self.config.cloud_cache.ttl_seconds):
+                threading.Thread(
+                    target=self.refresh_cloud_cache,
+                    name="wyze-cloud-refresh",
+                    daemon=True,
+                ).start()
+        else:
+            self.account_info, self.cameras = self.fetch_from_wyze()
+
+        self.all_cameras = self.cameras
+        self.cameras = select_cameras(self.all_cameras, self.config.cameras)
+
+    def load_cloud_cache(
+        self,
+    ) -> Optional[Tuple[models.AccountModel, List[models.CameraModel]]]:
+        if not self.config.cloud_cache.enabled or self.auth_info is None:
+            return None
+        account_info = db.get_account(self.db)
+        cameras = db.get_cameras(self.db)
+        if account_info is None or not cameras:
+            return None
+        return account_info, cameras
+
+    def fetch_from_wyze(
+        self,
+    ) -> Tuple[api_models.WyzeAccount, List[api_models.WyzeCamera]]:
+        """Fetches the account info and camera list, logging in if need be"""
+        success = True
+        account_info = None
         # noinspection PyBroadException
         try:
             if self.auth_info:
-                self.account_info = wyzecam.api.get_user_info(self.auth_info)
+                account_info = wyzecam.api.get_user_info(self.auth_info)
             else:
                 success = False
         except Exception:
@@ -102,60 +226,198 @@ class GstServer:
             )
             db.set_credentials(self.db, self.auth_info)
 
-            self.account_info = wyzecam.api.get_user_info(self.auth_info)
+            account_info = wyzecam.api.get_user_info(self.auth_info)
 
         assert self.auth_info is not None
-        self.cameras = api.get_camera_list(self.auth_info)
+        assert account_info is not None
+        cameras = api.get_camera_list(self.auth_info)
+
+        if self.config.cloud_cache.enabled:
+            db.set_account(self.db, account_info)
+            db.set_cameras(self.db, cameras)
+        return account_info, cameras
+
+    def refresh_cloud_cache(self):
+        # noinspection PyBroadException
+        try:
+            _, cameras = self.fetch_from_wyze()
+        except Exception:
+            print("Could not refresh the camera list from the wyze cloud:")
+            traceback.print_exc()
+            return
 
-        if self.config.cameras is not None:
-            self.cameras = [
-                c for c in self.cameras if c.mac in self.config.cameras
+        self.apply_camera_list(cameras, self.config.cameras)
+
+    def configure_reload(self):
+        if self.config.reload.enabled:
+            signal.signal(signal.SIGHUP, self.reload_in_background)
+
+    def reload_in_background(self, *args):
+        threading.Thread(
+            target=self.reload, name="wyze-reload", daemon=True
+        ).start()
+
+    def reload(self) -> CameraListChange:
+        """
+        Re-reads the config file and the account's camera list, and starts
+        (or stops) the cameras added to (or removed from) them; the streams
+        of the other cameras carry on.  Other settings need a restart.
+        """
+        conf = None
+        # noinspection PyBroadException
+        try:
+            if self.config_loader is not None:
+                conf = self.config_loader()
+        except Exception:
+            traceback.print_exc()
+        if conf is None:
+            print("Could not reload the config file; keeping the camera list")
+            macs = self.config.cameras
+        else:
+            changed = [
+                name
+                for name in conf.__fields__
+                if name != "cameras"
+                and getattr(conf, name) != getattr(self.config, name)
             ]
+            if changed:
+                print(f"Changes to {', '.join(changed)} take effect on restart")
+            macs = conf.cameras
+
+        # noinspection PyBroadException
+        try:
+            _, cameras = self.fetch_from_wyze()
+        except Exception:
+            print("Could not refresh the camera list from the wyze cloud:")
+            traceback.print_exc()
+            cameras = self.all_cameras
+        return self.apply_camera_list(cameras, macs)
+
+    def apply_camera_list(
+        self,
+        cameras: List[api_models.WyzeCamera],
+        macs: Optional[List[str]],
+    ) -> CameraListChange:
+        """
+        Serves `cameras` (or those of them in `macs`), adding and removing
+        cameras to get there.
+        """
+        with self.reload_lock:
+            if self.mux is None or self.is_shutting_down:
+                return CameraListChange([], [])
+            self.all_cameras = list(cameras)
+            self.config.cameras = macs
+            change = diff_cameras(
+                self.cameras, select_cameras(self.all_cameras, macs)
+            )
+            for camera in change.removed:
+                self.remove_camera(camera)
+            if change.added:
+                self.add_cameras(change.added)
+            print(
+                f"Reloaded the camera list: {len(change.added)} added, "
+                f"{len(change.removed)} removed"
+            )
+            return change
+
+    def add_cameras(self, cameras: List[api_models.WyzeCamera]):
+        assert self.mux is not None
+        listeners = self.mux.add_cameras(cameras)
+        self.cameras = self.cameras + cameras
+        if self.status_board is not None:
+            for camera in cameras:
+                self.status_board.add_camera(camera)
+        # the media factory describes a stream by the camera's first frame
+        deadline = time.monotonic() + RELOAD_CONNECT_TIMEOUT
+        for listener in listeners:
+            listener.wait_for_state(
+                lambda state: state > WyzeIOTCVideoListenerState.CONNECTING,
+                timeout=max(deadline - time.monotonic(), 0),
+            )
+        self.enable_event_buffers(cameras)
+        self.start_recording(cameras)
+        self.start_shm_export(cameras)
+        self.mount_cameras(cameras)
+
+    def remove_camera(self, camera: api_models.WyzeCamera):
+        assert self.mux is not None
+        mac = camera.mac.lower()
+        m = self.server.get_mount_points()
+        for path in camera_mount_paths(mac):
+            m.remove_factory(path)
+        if self.factory is not None:
+            self.factory.end_streams(mac)
+        for recorder in [r for r in self.recorders if r.mac == mac]:
+            recorder.stop(self.mux)
+            self.recorders.remove(recorder)
+        for exporter in [e for e in self.shm_exporters if e.mac == mac]:
+            exporter.stop(self.mux)
+            self.shm_exporters.remove(exporter)
+        if self.hls_server is not None:
+            self.hls_server.remove_camera(mac)
+        if self.snapshot_server is not None:
+            self.snapshot_server.remove_camera(mac)
+        if self.status_board is not None:
+            self.status_board.remove_camera(mac)
+        self.mux.remove_camera(mac)
+        self.cameras = [c for c in self.cameras if c.mac.lower() != mac]
+        print(f"{camera.nickname}: removed")
 
     def configure_server(self):
         self.server.set_address(self.config.rtsp_server.host)
         self.server.set_service(str(self.config.rtsp_server.port))
 
     def init_iotc(self):
-        self.iotc = WyzeIOTC(max_num_av_channels=len(self.cameras))
-        self.iotc.initialize()
+        spare_av_channels = (
+            self.config.reload.spare_av_channels
+            if self.config.reload.enabled
+            else 0
+        )
+        self.iotc = WyzeIOTC(
+            max_num_av_channels=len(self.cameras) + spare_av_channels
+        )
+        if not self.config.streaming.worker_processes:
+            # otherwise, each worker process initializes its own
+            self.iotc.initialize()
 
         signal.signal(signal.SIGINT, self.shutdown)
 
     def camera_statuses(self, title="Connecting to cameras..."):
-        if self.mux is None:
+        if self.status_board is None:
             return
 
-        table = Table()
-        table.title = title
-        table.add_column("Camera MAC")
-        table.add_column("Camera Nickname")
-        table.add_column("Camera P2P Type")
-        table.add_column("Camera IP")
-        table.add_column("Mux Status")
-        table.add_column("Session State")
-        table.add_column("Error")
-
-        for camera in self.cameras:
-            status = self.mux.get_status(camera.mac)
-            listener = self.mux.get_listener(camera.mac)
-            session = listener.session
-            try:
-                session_info: Optional[SInfoStruct] = session.session_check()
-            except (tutk.TutkError, AssertionError):
-                session_info = None
-            table.add_row(
-                f"{camera.mac}",
-                f"{camera.nickname}",
-                f"{camera.p2p_type} : {session_info.mode if session_info else 'n/a'}",
-                f"{session_info.remote_ip.decode('ascii')}"
-                if session_info
-                else f"[{camera.ip}]",
-                f"{status.name}",
-                f"{session.state.name}",
-                f"{listener.error}",
-            )
-        return table
+        self.status_board.refresh()
+        return self.status_board.table(title)
+
+    def wait_showing_statuses(
+        self,
+        wait: Callable[[float], bool],
+        title: str = "Connecting to cameras...",
+    ) -> None:
+        """
+        Calls `wait(timeout)` until it returns True, showing the cameras'
+        statuses meanwhile: as a live table, or in headless mode, by logging
+        each camera's session as it connects (the mux logs state changes).
+        """
+        if self.status_board is None:
+            return
+        board: CameraStatusBoard = self.status_board
+
+        if self.headless:
+
+            def log_session(camera: api_models.WyzeCamera) -> None:
+                print(board.describe_session(camera))
+
+            while not wait(STATUS_REFRESH_INTERVAL):
+                board.refresh(on_session_change=log_session)
+            board.refresh(on_session_change=log_session)
+            return
+
+        board.refresh()
+        with Live(board.table(title), auto_refresh=False) as live:
+            while not wait(STATUS_REFRESH_INTERVAL):
+                if board.refresh():
+                    live.update(board.table(title), refresh=True)
 
     def connect_to_cameras(self):
         if not self.iotc:
@@ -163,29 +425,265 @@ class GstServer:
         if not self.account_info:
             return
 
-        self.mux = WyzeIOTCVideoMux(self.iotc, self.account_info, self.cameras)
+        self.mux = WyzeIOTCVideoMux(
+            self.iotc,
+            self.account_info,
+            self.cameras,
+            max_queue_size=self.config.streaming.max_queue_size,
+            drop_policy=self.config.streaming.drop_policy,
+            gop_cache_max_frames=self.config.streaming.gop_cache_max_frames,
+            pause_after_idle_seconds=self.config.streaming.pause_after_idle_seconds,
+            max_concurrent_connects=self.config.streaming.max_concurrent_connects,
+            reconnect_base_delay=self.config.streaming.reconnect_base_delay_seconds,
+            reconnect_max_delay=self.config.streaming.reconnect_max_delay_seconds,
+            default_quality=self.config.streaming.default_quality,
+            worker_processes=self.config.streaming.worker_processes,
+            shm_ring_bytes=self.config.streaming.shm_ring_bytes,
+            spare_cameras_per_worker=self.config.reload.spare_av_channels
+            if self.config.reload.enabled
+            else 0,
+        )
+        self.status_board = CameraStatusBoard(self.mux, self.cameras)
         self.mux.start()
-        with Live(self.camera_statuses(), refresh_per_second=4) as live:
-            while not self.mux.is_all_connected():
-                time.sleep(0.1)
-                if self.is_shutting_down:
-                    break
-                live.update(self.camera_statuses())
+        self.wait_showing_statuses(
+            lambda timeout: self.mux.wait_for_all_connected(timeout)
+            or self.is_shutting_down
+        )
+        print(self.mux.startup_report())
+
+    def start_recording(
+        self, cameras: Optional[List[api_models.WyzeCamera]] = None
+    ):
+        if not self.mux:
+            return
+        recording = self.config.recording
+        if not recording.enabled:
+            return
+        for camera in self.cameras if cameras is None else cameras:
+            if (
+                recording.cameras is not None
+                and camera.mac not in recording.cameras
+            ):
+                continue
+            recorder = SegmentRecorder(
+                camera.mac,
+                recording.directory,
+                segment_seconds=recording.segment_seconds,
+                max_bytes=recording.max_bytes_per_camera,
+                max_age_seconds=(
+                    recording.max_age_hours * 3600
+                    if recording.max_age_hours is not None
+                    else None
+                ),
+                fsync_interval_seconds=recording.fsync_interval_seconds,
+                write_buffer_bytes=recording.write_buffer_bytes,
+            )
+            recorder.start(self.mux, quality=recording.quality)
+            self.recorders.append(recorder)
+            print(f"{camera.nickname}: recording to {recorder.directory}")
+
+    def start_shm_export(
+        self, cameras: Optional[List[api_models.WyzeCamera]] = None
+    ):
+        if not self.mux:
+            return
+        shm_export = self.config.shm_export
+        if not shm_export.enabled:
+            return
+        for camera in self.cameras if cameras is None else cameras:
+            if (
+                shm_export.cameras is not None
+                and camera.mac not in shm_export.cameras
+            ):
+                continue
+            exporter = ShmExporter(
+                camera.mac,
+                ring_bytes=shm_export.ring_bytes,
+                name_prefix=shm_export.name_prefix,
+            )
+            exporter.start(self.mux, quality=shm_export.quality)
+            self.shm_exporters.append(exporter)
+            print(f"{camera.nickname}: exporting frames to {exporter.name}")
+
+    def enable_event_buffers(
+        self, cameras: Optional[List[api_models.WyzeCamera]] = None
+    ):
+        if not self.mux:
+            return
+        event_buffer = self.config.event_buffer
+        if not event_buffer.enabled:
+            return
+        for camera in self.cameras if cameras is None else cameras:
+            if (
+                event_buffer.cameras is not None
+                and camera.mac not in event_buffer.cameras
+            ):
+                continue
+            self.mux.enable_event_buffer(
+                camera.mac,
+                event_buffer.seconds,
+                event_buffer.max_bytes_per_camera,
+            )
 
     def configure_mount_points(self):
         if not self.iotc:
             return
         if not self.mux:
             return
-        m = self.server.get_mount_points()
-        f = WyzeCameraMediaFactory(self.iotc, self.mux, self.cameras)
+        f = WyzeCameraMediaFactory(
+            self.iotc,
+            self.mux,
+            self.cameras,
+            backpressure=self.config.streaming.backpressure,
+            appsrc_max_bytes=self.config.streaming.appsrc_max_bytes,
+            buffer_pool_size=self.config.streaming.buffer_pool_size,
+            timestamp_mode=self.config.streaming.timestamps,
+        )
         f.set_shared(True)
-        for camera in self.cameras:
+        self.factory = f
+        self.mount_cameras(self.cameras)
+
+    def mount_cameras(self, cameras: List[api_models.WyzeCamera]):
+        if self.factory is None:
+            return
+        m = self.server.get_mount_points()
+        for camera in cameras:
+            for mount_path in camera_mount_paths(camera.mac):
+                m.add_factory(mount_path, self.factory)
             path = f"/{camera.mac.lower()}"
-            m.add_factory(path, f)
             print(
                 f"{camera.nickname}: rtsp://{self.config.rtsp_server.host}:{self.config.rtsp_server.port}{path}"
+                f" (or {path}/hd, {path}/sd, {path}/{KEYFRAMES_PATH}, {path}?fps=1)"
+            )
+
+    def start_http_server(self):
+        if not self.config.http_server.enabled:
+            return
+        self.http_server = HttpServer(
+            self.config.http_server.host, self.config.http_server.port
+        )
+        self.http_server.add_route("/metrics", self.get_metrics)
+        self.http_server.add_route("/trace", self.get_trace)
+        self.http_server.add_route(
+            "/clips", self.post_clip, methods=("POST",), prefix=True
+        )
+        if self.config.reload.enabled:
+            self.http_server.add_route(
+                "/reload", self.post_reload, methods=("POST",)
+            )
+        if self.config.hls.enabled and self.mux is not None:
+            self.hls_server = HlsServer(
+                self.mux,
+                segment_seconds=self.config.hls.segment_seconds,
+                part_seconds=self.config.hls.part_seconds,
+                window_segments=self.config.hls.window_segments,
+                idle_timeout_seconds=self.config.hls.idle_timeout_seconds,
             )
+            self.hls_server.add_routes(self.http_server)
+        if self.config.snapshots.enabled and self.mux is not None:
+            self.snapshot_server = SnapshotServer(
+                self.mux,
+                jpeg_quality=self.config.snapshots.jpeg_quality,
+                keyframe_timeout_seconds=self.config.snapshots.keyframe_timeout_seconds,
+            )
+            self.snapshot_server.add_routes(self.http_server)
+        try:
+            self.http_server.start()
+        except OSError as e:
+            # e.g. the port is taken; the rtsp streams still work without it
+            print(
+                f"Could not start the http server on "
+                f"{self.http_server.host}:{self.http_server.port} ({e}); "
+                f"metrics, HLS, snapshots, clips and /reload are unavailable"
+            )
+            if self.hls_server is not None:
+                self.hls_server.stop()
+            self.http_server = None
+            self.hls_server = None
+            self.snapshot_server = None
+            return
+        url = f"http://{self.http_server.host}:{self.http_server.port}"
+        print(f"Metrics: {url}/metrics")
+        if self.hls_server is not None:
+            print(f"HLS: {url}/hls/<mac>/index.m3u8")
+        if self.snapshot_server is not None:
+            print(f"Snapshots: {url}/snapshot/<mac>.jpg")
+
+    def get_metrics(self, request: HttpRequest) -> HttpResponse:
+        writer = MetricsWriter()
+        if self.mux is not None:
+            self.mux.collect_metrics(writer)
+        if self.factory is not None:
+            self.factory.collect_metrics(writer)
+        if self.snapshot_server is not None:
+            self.snapshot_server.collect_metrics(writer)
+        return HttpResponse(200, writer.render().encode("utf-8"), CONTENT_TYPE)
+
+    def get_trace(self, request: HttpRequest) -> HttpResponse:
+        return HttpResponse(
+            200,
+            json.dumps(tracer.chrome_trace()).encode("utf-8"),
+            "application/json",
+        )
+
+    def post_clip(self, request: HttpRequest) -> HttpResponse:
+        """
+        POST /clips/<mac>?before=30&after=10 writes a clip of the camera's
+        event buffer, from 30s before the request until 10s after it, and
+        responds (once it is written) with where it was written to.
+        """
+        mac = request.path[len("/clips/") :].strip("/").lower()
+        if self.mux is None or mac not in self.mux.listeners:
+            return HttpResponse(404, b"unknown camera\n")
+        if self.mux.get_listener(mac).event_buffer is None:
+            return HttpResponse(404, b"camera has no event buffer\n")
+        try:
+            before = float(request.query.get("before", ["30"])[0])
+            after = float(request.query.get("after", ["10"])[0])
+        except ValueError:
+            return HttpResponse(400, b"before and after must be numbers\n")
+        if (
+            before < 0
+            or not 0 <= after <= self.config.event_buffer.max_after_seconds
+        ):
+            return HttpResponse(400, b"before or after is out of range\n")
+
+        now = time.time()
+        path = (
+            self.config.event_buffer.clip_dir.expanduser()
+            / mac
+            / (
+                f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))}"
+                f"-{int(now * 1000) % 1000:03d}.ts"
+            )
+        )
+        try:
+            clip = self.mux.export_clip(mac, path, before, after)
+        except ValueError as e:
+            return HttpResponse(503, f"{e}\n".encode("utf-8"))
+        body = {
+            "path": str(clip.path),
+            "frames": clip.frames,
+            "start_ms": clip.start_ms,
+            "end_ms": clip.end_ms,
+        }
+        return HttpResponse(
+            200, json.dumps(body).encode("utf-8"), "application/json"
+        )
+
+    def post_reload(self, request: HttpRequest) -> HttpResponse:
+        """
+        POST /reload reloads the config file and camera list (like SIGHUP),
+        and responds with the MACs of the cameras added and removed.
+        """
+        change = self.reload()
+        body = {
+            "added": [c.mac for c in change.added],
+            "removed": [c.mac for c in change.removed],
+        }
+        return HttpResponse(
+            200, json.dumps(body).encode("utf-8"), "application/json"
+        )
 
     def attach_to_main_loop(self):
         self.server.attach(None)
@@ -1,15 +1,27 @@
 import typing
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+import collections
 import ctypes
 import functools
 import random
 import sys
 
+from wyze_rtsp_bridge.clock_recovery import (
+    MILLISECOND,
+    CameraClockRecovery,
+    TimestampMode,
+)
+from wyze_rtsp_bridge.frame_filter import parse_frame_filter
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.gst_buffers import SharedBufferCache
 from wyze_rtsp_bridge.iotc_video_mux import (
     WyzeIOTCVideoListener,
     WyzeIOTCVideoMux,
 )
+from wyze_rtsp_bridge.metrics import MetricsWriter
+from wyze_rtsp_bridge.stream_quality import parse_mount_path
+from wyze_rtsp_bridge.tracing import tracer
 from wyzecam.api_models import WyzeCamera
 from wyzecam.iotc import WyzeIOTC
 from wyzecam.tutk import tutk
@@ -19,42 +31,42 @@ from .glib_init import GObject, Gst, GstApp, GstRtspServer
 
 class WyzeCameraMediaContext(ctypes.Structure):
     _fields_ = [
-        ("timestamp", ctypes.c_int64),
         ("media_info_id", ctypes.c_int64),
         ("mac", ctypes.c_char * 12),
         ("need_data", ctypes.c_bool),
+        ("waiting_for_keyframe", ctypes.c_bool),
+        ("frames_skipped", ctypes.c_int64),
     ]
 
 
 def build_gst_buffer(
     frame: bytes,
-    frame_info: typing.Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct],
-    last_frame_info: typing.Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct],
     ctx: WyzeCameraMediaContext,
-    compute_ts: bool = False,
+    pts: Optional[int] = None,
+    duration: Optional[int] = None,
+    buffers: Optional[SharedBufferCache] = None,
 ) -> Gst.Buffer:
-    buf = Gst.Buffer.new_wrapped(frame)
-    if compute_ts:
-        ts_s = Gst.util_uint64_scale_int(frame_info.timestamp, Gst.SECOND, 1)
-        ts_ms = Gst.util_uint64_scale_int(
-            frame_info.timestamp_ms, Gst.USECOND, 1
-        )
-        l_ts_s = Gst.util_uint64_scale_int(
-            last_frame_info.timestamp, Gst.SECOND, 1
-        )
-        l_ts_ms = Gst.util_uint64_scale_int(
-            last_frame_info.timestamp_ms, Gst.USECOND, 1
-        )
-        timestamp = ts_s + ts_ms
-        last_timestamp = l_ts_s + l_ts_ms
-        duration_calced = timestamp - last_timestamp
-        timestamp = ctx.timestamp
-        ctx.timestamp += duration_calced
-        buf.pts = timestamp
-        buf.duration = duration_calced
+    started = tracer.begin()
+    if buffers is not None:
+        buf = buffers.get(ctx.mac.decode("ascii"), frame)
+    else:
+        buf = Gst.Buffer.new_wrapped(frame)
+    if pts is not None:
+        buf.pts = pts
+    if duration is not None:
+        buf.duration = duration
+    tracer.end("build_gst_buffer", started, category="gst")
     return buf
 
 
+def get_running_time(element: Gst.Element) -> int:
+    """The running time of the pipeline `element` is in, or 0 if it isn't running yet"""
+    clock = element.get_clock()
+    if clock is None:
+        return 0
+    return max(clock.get_time() - element.get_base_time(), 0)
+
+
 def get_frame_size(
     frame_info: typing.Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct]
 ) -> Tuple[int, int]:
@@ -85,16 +97,31 @@ def get_codec(
 
 class WyzeCameraMediaFactory(GstRtspServer.RTSPMediaFactory):
     def __init__(
-        self, iotc: WyzeIOTC, mux: WyzeIOTCVideoMux, cameras: List[WyzeCamera]
+        self,
+        iotc: WyzeIOTC,
+        mux: WyzeIOTCVideoMux,
+        cameras: List[WyzeCamera],
+        backpressure: bool = True,
+        appsrc_max_bytes: int = 2_000_000,
+        buffer_pool_size: int = 0,
+        timestamp_mode: TimestampMode = TimestampMode.CAMERA,
     ):
         GstRtspServer.RTSPMediaFactory.__init__(self)
         self.iotc: WyzeIOTC = iotc
         self.mux = mux
         self.cameras: List[WyzeCamera] = cameras
-        self.last_frame_infos: Dict[
-            str, typing.Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct]
-        ] = {}
-        self.factory_id = random.randint(0, sys.maxsize)
+        self.backpressure: bool = backpressure
+        self.appsrc_max_bytes: int = appsrc_max_bytes
+        self.media_contexts: Dict[int, WyzeCameraMediaContext] = {}
+        # keyed by WyzeCameraMediaContext.media_info_id, for end_streams()
+        self.appsrcs: Dict[int, GstApp.AppSrc] = {}
+        self.buffers: SharedBufferCache = SharedBufferCache(buffer_pool_size)
+        self.timestamp_mode: TimestampMode = timestamp_mode
+        # keyed by WyzeCameraMediaContext.media_info_id; each rtsp media
+        # has its own subscription to the mux, and its own running time
+        self.clocks: Dict[int, CameraClockRecovery] = {}
+        # the results of push-buffer, by Gst.FlowReturn nick
+        self.flow_returns: Dict[int, typing.Counter[str]] = {}
 
     def has_data(
         self,
@@ -105,22 +132,63 @@ class WyzeCameraMediaFactory(GstRtspServer.RTSPMediaFactory):
             bytes, typing.Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct]
         ],
     ) -> None:
-        # TODO: consider ctx.need_data (either throw out frames, or buffer internally?)
+        if self.backpressure and not self.should_send(ctx, data[1]):
+            ctx.frames_skipped += 1
+            return
         self.send_data(appsrc, ctx, data)
 
+    @staticmethod
+    def should_send(
+        ctx: WyzeCameraMediaContext,
+        frame_info: typing.Union[tutk.FrameInfoStruct, tutk.FrameInfo3Struct],
+    ) -> bool:
+        """
+        Once appsrc has signalled enough-data, frames are thrown out until it
+        asks for more with need-data, and then until the next keyframe, so the
+        decoder downstream never sees a frame whose references were dropped.
+        """
+        if not ctx.need_data:
+            if not ctx.waiting_for_keyframe:
+                print(
+                    f"appsrc for {ctx.mac.decode('ascii')} is full; "
+                    f"dropping frames until the next keyframe"
+                )
+            ctx.waiting_for_keyframe = True
+            return False
+        if ctx.waiting_for_keyframe:
+            if not frame_info.is_keyframe:
+                return False
+            ctx.waiting_for_keyframe = False
+        return True
+
     def send_data(self, appsrc, ctx, data):
-        mac = appsrc.mac
+        send_started = tracer.begin()
         frame, frame_info = data
-        last_frame_info = self.last_frame_infos.get(
-            mac
-        ) or self.mux.get_sample_frame_info(mac)
-        assert last_frame_info
-        buf = build_gst_buffer(frame, frame_info, last_frame_info, ctx)
+        pts = duration = None
+        clock = self.clocks.get(ctx.media_info_id)
+        if clock is not None:
+            pts, duration = clock.update(
+                frame_timestamp_ms(frame_info) * MILLISECOND,
+                get_running_time(appsrc),
+            )
+        buf = build_gst_buffer(
+            frame, ctx, pts=pts, duration=duration, buffers=self.buffers
+        )
+        push_started = tracer.begin()
         retval = appsrc.emit("push-buffer", buf)
+        tracer.end("push-buffer", push_started, category="gst")
+        flow_returns = self.flow_returns.get(ctx.media_info_id)
+        if flow_returns is not None:
+            flow_returns[retval.value_nick] += 1
         if retval != Gst.FlowReturn.OK:
             print(f"push returned {retval}, expected {Gst.FlowReturn.OK}")
-
-        self.last_frame_infos[mac] = frame_info
+        tracer.end(
+            "send_data",
+            send_started,
+            args={"subscriber": ctx.media_info_id, "frame": frame_info.frame_no}
+            if tracer.enabled
+            else None,
+        )
 
     def enough_data(self, apprc, ctx):
         ctx.need_data = False
@@ -129,7 +197,13 @@ class WyzeCameraMediaFactory(GstRtspServer.RTSPMediaFactory):
         ctx.need_data = True
 
     def do_create_element(self, url):
-        mac = url.abspath[1:]
+        mac, quality = parse_mount_path(url.abspath)
+        try:
+            # checked here, so a bad ?fps= fails the request
+            parse_frame_filter(url.abspath, url.query)
+        except ValueError as e:
+            print(f"Bad rtsp url {url.abspath}?{url.query}: {e}")
+            return None
 
         frame_info = self.mux.get_sample_frame_info(mac)
         assert frame_info
@@ -140,6 +214,8 @@ class WyzeCameraMediaFactory(GstRtspServer.RTSPMediaFactory):
         launch = Gst.parse_launch(pipeline_str)
         appsrc = launch.get_by_name_recurse_up("mysrc")
         appsrc.mac = mac
+        appsrc.quality = quality
+        appsrc.frame_filter_args = (url.abspath, url.query)
         return launch
 
     def do_media_configure(self, rtsp_media):
@@ -150,28 +226,52 @@ class WyzeCameraMediaFactory(GstRtspServer.RTSPMediaFactory):
         last_frame_info = self.mux.get_sample_frame_info(appsrc.mac)
         assert last_frame_info
 
-        width, height = get_frame_size(last_frame_info)
+        if appsrc.quality is not None:
+            width, height = appsrc.quality.dimensions
+        else:
+            width, height = get_frame_size(last_frame_info)
         framerate = get_frame_rate(last_frame_info)
         codec = get_codec(last_frame_info)
+        filtered = parse_frame_filter(*appsrc.frame_filter_args) is not None
         caps = (
             f"video/x-{codec},"
             f"width={width},height={height},"
-            f"framerate={framerate}/1,"
+            # a filtered stream's frame rate is variable
+            f"framerate={0 if filtered else framerate}/1,"
             f"stream-format=byte-stream,alignment=au"
         )
         appsrc.set_property("caps", Gst.caps_from_string(caps))
         appsrc.set_property("max-latency", 200)
         appsrc.set_property("is-live", True)
-        appsrc.set_property("do-timestamp", True)
+        appsrc.set_property(
+            "do-timestamp", self.timestamp_mode == TimestampMode.ARRIVAL
+        )
+        appsrc.set_property("max-bytes", self.appsrc_max_bytes)
 
         rtsp_media.set_latency(500)
 
         ctx = WyzeCameraMediaContext()
         ctx.media_info_id = random.randint(0, sys.maxsize)
         ctx.mac = appsrc.mac.encode("ascii")
+        ctx.need_data = True
+        self.media_contexts[ctx.media_info_id] = ctx
+        self.appsrcs[ctx.media_info_id] = appsrc
+        self.flow_returns[ctx.media_info_id] = collections.Counter()
+        if self.timestamp_mode == TimestampMode.CAMERA:
+            self.clocks[ctx.media_info_id] = CameraClockRecovery(
+                default_duration_ns=Gst.SECOND // framerate
+            )
 
         callback = functools.partial(self.has_data, appsrc, ctx)
-        self.mux.subscribe(appsrc.mac, self.factory_id, callback)
+        self.mux.subscribe(
+            appsrc.mac,
+            ctx.media_info_id,
+            callback,
+            quality=appsrc.quality,
+            frame_filter=parse_frame_filter(*appsrc.frame_filter_args),
+            # the burst shouldn't hold up the live stream
+            pack_burst=True,
+        )
 
         appsrc.connect("need-data", self.need_data, ctx)
         appsrc.connect("enough-data", self.enough_data, ctx)
@@ -192,13 +292,61 @@ class WyzeCameraMediaFactory(GstRtspServer.RTSPMediaFactory):
         print(
             f"new state: {GObject.enum_to_string(Gst.State, state)} for mac {ctx.mac.decode('ascii')}"
         )
-        if state == 4:
+        mac = ctx.mac.decode("ascii")
+        # the camera may have been removed by a reload; see end_streams()
+        camera_added = mac in self.mux.listeners
+        if state == 4 and camera_added:
             callback = functools.partial(self.has_data, appsrc, ctx)
             self.mux.subscribe(
-                ctx.mac.decode("ascii"), self.factory_id, callback
+                mac,
+                ctx.media_info_id,
+                callback,
+                quality=appsrc.quality,
+                frame_filter=parse_frame_filter(*appsrc.frame_filter_args),
+                pack_burst=True,
             )
         elif state == 1:
-            self.mux.unsubscribe(ctx.mac.decode("ascii"), self.factory_id)
+            if camera_added and self.mux.is_subscribed(mac, ctx.media_info_id):
+                self.mux.unsubscribe(mac, ctx.media_info_id)
+            self.clocks.pop(ctx.media_info_id, None)
+            self.appsrcs.pop(ctx.media_info_id, None)
+            self.flow_returns.pop(ctx.media_info_id, None)
+            self.media_contexts.pop(ctx.media_info_id, None)
 
     def do_removed_stream(self, *args):
         print(f"removed stream: {args}")
+
+    def end_streams(self, mac: str) -> None:
+        """
+        Ends the streams of a camera that is being removed from the mux, so
+        that its rtsp clients see the end of the stream rather than a stall.
+        """
+        for media_info_id, ctx in list(self.media_contexts.items()):
+            if ctx.mac.decode("ascii") != mac:
+                continue
+            if self.mux.is_subscribed(mac, media_info_id):
+                self.mux.unsubscribe(mac, media_info_id)
+            appsrc = self.appsrcs.get(media_info_id)
+            if appsrc is not None:
+                appsrc.emit("end-of-stream")
+
+    def collect_metrics(self, writer: MetricsWriter) -> None:
+        for media_info_id, ctx in list(self.media_contexts.items()):
+            labels = {
+                "camera": ctx.mac.decode("ascii").lower(),
+                "subscriber": str(media_info_id),
+            }
+            writer.counter(
+                "wyze_subscriber_skipped_frames_total",
+                "Frames skipped because the subscriber's pipeline was full",
+                ctx.frames_skipped,
+                labels,
+            )
+            flow_returns = self.flow_returns.get(media_info_id, {})
+            for result, count in sorted(flow_returns.items()):
+                writer.counter(
+                    "wyze_subscriber_push_results_total",
+                    "Frames pushed into the subscriber's pipeline, by result",
+                    count,
+                    dict(labels, result=result),
+                )
@@ -0,0 +1,90 @@
+"""
+A small client for reading a camera's frames out of the bridge's shared
+memory export (see shm_export), from another process on the same host:
+
+    from wyze_rtsp_bridge.shm_client import CameraFrameReader
+
+    with CameraFrameReader("2CABCDEF1234") as reader:
+        for frame, frame_info in reader.frames():
+            ...  # frame is an H.264 / H.265 access unit
+
+Readers never block the bridge: one that falls more than a ring's worth of
+frames behind skips ahead to the newest frame (counting what it skipped in
+`dropped`), so consumers should be ready to wait for the next keyframe.
+"""
+from typing import Iterator, Optional
+
+import time
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.shm_export import DEFAULT_NAME_PREFIX, ring_name
+from wyze_rtsp_bridge.shm_ring import FrameRing, FrameRingReader
+
+
+class CameraFrameReader:
+    """
+    Reads a camera's exported frames, starting with the next one written.
+
+    The ring is polled every `poll_interval` seconds while there's nothing
+    new to read.  If the bridge restarts, its rings are replaced; open a
+    new reader to follow it.
+    """
+
+    def __init__(
+        self,
+        mac: str,
+        name_prefix: str = DEFAULT_NAME_PREFIX,
+        poll_interval: float = 0.005,
+    ) -> None:
+        self.mac: str = mac.lower()
+        self.poll_interval: float = poll_interval
+        self.ring: FrameRing = FrameRing.attach(
+            ring_name(mac, name_prefix), track=False
+        )
+        self.reader: FrameRingReader = FrameRingReader(self.ring)
+
+    def __enter__(self) -> "CameraFrameReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @property
+    def dropped(self) -> int:
+        """The number of frames skipped because the reader fell behind"""
+        return self.reader.dropped
+
+    def read(
+        self, timeout: Optional[float] = None, copy: bool = True
+    ) -> Optional[VideoFrame]:
+        """
+        The next frame, waiting up to `timeout` seconds for it (forever if
+        None); None if there was none.
+
+        With `copy=False` the frame is a memoryview into shared memory,
+        which the bridge may overwrite once the reader falls behind; call
+        still_valid() once done with it, and discard the results if it
+        returns False.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            data = self.reader.read(copy=copy)
+            if data is not None:
+                return data
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def still_valid(self) -> bool:
+        """Whether the last frame read hasn't been overwritten yet"""
+        return self.reader.still_valid()
+
+    def frames(self, copy: bool = True) -> Iterator[VideoFrame]:
+        """Yields frames as they are written, forever"""
+        while True:
+            data = self.read(copy=copy)
+            if data is not None:
+                yield data
+
+    def close(self) -> None:
+        self.ring.close()
@@ -0,0 +1,93 @@
+"""
+Publishes each camera's encoded frames into a named shared memory
+FrameRing, for local consumers (NVRs, analytics) that want the camera's
+H.264 / H.265 access units without going through rtsp.
+
+A camera's ring is named "<name_prefix><mac>" (the MAC in lower case), e.g.
+/dev/shm/wyze-rtsp-bridge-2cabcdef1234 on Linux; shm_ring documents its
+layout, and shm_client is a small library for reading it.
+"""
+import typing
+from typing import Optional
+
+import threading
+import warnings
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.shm_ring import FrameRing, FrameRingError
+from wyze_rtsp_bridge.stream_quality import StreamQuality
+
+if typing.TYPE_CHECKING:
+    from wyze_rtsp_bridge.iotc_video_mux import (
+        WyzeIOTCVideoListener,
+        WyzeIOTCVideoMux,
+    )
+
+SHM_EXPORT_SUBSCRIBER_ID = -3
+"""The mux subscriber id of a camera's shared memory export"""
+
+DEFAULT_NAME_PREFIX = "wyze-rtsp-bridge-"
+
+
+def ring_name(mac: str, name_prefix: str = DEFAULT_NAME_PREFIX) -> str:
+    """The name of the shared memory ring a camera is exported to"""
+    return f"{name_prefix}{mac.lower()}"
+
+
+class ShmExporter:
+    """
+    Writes every frame of a camera into its named FrameRing.
+
+    The ring is created (replacing one left behind by a bridge that didn't
+    exit cleanly) when the export starts, and unlinked when it stops.
+    """
+
+    def __init__(
+        self,
+        mac: str,
+        ring_bytes: int = 8 * 1024 * 1024,
+        name_prefix: str = DEFAULT_NAME_PREFIX,
+    ) -> None:
+        self.mac: str = mac.lower()
+        self.ring_bytes: int = ring_bytes
+        self.name: str = ring_name(mac, name_prefix)
+        self.ring: Optional[FrameRing] = None
+        self.frames_dropped: int = 0
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        mux: "WyzeIOTCVideoMux",
+        quality: Optional[StreamQuality] = None,
+    ) -> None:
+        try:
+            self.ring = FrameRing.create(self.ring_bytes, name=self.name)
+        except FileExistsError:
+            stale = FrameRing.attach(self.name)
+            stale.close()
+            stale.unlink()
+            self.ring = FrameRing.create(self.ring_bytes, name=self.name)
+        mux.subscribe(
+            self.mac, SHM_EXPORT_SUBSCRIBER_ID, self.on_frame, quality=quality
+        )
+
+    def stop(self, mux: "WyzeIOTCVideoMux") -> None:
+        if mux.is_subscribed(self.mac, SHM_EXPORT_SUBSCRIBER_ID):
+            mux.unsubscribe(self.mac, SHM_EXPORT_SUBSCRIBER_ID)
+        with self._lock:
+            if self.ring is not None:
+                self.ring.close()
+                self.ring.unlink()
+                self.ring = None
+
+    def on_frame(
+        self, listener: "WyzeIOTCVideoListener", data: VideoFrame
+    ) -> None:
+        with self._lock:
+            if self.ring is None:
+                return
+            try:
+                self.ring.write(data)
+            except FrameRingError as e:
+                self.frames_dropped += 1
+                warnings.warn(f"Dropped a frame from {self.mac}: {e}")
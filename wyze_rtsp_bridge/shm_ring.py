@@ -0,0 +1,276 @@
+"""
+A ring buffer of encoded video frames in shared memory, written by one
+process and read by any number of others.
+
+Layout (all integers little-endian):
+
+    header, 64 bytes
+       0  8s   magic, b"WYZERING"
+       8  u32  layout version (1)
+      12  u32  header size (64)
+      16  u64  capacity of the data area, in bytes (a multiple of 8)
+      24  u64  write position: where the next record starts
+      32  u64  the number of frames written so far
+      40  u64  position of the newest complete record
+      48  u64  reserve position: where the record being written ends
+      56  u64  (reserved)
+    data area, `capacity` bytes
+
+Positions count bytes written since the ring was created, and never wrap;
+a record at position p lives at offset p % capacity of the data area.
+
+    record
+       0  u32  record size, including this header and padding to 8 bytes
+       4  u32  frame size (0xFFFFFFFF marks padding up to the end of the
+               data area; the next record starts at offset 0.  Fewer than
+               24 bytes left at the end of the data area are padding too)
+       8  u64  sequence number of the frame (0, 1, 2, ...)
+      16  u32  frame info size
+      20  u32  frame info type: 1 for FrameInfoStruct, 3 for FrameInfo3Struct
+      24       frame info (the ctypes struct, as sent by the camera)
+               frame (an H.264 / H.265 access unit)
+
+The writer moves the reserve position past a record, writes it, then moves
+the write position up to the reserve position.  A reader at position p
+that finds the reserve position more than `capacity` ahead of it has been
+lapped, and skips ahead to the newest record.  After copying a record out,
+a reader checks that the reserve position is still within `capacity` of
+the record's end; if it isn't, the writer overwrote the record while it was
+being copied, and it is discarded.
+"""
+from typing import List, Optional, Union
+
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyzecam.tutk.tutk import FrameInfo3Struct, FrameInfoStruct
+
+MAGIC = b"WYZERING"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQQQ")
+RECORD_HEADER = struct.Struct("<IIQII")
+PADDING = 0xFFFFFFFF
+
+FRAME_INFO_TYPES = {1: FrameInfoStruct, 3: FrameInfo3Struct}
+
+_WRITE_POS = 24
+_FRAMES_WRITTEN = 32
+_LAST_RECORD_POS = 40
+_RESERVE_POS = 48
+_U64 = struct.Struct("<Q")
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class FrameRingError(Exception):
+    pass
+
+
+class FrameRing:
+    """
+    A shared memory ring of frames; see the module docstring for the layout.
+
+    create() makes a new ring for a writer; attach() opens an existing one
+    by name, for a reader (or the writer, in another process).
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory) -> None:
+        self.shm: shared_memory.SharedMemory = shm
+        self.buf: memoryview = shm.buf
+        magic, version, header_size, capacity, *_ = HEADER.unpack_from(
+            self.buf, 0
+        )
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise FrameRingError(f"{shm.name} is not a frame ring")
+        self.header_size: int = header_size
+        self.capacity: int = capacity
+
+    @classmethod
+    def create(cls, capacity: int, name: Optional[str] = None) -> "FrameRing":
+        capacity = _aligned(capacity)
+        shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER.size + capacity
+        )
+        HEADER.pack_into(
+            shm.buf,
+            0,
+            MAGIC,
+            LAYOUT_VERSION,
+            HEADER.size,
+            capacity,
+            0,
+            0,
+            0,
+            0,
+            0,
+        )
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str, track: bool = True) -> "FrameRing":
+        """
+        Opens an existing ring.  Processes that aren't children of the one
+        that created the ring should pass `track=False`, or Python unlinks
+        the ring when they exit.
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        if not track:
+            resource_tracker.unregister(
+                shm._name, "shared_memory"  # type: ignore
+            )
+        return cls(shm)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _get(self, offset: int) -> int:
+        return _U64.unpack_from(self.buf, offset)[0]
+
+    def _set(self, offset: int, value: int) -> None:
+        _U64.pack_into(self.buf, offset, value)
+
+    @property
+    def write_pos(self) -> int:
+        return self._get(_WRITE_POS)
+
+    @property
+    def frames_written(self) -> int:
+        return self._get(_FRAMES_WRITTEN)
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+    # the writer's side
+
+    def write(self, data: VideoFrame) -> None:
+        frame, frame_info = data
+        info = bytes(frame_info)  # type: ignore
+        info_type = 3 if isinstance(frame_info, FrameInfo3Struct) else 1
+        size = _aligned(RECORD_HEADER.size + len(info) + len(frame))
+        if size > self.capacity // 2:
+            raise FrameRingError(
+                f"A {len(frame)} byte frame does not fit in a "
+                f"{self.capacity} byte ring"
+            )
+
+        pos = self.write_pos
+        offset = pos % self.capacity
+        if offset + size > self.capacity:
+            padding = self.capacity - offset
+            self._set(_RESERVE_POS, pos + padding + size)
+            struct.pack_into(
+                "<II", self.buf, self.header_size + offset, padding, PADDING
+            )
+            pos += padding
+            offset = 0
+        else:
+            self._set(_RESERVE_POS, pos + size)
+
+        sequence = self.frames_written
+        start = self.header_size + offset
+        RECORD_HEADER.pack_into(
+            self.buf, start, size, len(frame), sequence, len(info), info_type
+        )
+        start += RECORD_HEADER.size
+        self.buf[start : start + len(info)] = info
+        start += len(info)
+        self.buf[start : start + len(frame)] = frame
+
+        self._set(_LAST_RECORD_POS, pos)
+        self._set(_FRAMES_WRITTEN, sequence + 1)
+        self._set(_WRITE_POS, pos + size)
+
+
+class FrameRingReader:
+    """
+    Reads frames out of a FrameRing, starting with the next frame written.
+
+    Frames the reader was lapped on are skipped, and counted in `dropped`.
+    """
+
+    def __init__(self, ring: FrameRing) -> None:
+        self.ring: FrameRing = ring
+        self.pos: int = ring.write_pos
+        self.next_sequence: int = ring.frames_written
+        self.dropped: int = 0
+        self._record_pos: int = 0
+
+    def _skip_to_newest(self) -> None:
+        self.pos = self.ring._get(_LAST_RECORD_POS)
+
+    def read(self, copy: bool = True) -> Optional[VideoFrame]:
+        """
+        The next frame, or None if the reader is caught up.
+
+        With `copy=False` the frame is a memoryview into the ring instead
+        of a copy of it.  The writer may overwrite it at any time, so check
+        still_valid() after using it (and release it before closing the
+        ring).
+        """
+        ring = self.ring
+        while True:
+            if self.pos >= ring.write_pos:
+                return None
+            if ring._get(_RESERVE_POS) - self.pos > ring.capacity:
+                # lapped by the writer
+                self._skip_to_newest()
+                continue
+
+            offset = self.pos % ring.capacity
+            if ring.capacity - offset < RECORD_HEADER.size:
+                # too little room left for a record header: padding
+                self.pos += ring.capacity - offset
+                continue
+            start = ring.header_size + offset
+            (
+                size,
+                frame_size,
+                sequence,
+                info_size,
+                info_type,
+            ) = RECORD_HEADER.unpack_from(ring.buf, start)
+            if frame_size == PADDING:
+                self.pos += size
+                continue
+            start += RECORD_HEADER.size
+            info = bytes(ring.buf[start : start + info_size])
+            start += info_size
+            frame: Union[bytes, memoryview] = ring.buf[
+                start : start + frame_size
+            ]
+            if copy:
+                frame = bytes(frame)
+
+            if ring._get(_RESERVE_POS) - self.pos > ring.capacity:
+                # overwritten while we were copying it
+                self._skip_to_newest()
+                continue
+            self._record_pos = self.pos
+            self.pos += size
+            if sequence > self.next_sequence:
+                self.dropped += sequence - self.next_sequence
+            self.next_sequence = sequence + 1
+            info_struct = FRAME_INFO_TYPES.get(info_type, FrameInfoStruct)
+            return frame, info_struct.from_buffer_copy(info)  # type: ignore
+
+    def still_valid(self) -> bool:
+        """Whether the writer has yet to overwrite the last frame read"""
+        return (
+            self.ring._get(_RESERVE_POS) - self._record_pos
+            <= self.ring.capacity
+        )
+
+    def read_all(self) -> List[VideoFrame]:
+        frames = []
+        while True:
+            frame = self.read()
+            if frame is None:
+                return frames
+            frames.append(frame)
@@ -0,0 +1,291 @@
+import typing
+from typing import Callable, Dict, Optional, Tuple
+
+import collections
+import re
+import threading
+
+from wyze_rtsp_bridge.frame_filter import KeyframeFilter
+from wyze_rtsp_bridge.frame_queue import VideoFrame
+from wyze_rtsp_bridge.gop_cache import frame_timestamp_ms
+from wyze_rtsp_bridge.http_server import HttpRequest, HttpResponse, HttpServer
+from wyze_rtsp_bridge.iotc_video_mux import (
+    WyzeIOTCVideoListener,
+    WyzeIOTCVideoListenerState,
+    WyzeIOTCVideoMux,
+)
+from wyze_rtsp_bridge.metrics import MetricsWriter
+
+SNAPSHOT_SUBSCRIBER_ID = -4
+"""The mux subscriber id used to wait for a keyframe to take a snapshot of"""
+
+JPEG_CONTENT_TYPE = "image/jpeg"
+
+MIN_DIMENSION = 16
+MAX_DIMENSION = 3840
+
+SIZES_CACHED_PER_CAMERA = 4
+"""How many sizes of a camera's snapshot are kept at once"""
+
+DECODE_TIMEOUT_SECONDS = 5.0
+
+Size = Tuple[Optional[int], Optional[int]]
+"""A width and height to scale to; either may be None to keep the aspect ratio"""
+
+JpegEncoder = Callable[[VideoFrame, Size, int], bytes]
+"""Decodes a keyframe, and encodes it as a JPEG of the given size and quality"""
+
+_PATH = re.compile(r"^/snapshot/(?P<mac>[0-9a-f]+)\.jpe?g$")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def gst_jpeg_encoder(data: VideoFrame, size: Size, quality: int) -> bytes:
+    """Decodes a keyframe with a one-off GStreamer pipeline"""
+    from wyze_rtsp_bridge.glib_init import Gst
+
+    frame, frame_info = data
+    codec = "h265" if frame_info.codec_id == 80 else "h264"
+    width, height = size
+    raw_caps = "video/x-raw,pixel-aspect-ratio=1/1"
+    if width is not None:
+        raw_caps += f",width={width}"
+    if height is not None:
+        raw_caps += f",height={height}"
+    pipeline = Gst.parse_launch(
+        f"appsrc name=src format=time "
+        f"caps=video/x-{codec},stream-format=byte-stream,alignment=au "
+        f"! {codec}parse ! decodebin ! videoconvert ! videoscale "
+        f"! {raw_caps} ! jpegenc quality={quality} "
+        f"! appsink name=sink sync=false"
+    )
+    src = pipeline.get_by_name("src")
+    sink = pipeline.get_by_name("sink")
+    try:
+        pipeline.set_state(Gst.State.PLAYING)
+        buf = Gst.Buffer.new_wrapped(frame)
+        buf.pts = 0
+        src.emit("push-buffer", buf)
+        src.emit("end-of-stream")
+        sample = sink.emit(
+            "try-pull-sample", int(DECODE_TIMEOUT_SECONDS * Gst.SECOND)
+        )
+        if sample is None:
+            message = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+            error = message.parse_error()[0] if message else "timed out"
+            raise SnapshotError(f"Could not decode keyframe: {error}")
+        buffer = sample.get_buffer()
+        ok, info = buffer.map(Gst.MapFlags.READ)
+        if not ok:
+            raise SnapshotError("Could not map the encoded JPEG")
+        try:
+            return bytes(info.data)
+        finally:
+            buffer.unmap(info)
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+
+def _keyframe_key(data: VideoFrame) -> Tuple[int, int, int]:
+    frame, frame_info = data
+    return frame_info.frame_no, frame_timestamp_ms(frame_info), len(frame)
+
+
+class CameraSnapshots:
+    """
+    The JPEGs made from a camera's latest keyframe, by size.
+
+    They are thrown out as soon as a newer keyframe is snapshotted, so a
+    camera costs at most one decode per GOP per size, however often it is
+    polled.
+    """
+
+    def __init__(self) -> None:
+        self.keyframe_key: Optional[Tuple[int, int, int]] = None
+        self.jpegs: typing.OrderedDict[Size, bytes] = collections.OrderedDict()
+        self.decodes: int = 0
+        self.requests: int = 0
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        keyframe: VideoFrame,
+        size: Size,
+        quality: int,
+        encode: JpegEncoder,
+    ) -> bytes:
+        with self.lock:
+            self.requests += 1
+            key = _keyframe_key(keyframe)
+            if key != self.keyframe_key:
+                self.keyframe_key = key
+                self.jpegs.clear()
+            jpeg = self.jpegs.get(size)
+            if jpeg is None:
+                jpeg = encode(keyframe, size, quality)
+                self.decodes += 1
+                self.jpegs[size] = jpeg
+                while len(self.jpegs) > SIZES_CACHED_PER_CAMERA:
+                    self.jpegs.popitem(last=False)
+            return jpeg
+
+
+class SnapshotServer:
+    """
+    Serves a JPEG of each camera's latest keyframe over the bridge's http
+    server:
+
+        /snapshot/<mac>.jpg?width=320
+
+    (`width` and `height` are optional; given one, the other keeps the
+    aspect ratio.)  Snapshots come from the camera's GOP cache while it is
+    streaming; otherwise the request subscribes to the camera, which
+    resumes it, and waits up to `keyframe_timeout_seconds` for a keyframe.
+    """
+
+    def __init__(
+        self,
+        mux: WyzeIOTCVideoMux,
+        jpeg_quality: int = 85,
+        keyframe_timeout_seconds: float = 10.0,
+        encode: JpegEncoder = gst_jpeg_encoder,
+    ) -> None:
+        self.mux = mux
+        self.jpeg_quality: int = jpeg_quality
+        self.keyframe_timeout_seconds: float = keyframe_timeout_seconds
+        self.encode: JpegEncoder = encode
+        self.snapshots: Dict[str, CameraSnapshots] = {}
+        self._lock = threading.Lock()
+
+    def add_routes(self, http_server: HttpServer) -> None:
+        http_server.add_route("/snapshot", self.handle, prefix=True)
+
+    def camera_snapshots(self, mac: str) -> CameraSnapshots:
+        with self._lock:
+            snapshots = self.snapshots.get(mac)
+            if snapshots is None:
+                snapshots = self.snapshots[mac] = CameraSnapshots()
+            return snapshots
+
+    def remove_camera(self, mac: str) -> None:
+        """Forgets a camera that is being removed from the mux"""
+        with self._lock:
+            self.snapshots.pop(mac, None)
+
+    def latest_keyframe(self, mac: str) -> Optional[VideoFrame]:
+        keyframe = self._cached_keyframe(mac)
+        if keyframe is not None:
+            return keyframe
+        return self._wait_for_keyframe(mac)
+
+    def _cached_keyframe(self, mac: str) -> Optional[VideoFrame]:
+        """The GOP cache's keyframe, if the camera is streaming"""
+        listener = self.mux.get_listener(mac)
+        gop_cache = listener.fanout.gop_cache
+        if (
+            listener.state != WyzeIOTCVideoListenerState.STREAMING
+            or gop_cache is None
+        ):
+            return None
+        return gop_cache.latest_keyframe()
+
+    def _wait_for_keyframe(self, mac: str) -> Optional[VideoFrame]:
+        keyframes: typing.Deque[VideoFrame] = collections.deque(maxlen=1)
+        received = threading.Event()
+        gop_cache = self.mux.get_listener(mac).fanout.gop_cache
+        stale: Optional[VideoFrame] = None
+
+        def on_frame(listener: WyzeIOTCVideoListener, data: VideoFrame):
+            if stale is not None and data[0] is stale[0]:
+                # the GOP cache's (possibly old) keyframe, sent as a burst
+                return
+            keyframes.append(data)
+            received.set()
+
+        # requests for one camera take turns, as they share a subscriber id
+        with self.camera_snapshots(mac).lock:
+            # another request may have just resumed the camera
+            keyframe = self._cached_keyframe(mac)
+            if keyframe is not None:
+                return keyframe
+            if gop_cache is not None:
+                stale = gop_cache.latest_keyframe()
+            self.mux.subscribe(
+                mac,
+                SNAPSHOT_SUBSCRIBER_ID,
+                on_frame,
+                frame_filter=KeyframeFilter(),
+            )
+            try:
+                received.wait(self.keyframe_timeout_seconds)
+            finally:
+                self.mux.unsubscribe(mac, SNAPSHOT_SUBSCRIBER_ID)
+        return keyframes[0] if keyframes else None
+
+    def snapshot(self, mac: str, size: Size = (None, None)) -> Optional[bytes]:
+        """A JPEG of the camera's latest keyframe; None if there was none"""
+        keyframe = self.latest_keyframe(mac)
+        if keyframe is None:
+            return None
+        return self.camera_snapshots(mac).get(
+            keyframe, size, self.jpeg_quality, self.encode
+        )
+
+    def handle(self, request: HttpRequest) -> HttpResponse:
+        match = _PATH.match(request.path.lower())
+        if match is None or match["mac"] not in self.mux.listeners:
+            return HttpResponse(404, b"not found\n")
+        try:
+            size = (
+                _dimension(request, "width"),
+                _dimension(request, "height"),
+            )
+        except ValueError:
+            return HttpResponse(
+                400,
+                f"width and height must be between {MIN_DIMENSION} "
+                f"and {MAX_DIMENSION}\n".encode("utf-8"),
+            )
+
+        try:
+            jpeg = self.snapshot(match["mac"], size)
+        except SnapshotError as e:
+            return HttpResponse(500, f"{e}\n".encode("utf-8"))
+        if jpeg is None:
+            return HttpResponse(503, b"camera is not streaming\n")
+        return HttpResponse(
+            200,
+            jpeg,
+            JPEG_CONTENT_TYPE,
+            headers={
+                "Cache-Control": "no-cache",
+                "Access-Control-Allow-Origin": "*",
+            },
+        )
+
+    def collect_metrics(self, writer: MetricsWriter) -> None:
+        for mac, snapshots in list(self.snapshots.items()):
+            labels = {"camera": mac}
+            writer.counter(
+                "wyze_snapshot_requests_total",
+                "Snapshots served",
+                snapshots.requests,
+                labels,
+            )
+            writer.counter(
+                "wyze_snapshot_decodes_total",
+                "Keyframes decoded to serve snapshots",
+                snapshots.decodes,
+                labels,
+            )
+
+
+def _dimension(request: HttpRequest, name: str) -> Optional[int]:
+    if name not in request.query:
+        return None
+    value = int(request.query[name][0])
+    if not MIN_DIMENSION <= value <= MAX_DIMENSION:
+        raise ValueError(value)
+    return value
@@ -0,0 +1,63 @@
+from typing import Optional, Tuple
+
+import enum
+
+
+class StreamQuality(str, enum.Enum):
+    """The resolution (and bitrate) a camera is asked to stream at"""
+
+    HD = "hd"
+    """1080p, at the bitrate the app uses for 'HD'"""
+
+    SD = "sd"
+    """360p, at the bitrate the app uses for '360P'"""
+
+    # wyzecam.tutk is imported when first needed, rather than with this
+    # module: config imports it, and the CLI shouldn't pay for wyzecam (and
+    # requests) just to read its config file.
+
+    @property
+    def frame_size(self) -> int:
+        from wyzecam.tutk import tutk
+
+        if self == StreamQuality.SD:
+            return tutk.FRAME_SIZE_360P
+        return tutk.FRAME_SIZE_1080P
+
+    def matches_frame_size(self, frame_size: int) -> bool:
+        """
+        Whether a frame reporting `frame_size` was streamed at this quality.
+        Doorbells (WYZEDB3) report their rotated sizes as the one they were
+        asked for + 3, which wyzecam's recv_video_data() accepts too.
+        """
+        return frame_size in (self.frame_size, self.frame_size + 3)
+
+    @property
+    def bitrate(self) -> int:
+        from wyzecam.tutk import tutk
+
+        if self == StreamQuality.SD:
+            return tutk.BITRATE_360P
+        return tutk.BITRATE_HD
+
+    @property
+    def dimensions(self) -> Tuple[int, int]:
+        if self == StreamQuality.SD:
+            return 640, 360
+        return 1920, 1080
+
+
+def highest_quality(*qualities: StreamQuality) -> StreamQuality:
+    """HD if anyone asked for HD, SD otherwise"""
+    if StreamQuality.HD in qualities or not qualities:
+        return StreamQuality.HD
+    return StreamQuality.SD
+
+
+def parse_mount_path(path: str) -> Tuple[str, Optional[StreamQuality]]:
+    """Splits a mount path like /<mac> or /<mac>/sd into the mac and quality"""
+    parts = path.strip("/").split("/")
+    quality = None
+    if len(parts) > 1 and parts[1] in {q.value for q in StreamQuality}:
+        quality = StreamQuality(parts[1])
+    return parts[0], quality
@@ -0,0 +1,122 @@
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import collections
+import json
+import os
+import pathlib
+import threading
+import time
+
+TraceEvent = Tuple[str, str, int, int, int, Optional[Dict[str, Any]]]
+"""(name, category, start ns, duration ns, thread id, args)"""
+
+
+class Tracer:
+    """
+    Records how long each stage of a frame's trip through the bridge takes,
+    into a fixed-size in-memory ring.
+
+    Instrumented code grabs a start time with begin(), and hands it to
+    end() once the stage is done.  While the tracer is disabled, begin()
+    returns 0 and end() returns right away, so the hooks can stay in the
+    hot path; while enabled, recording a stage is a deque append.
+
+    The ring can be dumped as a Chrome trace (chrome://tracing, Perfetto,
+    speedscope), where each thread gets its own track.
+    """
+
+    def __init__(self, ring_size: int = 100_000, enabled: bool = False):
+        self.enabled: bool = enabled
+        self.events: Deque[TraceEvent] = collections.deque(maxlen=ring_size)
+
+    def resize(self, ring_size: int) -> None:
+        self.events = collections.deque(self.events, maxlen=ring_size)
+
+    def begin(self) -> int:
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def end(
+        self,
+        name: str,
+        start_ns: int,
+        category: str = "frame",
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if not self.enabled or not start_ns:
+            return
+        self.events.append(
+            (
+                name,
+                category,
+                start_ns,
+                time.perf_counter_ns() - start_ns,
+                threading.get_ident(),
+                args,
+            )
+        )
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def clear(self) -> None:
+        self.events.clear()
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """The recorded events, in the Chrome trace event format"""
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        pid = os.getpid()
+        trace_events: List[Dict[str, Any]] = []
+        for name, category, start_ns, duration_ns, tid, args in list(
+            self.events
+        ):
+            event: Dict[str, Any] = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start_ns / 1000,
+                "dur": duration_ns / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        for tid in {event["tid"] for event in trace_events}:
+            if tid in thread_names:
+                trace_events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "tid": tid,
+                        "args": {"name": thread_names[tid]},
+                    }
+                )
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump(self, directory: pathlib.Path) -> pathlib.Path:
+        """Writes a Chrome trace of the recorded events; returns its path"""
+        directory = pathlib.Path(directory).expanduser()
+        directory.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        name = (
+            f"trace-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+            f"-{int(now * 1000) % 1000:03d}"
+        )
+        path = directory / f"{name}.json"
+        sequence = 1
+        while True:
+            try:
+                f = open(path, "x")
+                break
+            except FileExistsError:
+                sequence += 1
+                path = directory / f"{name}-{sequence}.json"
+        with f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+tracer = Tracer()
+"""The tracer shared by every instrumentation point"""